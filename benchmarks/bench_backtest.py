@@ -0,0 +1,73 @@
+"""Backtest replay of an archived season: one manager at a time versus batched chunks on a process pool."""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from synthetic_data import write_source_data
+from backtest import archive_results, replay, replay_chunk, snapshot_source, summarize
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data
+
+
+def build_archive(archive_dir, players, gameweeks, managers, workers):
+    """Snapshot synthetic source data for each gameweek and archive the mocked picks and points."""
+    source_dir = os.path.join(archive_dir, '..', 'source_data')
+    next_gameweek = write_source_data(source_dir, players, gameweeks + 2, managers=1)
+    _, all_players_df, _, _ = load_source_data(source_dir)
+    # Every gameweek of the season is finished, the replay can score all of them
+    bootstrap = build_bootstrap(all_players_df, 39)
+    replayed = list(range(next_gameweek, next_gameweek + gameweeks))
+    for gameweek in replayed:
+        snapshot_source(gameweek, bootstrap, source_dir, archive_dir)
+    with MockFplServer(bootstrap, latency=0) as server:
+        set_client(FplClient(server.url, tempfile.mkdtemp()))
+        start = time.perf_counter()
+        requests_made = archive_results(range(1, managers + 1), replayed + [next_gameweek + gameweeks, next_gameweek + gameweeks + 1],
+                                        archive_dir, workers)
+        print(f'archive                 {time.perf_counter() - start:7.2f}s  {requests_made} requests  {sum(server.counts.values())} served')
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--players', type=int, default=700)
+    parser.add_argument('--gameweeks', type=int, default=8)
+    parser.add_argument('--managers', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--sample', type=int, default=200, help='evaluations timed one manager at a time')
+    args = parser.parse_args()
+
+    archive_dir = os.path.join(tempfile.mkdtemp(), 'archive')
+    gameweeks = build_archive(archive_dir, args.players, args.gameweeks, args.managers, 16)
+    # The replay must not need the API: point the client at a port nothing listens on
+    set_client(FplClient('http://127.0.0.1:9/api', tempfile.mkdtemp()))
+    evaluations = args.managers * len(gameweeks)
+
+    results = None
+    for workers in args.workers:
+        start = time.perf_counter()
+        replayed = replay(gameweeks, archive_dir, workers)
+        elapsed = time.perf_counter() - start
+        assert len(replayed) == evaluations
+        if results is not None:
+            pd.testing.assert_frame_equal(results, replayed)
+        results = replayed
+        print(f'batched, workers={workers:<3d}   {elapsed:7.2f}s  {evaluations / elapsed:9.0f} evaluations/s')
+
+    # The same evaluations one (manager, gameweek) pair at a time
+    sample = results.head(args.sample)
+    start = time.perf_counter()
+    single = pd.DataFrame([row for manager, gameweek in zip(sample['manager'], sample['gameweek'])
+                           for row in replay_chunk(archive_dir, gameweek, [manager])], columns=results.columns)
+    elapsed = time.perf_counter() - start
+    pd.testing.assert_frame_equal(single, sample.reset_index(drop=True))
+    print(f'one at a time           {elapsed * evaluations / len(sample):7.2f}s  {len(sample) / elapsed:9.0f} evaluations/s  (estimated from {len(sample)})')
+    print(summarize(results))
+
+
+if __name__ == '__main__':
+    main()
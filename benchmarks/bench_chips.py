@@ -0,0 +1,64 @@
+"""
+Chip timing of a whole league on synthetic source data: one evaluate_chips batch against one call per squad.
+
+Free hit squads are built once per gameweek and rounded budget and shared by both, the first pass builds them.
+
+    python benchmarks/bench_chips.py --squads 1000 --players 700 --gameweeks 8
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+import mock_fpl_server  # noqa: F401, puts python/ on the path
+from synthetic_data import write_source_data
+from get_fpl_team import load_source_data
+from ranked_players import get_ranked_players
+from chips import CHIPS, FREE_HIT_BUDGET_STEP, evaluate_chips
+from squad_optimizer import SQUAD_QUOTAS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--squads', type=int, default=1000)
+    parser.add_argument('--players', type=int, default=700)
+    parser.add_argument('--gameweeks', type=int, default=8)
+    args = parser.parse_args()
+
+    source_data_path = tempfile.mkdtemp()
+    next_gameweek = write_source_data(source_data_path, args.players, args.gameweeks)
+    _, all_players_df, _, _ = load_source_data(source_data_path)
+    ranked = get_ranked_players(all_players_df)
+    gameweeks = [gameweek for gameweek in ranked.gameweeks if gameweek >= next_gameweek]
+
+    # Random squads of the right shape, with the spread of budgets of a league
+    rng = np.random.default_rng(0)
+    squads = np.array([np.concatenate([rng.choice(rows, quota, replace=False) for rows, quota in zip(ranked.position_rows, SQUAD_QUOTAS)])
+                       for _ in range(args.squads)])
+    budgets = rng.integers(950, 1060, size=args.squads)
+
+    start = time.perf_counter()
+    evaluate_chips(ranked, squads[:1], budgets[:1], gameweeks)
+    free_hit_squads = len({(gameweek, int(budget) // FREE_HIT_BUDGET_STEP) for gameweek in gameweeks for budget in budgets})
+    gains = evaluate_chips(ranked, squads, budgets, gameweeks)
+    print(f'first pass, {free_hit_squads} free hit squads built: {time.perf_counter() - start:7.2f}s')
+
+    start = time.perf_counter()
+    batched = evaluate_chips(ranked, squads, budgets, gameweeks)
+    batch_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    looped = [evaluate_chips(ranked, squad, budget, gameweeks) for squad, budget in zip(squads, budgets)]
+    loop_seconds = time.perf_counter() - start
+    for chip in CHIPS:
+        assert np.allclose(batched[chip], np.concatenate([gains[chip] for gains in looped]), equal_nan=True)
+    print(f'{args.squads} squads x {len(gameweeks)} gameweeks   batched {batch_seconds * 1000:8.1f} ms   '
+          f'per squad {loop_seconds * 1000:8.1f} ms   x{loop_seconds / batch_seconds:.0f}')
+
+    for chip, name in CHIPS.items():
+        best = np.nanargmax(gains[chip], axis=1)
+        print(f'{name:15} mean best gain {np.nanmax(gains[chip], axis=1).mean():6.2f}   most common gameweek {gameweeks[np.bincount(best).argmax()]}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Email delivery to a local SMTP sink: a connection per message versus the delivery queue."""
+import argparse
+import os
+import smtplib
+import tempfile
+import time
+
+from mock_mail_server import MockSmtpServer
+from send_emails import DeliveryQueue, build_message
+
+
+def legacy_send(port, msg):
+    """What send_email did for every message: connect, say hello, send and quit."""
+    smtp_server = smtplib.SMTP(host='127.0.0.1', port=port)
+    smtp_server.ehlo()
+    smtp_server.send_message(msg)
+    smtp_server.quit()
+
+
+def build_messages(count):
+    html = '<html><body>' + '<table>' + '<tr><td>Player</td><td>5.5</td></tr>' * 60 + '</table></body></html>'
+    return [build_message('sender@example.com', f'manager{i}@example.com', 9, html.replace('Player', f'Player {i}'), f'Report {i}')
+            for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=300)
+    parser.add_argument('--connect-latency', type=float, default=0.05, help='seconds per connection, stands in for TLS and login')
+    parser.add_argument('--rate-limit', type=float, default=0, help='messages per second, 0 for no limit')
+    args = parser.parse_args()
+    messages = build_messages(args.messages)
+
+    with MockSmtpServer(connect_latency=args.connect_latency) as sink:
+        start = time.perf_counter()
+        for msg in messages:
+            legacy_send(sink.port, msg)
+        legacy = time.perf_counter() - start
+        print(f'connection per message  {legacy:7.2f}s  {len(messages) / legacy:7.1f} msg/s  connections={sink.connections}')
+
+    with MockSmtpServer(connect_latency=args.connect_latency) as sink:
+        record_path = os.path.join(tempfile.mkdtemp(), 'delivered.jsonl')
+        queue = DeliveryQueue('127.0.0.1', sink.port, 'sender@example.com', rate_limit=args.rate_limit, record_path=record_path,
+                              tls=False)
+        start = time.perf_counter()
+        sent, _, _ = queue.deliver(messages)
+        queued = time.perf_counter() - start
+        print(f'delivery queue          {queued:7.2f}s  {len(sent) / queued:7.1f} msg/s  connections={sink.connections}')
+
+        # A rerun of the same batch sends nothing
+        sent, skipped, _ = queue.deliver(messages)
+        assert not sent and len(skipped) == len(messages) and len(sink.messages) == len(messages)
+        print(f'rerun                   sent {len(sent)}, skipped {len(skipped)}')
+
+    # Temporary 451 replies and dropped connections are retried with backoff, every message arrives exactly once
+    with MockSmtpServer(fail_every=7, drop_every=3) as sink:
+        queue = DeliveryQueue('127.0.0.1', sink.port, 'sender@example.com', rate_limit=0, backoff=0.01,
+                              record_path=os.path.join(tempfile.mkdtemp(), 'delivered.jsonl'), tls=False)
+        sent, _, failed = queue.deliver(messages)
+        recipients = [message['to'][0] for message in sink.messages]
+        assert not failed and len(recipients) == len(set(recipients)) == len(messages)
+        print(f'flaky server            sent {len(sent)}, attempts {sink.attempts}, connections {sink.connections}, failed {len(failed)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""A cold run versus an identical second run with the run manifest, against a mocked FPL API."""
+import argparse
+import os
+import tempfile
+import time
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data
+from player_resolver import build_player_index
+from report_renderer import render_report
+from run_manifest import RunManifest
+from worker import process_managers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--managers', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    df, all_players_df, matching_names_df, _ = load_source_data()
+    next_gameweek = int(df.columns[10])
+    managers = [{'ID': manager_id, 'Manager': f'Manager {manager_id}', 'Wildcard': False} for manager_id in range(1, args.managers + 1)]
+    cache_dir = tempfile.mkdtemp()
+    manifest_path = os.path.join(cache_dir, 'run_manifest.json')
+
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=0.0) as server:
+        reports = []
+        for run in ('cold', 'unchanged'):
+            set_client(FplClient(server.url, cache_dir))
+            manifest = RunManifest(manifest_path)
+            start = time.perf_counter()
+            player_index = build_player_index(all_players_df, matching_names_df, cache_dir=cache_dir)
+            manifest.set_source(df.columns[10], player_index.key)
+            report, _ = render_report(process_managers(managers, next_gameweek, all_players_df, player_index, args.workers, manifest=manifest))
+            changed = manifest.report_changed(report)
+            manifest.save(report)
+            elapsed = time.perf_counter() - start
+            reports.append(report)
+            print(f'{run:10s} {elapsed:7.2f}s  rebuilt {len(manifest.rebuilt):3d} of {len(managers)} managers  email {"sent" if changed else "skipped"}')
+
+    # The second run reuses every fragment and produces the same report, so no mail goes out
+    assert reports[0] == reports[1]
+    assert not manifest.rebuilt and not changed
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+A league run interrupted in the middle of a standings page and resumed from its checkpoint, against a mocked FPL API.
+
+The resumed report must match the report of an uninterrupted run byte for byte, and only the pages after the last
+checkpoint are processed again. The per-manager breakdown of the run metrics stays at SUMMARY_MANAGERS managers
+however many pages the league has.
+
+    python benchmarks/bench_league.py --entries 300 --interrupt-page 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data
+from instrumentation import SUMMARY_MANAGERS, RunMetrics, set_metrics
+from league import process_league
+from player_resolver import build_player_index
+from worker import process_managers
+
+LEAGUE_ID = 314
+
+
+class Interrupted(Exception):
+    """Stands in for a crash or a kill in the middle of a page."""
+
+
+def league_run(root, name, next_gameweek, all_players_df, player_index, workers, interrupt_page=None):
+    """
+    Run the league into root/<name>.html with the checkpoint next to it, as worker.run does.
+
+    Returns (seconds, pages processed, metrics). With interrupt_page, that page is cut off after half its managers were
+    written and Interrupted is raised from process_league.
+    """
+    metrics = set_metrics(RunMetrics())
+    pages = []
+
+    def process_page(managers):
+        pages.append(managers[0]['ID'])
+        fragments = process_managers(managers, next_gameweek, all_players_df, player_index, workers)
+        metrics.compact()
+        for i, fragment in enumerate(fragments):
+            if len(pages) == interrupt_page and i == len(fragments) // 2:
+                raise Interrupted()
+            yield fragment['html']
+
+    start = time.perf_counter()
+    process_league(LEAGUE_ID, next_gameweek, process_page, os.path.join(root, f'{name}.html'), os.path.join(root, f'{name}.json'))
+    return time.perf_counter() - start, len(pages), metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=300, help='entries of the league, 50 per standings page')
+    parser.add_argument('--interrupt-page', type=int, default=4, help='page the interrupted run stops in')
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    df, all_players_df, matching_names_df, _ = load_source_data()
+    next_gameweek = int(df.columns[10])
+    root = tempfile.mkdtemp()
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=0, standings={LEAGUE_ID: args.entries}) as server:
+        set_client(FplClient(server.url, root))
+        player_index = build_player_index(all_players_df, matching_names_df, cache_dir=root)
+
+        full_seconds, full_pages, metrics = league_run(root, 'full', next_gameweek, all_players_df, player_index, args.workers)
+        summary = metrics.summary()
+        assert len(summary['managers']) <= SUMMARY_MANAGERS and summary['managers_total'] == args.entries
+        print(f'uninterrupted  {full_seconds:7.2f}s  {full_pages} pages  breakdown of {len(summary["managers"])} of '
+              f'{summary["managers_total"]} managers')
+
+        try:
+            league_run(root, 'resumed', next_gameweek, all_players_df, player_index, args.workers, args.interrupt_page)
+            raise AssertionError(f'the league has fewer than {args.interrupt_page} pages')
+        except Interrupted:
+            pass
+        resumed_seconds, resumed_pages, _ = league_run(root, 'resumed', next_gameweek, all_players_df, player_index, args.workers)
+        assert resumed_pages == full_pages - args.interrupt_page + 1, f'{resumed_pages} pages processed again'
+        with open(os.path.join(root, 'full.html'), 'rb') as full, open(os.path.join(root, 'resumed.html'), 'rb') as resumed:
+            assert full.read() == resumed.read(), 'the resumed report differs from the uninterrupted one'
+        print(f'resumed        {resumed_seconds:7.2f}s  {resumed_pages} pages from page {args.interrupt_page}, the report matches')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+"""Starting XI selection: the previous per-manager pandas logic versus the batched formation search."""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from bench_transfers import random_squads
+from get_fpl_team import load_source_data
+from lineup import best_lineups
+from ranked_players import build_player_arrays
+
+
+def legacy_starting_eleven(merged_team_df, next_gameweek):
+    """The to_dict/pd.concat selection with the 1/3/4/2 minimums this module replaced."""
+    fpl_positions = {'GK': 1, 'D': 3, 'M': 4, 'F': 2}
+    starting_eleven = {'GK': [], 'D': [], 'M': [], 'F': []}
+    bench = {'GK': [], 'D': [], 'M': [], 'F': []}
+    sorted_players = merged_team_df.sort_values(by=str(next_gameweek), ascending=False)
+    for position, min_count in fpl_positions.items():
+        position_players = sorted_players[sorted_players['Position'] == position]
+        starting_eleven[position].extend(position_players.head(min_count).to_dict('records'))
+        bench[position].extend(position_players.iloc[min_count:].to_dict('records'))
+    additional_players_needed = 11 - sum(len(players) for players in starting_eleven.values())
+    if additional_players_needed > 0:
+        for position in sorted(fpl_positions, key=fpl_positions.get, reverse=True):
+            if additional_players_needed == 0:
+                break
+            available_bench_players = [player for player in bench[position] if player not in starting_eleven[position]]
+            additional_players = available_bench_players[:additional_players_needed]
+            starting_eleven[position].extend(additional_players)
+            additional_players_needed -= len(additional_players)
+            bench[position] = [player for player in bench[position] if player not in additional_players]
+    selected_starting_eleven = pd.concat([pd.DataFrame(starting_eleven[pos]) for pos in starting_eleven if starting_eleven[pos]])
+    selected_bench = pd.concat([pd.DataFrame(bench[pos]) for pos in bench if bench[pos]])
+    return selected_starting_eleven, selected_bench
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--squads', type=int, default=10000)
+    parser.add_argument('--legacy-squads', type=int, default=50)
+    args = parser.parse_args()
+
+    _, all_players_df, _, _ = load_source_data()
+    next_gameweek = int(all_players_df.columns[10])
+    player_arrays = build_player_arrays(all_players_df, [str(next_gameweek)])
+    squads = random_squads(player_arrays, args.squads, np.random.default_rng(0))
+    table = all_players_df.reset_index(drop=True)
+    projections = player_arrays['score'][squads]
+    positions = player_arrays['position'][squads]
+
+    start = time.perf_counter()
+    for squad in squads[:args.legacy_squads]:
+        legacy_starting_eleven(table.iloc[squad], next_gameweek)
+    legacy = (time.perf_counter() - start) / args.legacy_squads
+
+    start = time.perf_counter()
+    lineups = best_lineups(projections, positions)
+    batched = (time.perf_counter() - start) / args.squads
+
+    # Points the legacy minimums leave on the table
+    legacy_points = np.array([
+        starting_eleven[str(next_gameweek)].sum() + starting_eleven[str(next_gameweek)].max()
+        for starting_eleven, _ in (legacy_starting_eleven(table.iloc[squad], next_gameweek) for squad in squads[:args.legacy_squads])
+    ])
+    missed = (lineups['points'][:args.legacy_squads] - legacy_points).mean()
+
+    print(f'pandas, per squad   {legacy * 1e3:8.3f} ms/squad')
+    print(f'numpy, batched      {batched * 1e3:8.3f} ms/squad  x{legacy / batched:.0f}')
+    print(f'points gained over the fixed 1/3/4/2 minimums: {missed:.2f} per squad')
+
+
+if __name__ == '__main__':
+    main()
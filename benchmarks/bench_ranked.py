@@ -0,0 +1,74 @@
+"""
+Queries of the ranked player index against the pandas filter-and-sort they replace: top-k by BCV and by a gameweek's
+projection, cheapest-k, the best affordable players outside a squad and players per club. Every answer is checked
+against the pandas one.
+
+    python benchmarks/bench_ranked.py --queries 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+import mock_fpl_server  # noqa: F401, puts python/ on the path
+from bench_transfers import random_squads
+from get_fpl_team import load_source_data
+from ranked_players import POSITION_NAMES, RankedPlayers
+from source_loader import parse_number
+from squad_optimizer import MAX_PLAYERS_PER_TEAM
+
+
+def legacy_queries(table, position, k, max_price, squad, gameweek):
+    """The queries with a mask and a sort of the table each, rows are positions in the table."""
+    in_position = table[table['Position'] == position]
+    top = in_position.sort_values('BCV', ascending=False, kind='stable', na_position='last').index[:k]
+    top_gameweek = in_position.sort_values(str(gameweek), ascending=False, kind='stable').index[:k]
+    cheapest = in_position.sort_values(' Price ', kind='stable').index[:k]
+    club_counts = table['Team'].iloc[squad].value_counts()
+    full_clubs = club_counts.index[club_counts >= MAX_PLAYERS_PER_TEAM]
+    affordable = in_position[(in_position[' Price '] <= max_price) & ~in_position.index.isin(squad) & in_position['Team'].notna()
+                             & ~in_position['Team'].isin(full_clubs)]
+    best = affordable.sort_values('BCV', ascending=False, kind='stable', na_position='last').index[:k]
+    return top, top_gameweek, cheapest, best, club_counts
+
+def ranked_queries(ranked, position, k, max_price, squad, gameweek):
+    club_counts = ranked.club_counts(squad)
+    return (ranked.top(position, k), ranked.top(position, k, gameweek), ranked.cheapest(position, k),
+            ranked.best_affordable(position, max_price, exclude=squad, k=k, club_counts=club_counts), club_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    _, all_players_df, _, _ = load_source_data()
+    ranked = RankedPlayers(all_players_df)
+    # The pandas side sorts the numbers the index sorts, with rows as the index
+    table = all_players_df.reset_index(drop=True).assign(**{column: parse_number(all_players_df[column]).to_numpy()
+                                                            for column in ['BCV'] + [str(gameweek) for gameweek in ranked.gameweeks]},
+                                                         **{' Price ': ranked.price})
+    rng = np.random.default_rng(0)
+    squads = random_squads(ranked.player_arrays(), args.queries, rng)
+    queries = [(POSITION_NAMES[rng.integers(len(POSITION_NAMES))], args.k, int(rng.integers(40, 130)), squad,
+                ranked.gameweeks[rng.integers(len(ranked.gameweeks))]) for squad in squads]
+
+    start = time.perf_counter()
+    legacy = [legacy_queries(table, *query) for query in queries]
+    legacy_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    answers = [ranked_queries(ranked, *query) for query in queries]
+    ranked_seconds = time.perf_counter() - start
+
+    for expected, answer in zip(legacy, answers):
+        for expected_rows, rows in zip(expected[:4], answer[:4]):
+            assert np.array_equal(np.asarray(expected_rows), rows), f'{list(expected_rows)} != {list(rows)}'
+        assert {club: count for club, count in zip(ranked.club_names, answer[4]) if count} == {club: count for club, count in expected[4].items() if count}
+    print(f'players={len(table)}  {args.queries} queries of each kind, k={args.k}, every answer matches pandas')
+    print(f'pandas mask and sort  {legacy_seconds / args.queries * 1e3:8.3f} ms/query')
+    print(f'ranked index          {ranked_seconds / args.queries * 1e3:8.3f} ms/query  x{legacy_seconds / ranked_seconds:.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Report rendering for many managers: the previous print/to_html buffers versus the template renderer."""
+import argparse
+import io
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data, process_manager, get_top_players_by_position
+from player_resolver import build_player_index
+from report_renderer import make_section, render_manager, render_report, render_shared
+
+
+def legacy_render(frames, summaries, top_frames):
+    """Print headings into a StringIO and call to_html for every table, as process_manager used to."""
+    buffer = io.StringIO()
+    for summary, sections in zip(summaries, frames):
+        for line in summary:
+            print(line, file=buffer)
+        for title, df, footer in sections:
+            print(f'\n{title}', file=buffer)
+            df.to_html(index=False, buf=buffer)
+            if footer:
+                print(footer, file=buffer)
+    for title, df, _ in top_frames:
+        print(f'\n{title}', file=buffer)
+        df.to_html(index=False, buf=buffer)
+    return f'<html><body><p>{buffer.getvalue()}</p></body></html>'
+
+
+def template_render(frames, summaries, top_frames):
+    """Build the tables from the same DataFrames, then fill the templates for HTML and text."""
+    def sections(frame_sections):
+        return [make_section(title, df, footer=footer) for title, df, footer in frame_sections]
+    shared = render_shared(sections(top_frames))
+    return render_report([render_manager({'summary': summary, 'sections': sections(frame_sections)})
+                          for summary, frame_sections in zip(summaries, frames)], shared=shared)
+
+
+def as_frames(sections):
+    return [(section['title'], pd.DataFrame(section['table']['rows'], columns=section['table']['columns']), section.get('footer')) for section in sections]
+
+
+def measure(label, function, *args):
+    start = time.perf_counter()
+    function(*args)
+    elapsed = time.perf_counter() - start
+    # Peak memory is measured in a second run, tracemalloc slows allocation heavy code down
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    print(f'{label:22s} {elapsed * 1e3:9.1f} ms  peak {peak / 2 ** 20:7.1f} MiB')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--managers', type=int, default=1000)
+    parser.add_argument('--distinct', type=int, default=10, help='managers analysed, the rest of the results repeat them')
+    args = parser.parse_args()
+
+    df, all_players_df, matching_names_df, _ = load_source_data()
+    next_gameweek = int(df.columns[10])
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=0.0) as server:
+        cache_dir = tempfile.mkdtemp()
+        set_client(FplClient(server.url, cache_dir))
+        player_index = build_player_index(all_players_df, matching_names_df, cache_dir=cache_dir)
+        distinct = [process_manager(manager_id, f'Manager {manager_id}', manager_id % 5 == 0, next_gameweek, all_players_df, player_index)
+                    for manager_id in range(1, args.distinct + 1)]
+    results = [distinct[i % len(distinct)] for i in range(args.managers)]
+    top_sections = get_top_players_by_position(all_players_df, next_gameweek)
+
+    # Both paths start from the same DataFrames, so only table formatting and rendering are timed
+    frames = [as_frames(result['sections']) for result in results]
+    summaries = [result['summary'] for result in results]
+    top_frames = as_frames(top_sections)
+
+    print(f'managers={args.managers}')
+    legacy = measure('print + to_html', legacy_render, frames, summaries, top_frames)
+    templates = measure('templates, html+text', template_render, frames, summaries, top_frames)
+    print(f'speedup x{legacy / templates:.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+A season of the deadline-aware daemon schedule in fast-forward, against the daily 07:00 cron of the workflow.
+
+Each gameweek's source email arrives at a random time in the days before its deadline, and for some gameweeks the
+CSV is sent again later. A check finds an email once it has arrived, so the delay from email to report and the
+reports that miss their deadline follow from when the checks happen. Every check asks the mailbox for new email in
+the pre-check; `72h max age` is the daemon when the pre-check only let a check through 72 hours after the last
+full run, which misses most resent CSVs.
+
+    python benchmarks/bench_scheduler.py --seasons 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../python'))
+
+from precheck import PRECHECK_MAX_AGE_SECONDS
+from scheduler import poll_delay, run_schedule
+
+DAY = 24 * 3600
+# Days between deadlines: mostly weekly, with midweek rounds and international breaks
+DEADLINE_GAPS = [7] * 6 + [3, 4] + [14] + [7] * 5 + [3, 4, 7, 14] + [7] * 6 + [3, 4, 3, 4] + [7] * 4 + [14, 7, 7, 7]
+# Share of gameweeks whose CSV is sent again, at a random time between the first email and the deadline
+RESEND_SHARE = 0.3
+
+
+class FastForwardClock:
+    """A clock whose sleep moves time on at once."""
+
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def build_season(seed):
+    """Deadlines of a 38 gameweek season and the arrival times of each gameweek's source emails, oldest first."""
+    rng = np.random.default_rng(seed)
+    first = datetime(2024, 8, 16, 17, 30, tzinfo=timezone.utc).timestamp()
+    deadlines = first + np.concatenate([[0], np.cumsum(DEADLINE_GAPS[:37])]) * DAY
+    # The email comes one to four days before the deadline, but never before the previous deadline has passed
+    previous = np.concatenate([[first - 7 * DAY], deadlines[:-1]])
+    arrivals = np.maximum(deadlines - rng.uniform(1, 4, size=len(deadlines)) * DAY, previous + 3600)
+    resent = rng.random(len(deadlines)) < RESEND_SHARE
+    resends = arrivals + rng.uniform(0, 1, size=len(deadlines)) * (deadlines - arrivals)
+    emails = [[arrival, resend] if again else [arrival] for arrival, resend, again in zip(arrivals, resends, resent)]
+    return deadlines.tolist(), emails
+
+def simulate(check_times, deadlines, emails, max_age=None):
+    """
+    Delay in hours from email to report per email, the emails whose report came after their deadline and the full
+    runs. A check builds the report of the coming gameweek when an email arrived since the last full run.
+
+    With max_age, a check after the report of the coming gameweek ends at the pre-check until max_age seconds
+    after that report, without asking the mailbox.
+    """
+    delays, late, full_runs = [], 0, 0
+    for deadline, arrivals in zip(deadlines, emails):
+        last_run = None
+        for arrival in arrivals:
+            earliest = arrival if last_run is None or max_age is None else max(arrival, last_run + max_age)
+            i = np.searchsorted(check_times, earliest, side='left')
+            if i == len(check_times) or check_times[i] >= deadline:
+                late += 1
+                continue
+            if check_times[i] == last_run:
+                # Both emails arrived before the same check
+                continue
+            last_run = check_times[i]
+            full_runs += 1
+            delays.append((last_run - arrival) / 3600)
+    return delays, late, full_runs
+
+def daemon_checks(deadlines, start, end):
+    clock = FastForwardClock(start)
+    checks = []
+    while clock.time() < end:
+        checks += run_schedule(lambda: None, lambda: deadlines, clock, ticks=1)
+    return np.array([check for check, _ in checks])
+
+def cron_checks(start, end, hour=7):
+    first = datetime.fromtimestamp(start, timezone.utc).replace(hour=hour, minute=0, second=0).timestamp()
+    return np.arange(first, end, DAY)
+
+def report(label, results, weeks):
+    delays = [delay for season_delays, _, _, _ in results for delay in season_delays]
+    late, full_runs, checks = (sum(result[i] for result in results) / len(results) for i in (1, 2, 3))
+    print(f'{label:12} {checks / weeks:5.1f} checks/week, {full_runs / weeks:5.1f} full runs   email to report median '
+          f'{statistics.median(delays):5.2f} h  p95 {np.percentile(delays, 95):5.2f} h  max {max(delays):5.2f} h   '
+          f'emails reported late {late:4.1f}/season')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seasons', type=int, default=20, help='seasons with different email arrival times')
+    args = parser.parse_args()
+
+    print('hours to deadline ->  delay until the next check')
+    for hours in (120, 72, 48, 24, 12, 6, 1, 0.1):
+        print(f'{hours:17}  ->  {poll_delay(0, [hours * 3600]) / 60:6.0f} min')
+
+    daemon, cron, max_age = [], [], []
+    started = time.perf_counter()
+    for seed in range(args.seasons):
+        deadlines, emails = build_season(seed)
+        start, end = deadlines[0] - 7 * DAY, deadlines[-1] + DAY
+        checks = daemon_checks(deadlines, start, end)
+        daemon.append((*simulate(checks, deadlines, emails), len(checks)))
+        max_age.append((*simulate(checks, deadlines, emails, PRECHECK_MAX_AGE_SECONDS), len(checks)))
+        checks = cron_checks(start, end)
+        cron.append((*simulate(checks, deadlines, emails), len(checks)))
+    elapsed = time.perf_counter() - started
+    weeks = (end - start) / (7 * DAY)
+    print(f'last season: {sum(len(arrivals) for arrivals in emails)} emails for {len(deadlines)} gameweeks')
+    report('cron', cron, weeks)
+    report('daemon', daemon, weeks)
+    report('72h max age', max_age, weeks)
+    print(f'{args.seasons} seasons of {weeks:.0f} weeks simulated in {elapsed:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Latency of the recommendation service under a local load generator, against a mocked FPL API on synthetic source data.
+
+The cold pass is the first request for every manager, the warm passes ask again for managers whose results the
+service keeps in memory.
+
+    python benchmarks/bench_service.py --managers 50 --requests 2000 --clients 8
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from synthetic_data import write_source_data
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data
+from service import RecommendationService
+
+ENDPOINTS = ('manager/{}/lineup', 'manager/{}/transfers', 'manager/{}', 'top-players')
+
+
+def load(url, paths, clients):
+    """Request every path on `clients` threads with one keep-alive session each, return the latencies in seconds."""
+    sessions = {}
+
+    def get(path):
+        session = sessions.setdefault(threading.get_ident(), requests.Session())
+        start = time.perf_counter()
+        response = session.get(f'{url}/{path}')
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, (path, response.status_code, response.text)
+        return elapsed
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        latencies = list(executor.map(get, paths))
+    return latencies, time.perf_counter() - started
+
+def report(label, latencies, wall):
+    milliseconds = np.array(latencies) * 1000
+    print(f'{label:6} {len(latencies):5d} requests  p50 {np.percentile(milliseconds, 50):8.2f} ms  p99 {np.percentile(milliseconds, 99):8.2f} ms'
+          f'  max {milliseconds.max():8.2f} ms  {len(latencies) / wall:8.1f} requests/s')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=700)
+    parser.add_argument('--gameweeks', type=int, default=8)
+    parser.add_argument('--managers', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000, help='requests of the warm pass')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent clients of the load generator')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds added to every mocked API response')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    source_data_path = os.path.join(root, 'source_data')
+    next_gameweek = write_source_data(source_data_path, args.players, args.gameweeks, args.managers)
+    os.environ['FPL_CACHE_DIR'] = os.path.join(root, '.cache')
+
+    # Logged nowhere, status.log of the repository is left alone
+    service = RecommendationService(source_data_path, check_mail=False, logger=logging.getLogger('bench_service'))
+    _, all_players_df, _, _ = load_source_data(source_data_path)
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=args.latency) as server:
+        set_client(FplClient(server.url, os.path.join(root, '.cache'), pool_size=args.clients))
+        start = time.perf_counter()
+        service.refresh()
+        print(f'state loaded in {time.perf_counter() - start:.2f}s: {args.players} players, {args.managers} managers, gameweek {next_gameweek}')
+
+        httpd = service.make_server()
+        threading.Thread(target=httpd.serve_forever, daemon=True).start()
+        url = f'http://127.0.0.1:{httpd.server_port}'
+        try:
+            rng = np.random.default_rng(0)
+            managers = list(range(1, args.managers + 1))
+            # Every manager once, then a mix of endpoints over the same managers
+            cold, cold_wall = load(url, [ENDPOINTS[0].format(manager) for manager in managers], args.clients)
+            report('cold', cold, cold_wall)
+            paths = [ENDPOINTS[i].format(manager) for i, manager in zip(rng.integers(0, len(ENDPOINTS), args.requests), rng.choice(managers, args.requests))]
+            warm, warm_wall = load(url, paths, args.clients)
+            report('warm', warm, warm_wall)
+            text, text_wall = load(url, [f'{path}?format=text' for path in paths[:args.requests // 4]], args.clients)
+            report('text', text, text_wall)
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+        print(f'mocked API requests: {server.counts}')
+        print(f'warm p50 is x{statistics.median(cold) / statistics.median(warm):.0f} faster than a fresh analysis')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Wall-clock time of a league run with the Monte Carlo risk tables, sampling in the worker threads and on a process pool.
+
+Every run must give the same tables: each manager's scenarios come from seeded streams of its own, whatever
+the pool or the order of the managers.
+
+    python benchmarks/bench_simulation.py --managers 50 --scenarios 20000 --processes 1 2 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+import simulation
+from synthetic_data import write_source_data
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data
+from player_resolver import build_player_index
+from worker import process_managers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=700)
+    parser.add_argument('--managers', type=int, default=50)
+    parser.add_argument('--scenarios', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=4, help='managers processed concurrently')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2, 4], help='sizes of the simulation pool, 1 samples in the worker threads')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    source_data_path = os.path.join(root, 'source_data')
+    next_gameweek = write_source_data(source_data_path, args.players, managers=args.managers)
+    _, all_players_df, matching_names_df, _ = load_source_data(source_data_path)
+    managers = [{'ID': manager_id, 'Manager': f'Manager {manager_id}', 'Wildcard': manager_id % 5 == 0} for manager_id in range(1, args.managers + 1)]
+
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=0) as server:
+        set_client(FplClient(server.url, os.path.join(root, '.cache')))
+        player_index = build_player_index(all_players_df, matching_names_df, cache_dir=root)
+        start = time.perf_counter()
+        process_managers(managers, next_gameweek, all_players_df, player_index, args.workers)
+        baseline = time.perf_counter() - start
+        print(f'without simulation  {baseline:7.2f}s')
+
+        reference = None
+        for processes in args.processes:
+            simulation.SIMULATION_WORKERS = processes
+            simulation.set_pool(None)
+            # The pool is started outside the timing, as a long run starts it once
+            if simulation.get_pool() is not None:
+                list(simulation.get_pool().map(int, range(processes)))
+            start = time.perf_counter()
+            fragments = process_managers(managers, next_gameweek, all_players_df, player_index, args.workers, simulate=args.scenarios)
+            elapsed = time.perf_counter() - start
+            if simulation.get_pool() is not None:
+                simulation.get_pool().shutdown()
+            reference = reference or fragments
+            assert fragments == reference, 'the risk tables changed with the pool'
+            print(f'processes={processes:2d}  {elapsed:7.2f}s  {(elapsed - baseline) / len(managers) * 1000:7.1f} ms of simulation per manager'
+                  f'  ({args.scenarios} scenarios)')
+    print(fragments[0]['text'].split('Simulated Scenarios')[1].split('\n\n')[0])
+
+
+if __name__ == '__main__':
+    main()
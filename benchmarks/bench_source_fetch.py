@@ -0,0 +1,79 @@
+"""Bytes moved by the source data check: the previous RFC822 fetch and full download versus the lean fetch."""
+import argparse
+import email
+import os
+import shutil
+import tempfile
+
+import requests
+
+from mock_mail_server import MockFileServer, MockImapServer, build_source_mail
+from get_fpl_team import get_source_data_path
+from update_source_data import fetch_new_source_data_from_gmail
+
+
+def legacy_fetch(imap_server, next_gameweek_api, source_data_path):
+    """The previous fetch with the Gmail connection and the hard-coded SINCE taken out, walking past container parts."""
+    is_found, is_updated = False, False
+    imap_server.select('inbox')
+    _, email_ids = imap_server.search(None, f'(FROM "bingo@patreon.com" SUBJECT "GW {next_gameweek_api} - the Transfer Algorithm")')
+    _, email_data = imap_server.fetch(email_ids[0].split()[-1], '(RFC822)')
+    email_message = email.message_from_bytes(email_data[0][1])
+    for part in email_message.walk():
+        if part.get_content_type() != 'text/html':
+            continue
+        url = next(link for link in str(part.get_payload(decode=True)).split('"') if '.csv' in link)
+        is_found = True
+        response = requests.get(url)
+        temp_file_path = f'{source_data_path}/TransferAlgorithm_temp.csv'
+        with open(temp_file_path, 'wb') as f:
+            f.write(response.content)
+        existing_file_path = f'{source_data_path}/TransferAlgorithm.csv'
+        with open(existing_file_path, 'rb') as f:
+            existing_content = f.read()
+        with open(temp_file_path, 'rb') as f:
+            is_updated = existing_content != f.read()
+        if is_updated:
+            os.replace(temp_file_path, existing_file_path)
+        else:
+            os.remove(temp_file_path)
+        break
+    imap_server.close()
+    imap_server.logout()
+    return is_found, is_updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--attachment-kb', type=int, default=500, help='size of an image attached to every email')
+    parser.add_argument('--emails', type=int, default=5, help='older Transfer Algorithm emails already in the mailbox')
+    args = parser.parse_args()
+
+    with open(f'{get_source_data_path()}/TransferAlgorithm.csv', 'rb') as f:
+        csv = f.read()
+    gameweek = 9
+
+    with MockFileServer({'gw9.csv': csv}) as files, MockImapServer() as mailbox:
+        for older in range(gameweek - args.emails, gameweek):
+            mailbox.deliver(build_source_mail(older, files.url(f'gw{older}.csv'), args.attachment_kb * 1024))
+        mailbox.deliver(build_source_mail(gameweek, files.url('gw9.csv'), args.attachment_kb * 1024))
+
+        def measure(label, fetch):
+            imap_before, http_before = mailbox.bytes_sent, files.bytes_sent
+            is_found, is_updated = fetch()
+            print(f'{label:34s} IMAP {(mailbox.bytes_sent - imap_before) / 1024:8.1f} KiB   '
+                  f'HTTP {(files.bytes_sent - http_before) / 1024:8.1f} KiB   found={is_found} updated={is_updated}')
+
+        for name, fetch in (('previous', lambda folder, state: legacy_fetch(mailbox.connect(), gameweek, folder)),
+                            ('lean', lambda folder, state: fetch_new_source_data_from_gmail(gameweek, '01-OCT-2024', mailbox.connect(), source_data_path=folder, state_path=state))):
+            folder = tempfile.mkdtemp()
+            state = os.path.join(folder, 'source_mail.json')
+            with open(f'{folder}/TransferAlgorithm.csv', 'wb') as f:
+                f.write(b'last week')
+            measure(f'{name}, new email', lambda: fetch(folder, state))
+            measure(f'{name}, unchanged', lambda: fetch(folder, state))
+            shutil.rmtree(folder)
+
+
+if __name__ == '__main__':
+    main()
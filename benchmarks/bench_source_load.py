@@ -0,0 +1,77 @@
+"""Load time and memory of TransferAlgorithm.csv: text parsing versus the typed binary cache."""
+import argparse
+import glob
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+import mock_fpl_server  # noqa: F401, puts python/ on the path
+from get_fpl_team import get_source_data_path
+from source_loader import read_transfer_algorithm
+
+
+def legacy_load(csv_path):
+    """The previous text load: object columns and a regex pass for BCV."""
+    df = pd.read_csv(csv_path, encoding='ISO-8859-1')
+    df['BCV'] = df[' BCV '].str.extract(r'([-+]?\d*\.\d+|\d+)').astype(float).abs()
+    return df
+
+
+def enlarge(csv_path, target_rows, out_path):
+    """Repeat the rows of the real CSV, with renamed players, until the file has target_rows rows."""
+    with open(csv_path, 'rb') as f:
+        header, *rows = f.read().splitlines()
+    with open(out_path, 'wb') as out:
+        out.write(header + b'\n')
+        for i in range(target_rows):
+            fields = rows[i % len(rows)].split(b',')
+            fields[3] += b' %d' % (i // len(rows))
+            out.write(b','.join(fields) + b'\n')
+
+
+def first_parse(csv_path):
+    """Typed load with no cache on disk yet."""
+    for cache_path in glob.glob(f'{os.path.splitext(csv_path)[0]}.*.npz'):
+        os.remove(cache_path)
+    return read_transfer_algorithm(csv_path)
+
+
+def measure(function, *args):
+    # tracemalloc slows Python-level code down a lot, so time and memory come from separate runs
+    start = time.perf_counter()
+    df = function(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, df.memory_usage(deep=True).sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[525, 5000, 50000])
+    args = parser.parse_args()
+
+    source_csv = os.path.join(get_source_data_path(), 'TransferAlgorithm.csv')
+    work_dir = tempfile.mkdtemp()
+    try:
+        print(f"{'rows':>7}  {'path':<22} {'time':>9} {'peak alloc':>11} {'frame size':>11}")
+        for rows in args.rows:
+            csv_path = os.path.join(work_dir, f'TransferAlgorithm_{rows}.csv')
+            enlarge(source_csv, rows, csv_path)
+            for label, function in (('csv text (before)', legacy_load),
+                                    ('typed, first parse', first_parse),
+                                    ('typed, from cache', read_transfer_algorithm)):
+                elapsed, peak, size = measure(function, csv_path)
+                print(f'{rows:7d}  {label:<22} {elapsed * 1e3:7.1f}ms {peak / 2**20:9.1f}MB {size / 2**20:9.1f}MB')
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main()
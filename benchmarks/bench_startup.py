@@ -0,0 +1,96 @@
+"""
+Start-up time of `python python/worker.py` when the pre-check ends the run and when the full pipeline loads.
+
+The worker runs from a copy of python/ next to synthetic source data, so status.log and .cache of the repository
+are left alone. The no-op path asks a local mock mailbox for new source email, the full path is timed up to its
+first request, which goes to a port nothing listens on.
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+PYTHON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../python')
+sys.path.insert(0, PYTHON_DIR)
+
+from synthetic_data import write_source_data
+from mock_mail_server import FIRST_UID, MockImapServer, build_source_mail
+from precheck import save_state, clear_state
+
+
+def run_worker(root, env, importtime=False):
+    """Run the worker once, return (seconds, stderr)."""
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [os.path.join(root, 'python', 'worker.py')]
+    start = time.perf_counter()
+    completed = subprocess.run(command, env=env, capture_output=True, text=True)
+    return time.perf_counter() - start, completed.stderr
+
+def parse_importtime(stderr):
+    """Total import time and the cumulative time of every top-level import, in milliseconds."""
+    total, top = 0.0, {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        total += int(self_us) / 1000
+        # Nested imports are indented below the module that imported them
+        if not name[1:].startswith(' '):
+            top[name.strip()] = top.get(name.strip(), 0.0) + int(cumulative_us) / 1000
+    return total, top
+
+def measure(label, root, env, runs):
+    times = [run_worker(root, env)[0] for _ in range(runs)]
+    _, stderr = run_worker(root, env, importtime=True)
+    total, top = parse_importtime(stderr)
+    heaviest = sorted(top.items(), key=lambda item: item[1], reverse=True)[:6]
+    print(f'{label:8} wall {statistics.median(times) * 1000:8.1f} ms (median of {runs})   imports {total:7.1f} ms   {len(top)} top-level modules')
+    for name, milliseconds in heaviest:
+        print(f'{"":10}{name:28} {milliseconds:7.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root, MockImapServer() as mailbox:
+        shutil.copytree(PYTHON_DIR, os.path.join(root, 'python'), ignore=shutil.ignore_patterns('__pycache__'))
+        next_gameweek = write_source_data(os.path.join(root, 'source_data'))
+        env = dict(os.environ, FPL_CACHE_DIR=os.path.join(root, '.cache'), FPL_API_URL='http://127.0.0.1:9/api',
+                   FPL_IMAP_HOST='127.0.0.1', FPL_IMAP_PORT=str(mailbox.port), FPL_IMAP_SSL='0',
+                   EMAIL_ADDRESS='user', EMAIL_PASSWORD='password')
+        # The last full run read the gameweek's email
+        mailbox.deliver(build_source_mail(next_gameweek, 'http://127.0.0.1:9/gw.csv'))
+        os.makedirs(env['FPL_CACHE_DIR'])
+        with open(os.path.join(env['FPL_CACHE_DIR'], 'source_mail.json'), 'w', encoding='utf8') as f:
+            json.dump({'uidvalidity': str(mailbox.uidvalidity), 'last_uid': FIRST_UID, 'gameweek': next_gameweek}, f)
+        # Byte-compile once, as a deployed worker would have been
+        run_worker(root, env)
+
+        # What a clean full run before the deadline leaves behind, with the default settings of worker.py
+        os.environ['FPL_CACHE_DIR'] = env['FPL_CACHE_DIR']
+        save_state(next_gameweek, time.time() + 24 * 3600, [5, None, 0], source_data_path=os.path.join(root, 'source_data'))
+        measure('no-op', root, env, args.runs)
+        with open(os.path.join(root, 'status.log'), encoding='utf8') as f:
+            assert '"outcome": "noop"' in f.read().splitlines()[-1]
+
+        # The CSV is sent again within the gameweek, the pre-check lets the next run through
+        mailbox.deliver(build_source_mail(next_gameweek, 'http://127.0.0.1:9/gw.csv'))
+        run_worker(root, env)
+        with open(os.path.join(root, 'status.log'), encoding='utf8') as f:
+            assert '"outcome": "noop"' not in f.read().splitlines()[-1]
+        print('resent CSV: full run')
+
+        clear_state()
+        measure('full', root, env, args.runs)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Time and peak memory of the recommendation pipeline on synthetic source data of growing size.
+
+Results are written to benchmarks/results/<commit>.json, compare two of them with --compare.
+
+    python benchmarks/bench_suite.py --players 700 5000 --gameweeks 8 38
+    python benchmarks/bench_suite.py --compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import glob
+import itertools
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from synthetic_data import write_source_data
+from fpl_client import FplClient, get_client, set_client
+from get_fpl_team import load_source_data, process_manager, get_top_players_by_position, read_team_from_api, gather_players
+from player_resolver import build_player_index
+from transfer_recommendation import recommend_transfers_one_transfer, recommend_transfers_wildcard
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(function, setup=None, repeat=3, memory=True):
+    """Best wall time over `repeat` calls and, in a separate call, the peak traced memory in MiB."""
+    # tracemalloc slows Python-level code down a lot, so time and memory come from separate runs
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        if setup is not None:
+            setup()
+        tracemalloc.start()
+        function()
+        peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+    return {'seconds': round(min(times), 5), 'peak_mib': None if peak is None else round(peak, 2)}
+
+def bench_size(players, gameweeks, repeat, memory, work_dir):
+    """Run every benchmarked function on one synthetic source data folder."""
+    source_dir = os.path.join(work_dir, f'source_{players}x{gameweeks}')
+    next_gameweek = write_source_data(source_dir, players, gameweeks, managers=1)
+    score_gameweeks = range(next_gameweek, next_gameweek + 3)
+
+    def clear_cache():
+        for cache_path in glob.glob(os.path.join(source_dir, 'TransferAlgorithm.*.npz')):
+            os.remove(cache_path)
+
+    results = {
+        'load_source_data': measure(lambda: load_source_data(source_dir), clear_cache, repeat, memory),
+        'load_source_data (cached)': measure(lambda: load_source_data(source_dir), None, repeat, memory),
+    }
+    _, all_players_df, matching_names_df, _ = load_source_data(source_dir)
+
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=0) as server:
+        set_client(FplClient(server.url, os.path.join(work_dir, f'cache_{players}x{gameweeks}')))
+        player_index = build_player_index(all_players_df, matching_names_df, cache_dir=os.path.join(work_dir, 'index'))
+        # The API calls are made once up front, only the analysis is timed
+        picks = get_client().get_picks(1, next_gameweek - 1)
+        entry = get_client().get_entry(1)
+        history = get_client().get_history(1)
+        bank, team_value = entry['last_deadline_bank'] / 10, entry['last_deadline_value'] / 10
+        team_df = read_team_from_api(1, next_gameweek - 1, picks)
+        squad = player_index.rows(team_df['element'])
+        merged_team_df = gather_players(team_df, all_players_df, squad)
+
+        results['process_manager'] = measure(
+            lambda: process_manager(1, 'Manager 1', False, next_gameweek, all_players_df, player_index, picks=picks, entry=entry, history=history), None, repeat, memory)
+        results['process_manager (wildcard)'] = measure(
+            lambda: process_manager(1, 'Manager 1', True, next_gameweek, all_players_df, player_index, picks=picks, entry=entry, history=history), None, repeat, memory)
+        results['get_top_players_by_position'] = measure(
+            lambda: get_top_players_by_position(all_players_df, next_gameweek), None, repeat, memory)
+        results['recommend_transfers_one_transfer'] = measure(
+            lambda: recommend_transfers_one_transfer(all_players_df, bank, merged_team_df, gameweeks=score_gameweeks, top_k=5, squad=squad), None, repeat, memory)
+        results['recommend_transfers_wildcard'] = measure(
+            lambda: recommend_transfers_wildcard(all_players_df, bank, team_value, gameweeks=score_gameweeks), None, repeat, memory)
+    return [{'function': function, 'players': players, 'gameweeks': gameweeks, **result} for function, result in results.items()]
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+def compare(base_path, head_path):
+    """Print the time and memory of every benchmark in head relative to base."""
+    with open(base_path, encoding='utf8') as f:
+        base = {(r['function'], r['players'], r['gameweeks']): r for r in json.load(f)['results']}
+    with open(head_path, encoding='utf8') as f:
+        head = json.load(f)['results']
+    print(f"{'function':34} {'players':>7} {'gws':>3} {'base s':>9} {'head s':>9} {'ratio':>6} {'base MiB':>9} {'head MiB':>9}")
+    for result in head:
+        old = base.get((result['function'], result['players'], result['gameweeks']))
+        if old is None:
+            continue
+        ratio = result['seconds'] / old['seconds'] if old['seconds'] else float('nan')
+        print(f"{result['function']:34} {result['players']:7d} {result['gameweeks']:3d} {old['seconds']:9.4f} {result['seconds']:9.4f} "
+              f"{ratio:6.2f} {old['peak_mib'] or 0:9.1f} {result['peak_mib'] or 0:9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, nargs='+', default=[700, 5000, 20000, 50000])
+    parser.add_argument('--gameweeks', type=int, nargs='+', default=[8, 38])
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls per benchmark, the best is kept')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc runs')
+    parser.add_argument('--output', help='results file, benchmarks/results/<commit>.json by default')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'HEAD'), help='compare two results files instead of running')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    commit, dirty = git_commit()
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for players, gameweeks in itertools.product(args.players, args.gameweeks):
+            for result in bench_size(players, gameweeks, args.repeat, not args.no_memory, work_dir):
+                results.append(result)
+                peak = '' if result['peak_mib'] is None else f"{result['peak_mib']:8.1f} MiB"
+                print(f"{result['function']:34} players={players:6d} gws={gameweeks:2d}  {result['seconds']:9.4f}s  {peak}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}{'-dirty' if dirty else ''}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf8') as f:
+        json.dump({
+            'commit': commit,
+            'dirty': dirty,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'cpus': os.cpu_count(),
+            'results': results,
+        }, f, indent=1)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
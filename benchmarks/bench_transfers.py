@@ -0,0 +1,74 @@
+"""Single-transfer search: the previous iterrows loop versus the batched NumPy engine."""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import mock_fpl_server  # noqa: F401, puts python/ on the path
+from get_fpl_team import load_source_data
+from source_loader import parse_number
+from ranked_players import build_player_arrays
+from transfer_recommendation import best_single_transfers
+
+SQUAD_QUOTAS = [2, 5, 5, 3]
+
+
+def legacy_one_transfer(all_players_df, current_bank_value, current_team_df):
+    """The iterrows loop this engine replaced, with its 'Price' lookup fixed to ' Price '."""
+    df = all_players_df[~all_players_df['Player'].isin(current_team_df['Player'])]
+    recommendations = {}
+    for position in df['Position'].unique():
+        sorted_players = df[df['Position'] == position].sort_values(by='BCV', ascending=False)
+        top_player = sorted_players.iloc[0]
+        potential_transfers = []
+        for _, player_row in sorted_players.iterrows():
+            if player_row['Player'] != top_player['Player']:
+                price_difference = player_row[' Price '] - top_player[' Price ']
+                if price_difference <= current_bank_value:
+                    potential_transfers.append((top_player['Player'], player_row['Player'], player_row['BCV'], price_difference))
+        if potential_transfers:
+            recommendations[position] = potential_transfers
+    return recommendations
+
+
+def random_squads(player_arrays, n_squads, rng):
+    squads = np.empty((n_squads, sum(SQUAD_QUOTAS)), dtype=np.int32)
+    column = 0
+    for position, count in enumerate(SQUAD_QUOTAS):
+        rows = np.flatnonzero(player_arrays['position'] == position)
+        squads[:, column:column + count] = [rng.choice(rows, count, replace=False) for _ in range(n_squads)]
+        column += count
+    return squads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--squads', type=int, default=5000)
+    parser.add_argument('--legacy-squads', type=int, default=20)
+    args = parser.parse_args()
+
+    _, all_players_df, _, _ = load_source_data()
+    next_gameweek = int(all_players_df.columns[10])
+    numeric_df = all_players_df.assign(**{' Price ': parse_number(all_players_df[' Price '])})
+    player_arrays = build_player_arrays(all_players_df, [str(next_gameweek + i) for i in range(3)])
+    rng = np.random.default_rng(0)
+    squads = random_squads(player_arrays, args.squads, rng)
+    banks = rng.integers(0, 30, size=args.squads)
+
+    start = time.perf_counter()
+    for squad in squads[:args.legacy_squads]:
+        legacy_one_transfer(numeric_df, 1.0, pd.DataFrame({'Player': player_arrays['player'][squad]}))
+    legacy = (time.perf_counter() - start) / args.legacy_squads
+
+    start = time.perf_counter()
+    best_single_transfers(player_arrays, squads, banks, top_k=10)
+    batched = (time.perf_counter() - start) / args.squads
+
+    print(f'players={len(all_players_df)}')
+    print(f'iterrows loop     {legacy * 1e3:8.2f} ms/squad  {60 / legacy:10.0f} squads/min')
+    print(f'numpy, batched    {batched * 1e3:8.2f} ms/squad  {60 / batched:10.0f} squads/min  x{legacy / batched:.0f}')
+
+
+if __name__ == '__main__':
+    main()
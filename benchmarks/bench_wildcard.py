@@ -0,0 +1,210 @@
+"""
+Wildcard squad selection: the previous greedy loop versus the exact branch and bound optimizer.
+
+With --check, optimize_squad is compared with a brute-force search over every squad of small random pools instead,
+with the club limit binding and quotas scaled down as well as the full ones, and so is optimize_lineup_squad, the free
+hit squad picked for its XI and captain.
+
+    python benchmarks/bench_wildcard.py --check --pools 200
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+
+import mock_fpl_server  # noqa: F401, puts python/ on the path
+from get_fpl_team import load_source_data
+from source_loader import parse_number
+from transfer_recommendation import recommend_transfers_wildcard
+from lineup import FORMATIONS
+from squad_optimizer import SQUAD_QUOTAS, optimize_lineup_squad, optimize_squad
+
+
+def legacy_wildcard(all_players_df, current_bank_value, current_team_value, max_swaps=100):
+    """
+    The greedy fill-then-upgrade loop the optimizer replaced, scored by BCV.
+
+    The original loop runs until less than 1.0 is left in the bank and never ends when no upgrade fits,
+    this copy stops after max_swaps swaps.
+    """
+    positions = {"GK": 2, "D": 5, "M": 5, "F": 3}
+    budget = current_bank_value + current_team_value
+    team_player_count = {}
+    selected_players_list = []
+
+    def add_player_to_selected(player, position):
+        nonlocal budget
+        selected_players_list.append({'Player': player['Player'], 'Position': position, 'BCV': player['BCV'],
+                                      'Price': player[' Price '], 'Team': player['Team']})
+        team_player_count[player['Team']] = team_player_count.get(player['Team'], 0) + 1
+        budget -= player[' Price ']
+        positions[position] -= 1
+
+    def pick_better_player(position):
+        nonlocal budget
+        better_players = all_players_df[(all_players_df['Position'] == position) & (~all_players_df['Player'].isin([x['Player'] for x in selected_players_list]))]
+        for _, player in better_players.sort_values(by='BCV', ascending=False).iterrows():
+            if player[' Price '] <= budget:
+                add_player_to_selected(player, position)
+                break
+
+    for pos in positions:
+        cheap_players = all_players_df[all_players_df['Position'] == pos].nsmallest(1, ' Price ').sort_values(by='BCV', ascending=False)
+        if not cheap_players.empty and cheap_players.iloc[0][' Price '] <= budget:
+            add_player_to_selected(cheap_players.iloc[0], pos)
+    for pos in positions:
+        position_players = all_players_df[(all_players_df['Position'] == pos) & (~all_players_df['Player'].isin([x['Player'] for x in selected_players_list]))]
+        for _, player in position_players.sort_values(by='BCV', ascending=False).iterrows():
+            if positions[pos] > 0 and player[' Price '] <= budget and team_player_count.get(player['Team'], 0) < 3:
+                add_player_to_selected(player, pos)
+    swaps = 0
+    while budget > 1.0 and swaps < max_swaps:
+        swaps += 1
+        player_to_remove = sorted(selected_players_list, key=lambda x: (x['Price'], -x['BCV']))[0]
+        selected_players_list.remove(player_to_remove)
+        budget += player_to_remove['Price']
+        positions[player_to_remove['Position']] += 1
+        team_player_count[player_to_remove['Team']] -= 1
+        pick_better_player(player_to_remove['Position'])
+    return pd.DataFrame(selected_players_list)
+
+
+def timed(function, *args, repeat=3, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def random_pool(rng, sizes, n_clubs):
+    """Player arrays of a random pool, `sizes` players per position, with scores that favour a few clubs."""
+    position = np.repeat(np.arange(len(sizes)), sizes).astype(np.int8)
+    club = rng.integers(0, n_clubs, size=len(position)).astype(np.int16)
+    price = rng.integers(40, 130, size=len(position)).astype(np.int32)
+    # Strong clubs and a score that grows with price make the club limit and the budget both bind
+    score = (price / 10 + rng.normal(0, 2, size=len(position)) + 3 * (club < 2)).astype(np.float32)
+    return {'player': np.arange(len(position)), 'price': price, 'score': score, 'position': position,
+            'club': club, 'club_names': np.arange(n_clubs)}
+
+def brute_force_squad(player_arrays, budget, quotas, max_per_team):
+    """The best total score over every squad that fits the quotas, the budget and the club limit, -inf when none does."""
+    price, score, club = player_arrays['price'], player_arrays['score'], player_arrays['club']
+    n_clubs = len(player_arrays['club_names'])
+    total_price, total_score, counts = np.zeros(1, dtype=np.int64), np.zeros(1), np.zeros((1, n_clubs), dtype=np.int64)
+    for code, quota in enumerate(quotas):
+        combos = np.array(list(itertools.combinations(np.flatnonzero(player_arrays['position'] == code), quota)), dtype=np.int64)
+        combo_counts = np.stack([np.bincount(club[rows], minlength=n_clubs) for rows in combos])
+        # Every partial squad with every combination of this position
+        total_price = (total_price[:, None] + price[combos].sum(axis=1)[None, :]).ravel()
+        total_score = (total_score[:, None] + score[combos].astype(np.float64).sum(axis=1)[None, :]).ravel()
+        counts = (counts[:, None, :] + combo_counts[None, :, :]).reshape(-1, n_clubs)
+        fits = (total_price <= budget) & (counts <= max_per_team).all(axis=1)
+        total_price, total_score, counts = total_price[fits], total_score[fits], counts[fits]
+    return total_score.max() if len(total_score) else -np.inf
+
+def brute_force_lineup_squad(player_arrays, budget, max_per_team):
+    """The best XI points, the captain counted twice, over every full squad within the budget and the club limit."""
+    price, score, club = player_arrays['price'], player_arrays['score'].astype(np.float64), player_arrays['club']
+    n_clubs = len(player_arrays['club_names'])
+    best = -np.inf
+    for formation in FORMATIONS:
+        total_price, total_score, captain = np.zeros(1, dtype=np.int64), np.zeros(1), np.full(1, -np.inf)
+        counts = np.zeros((1, n_clubs), dtype=np.int64)
+        for code, quota in enumerate(SQUAD_QUOTAS):
+            # Every combination of this position's players, with every choice of its starters among them
+            options = [(rows, starters) for rows in itertools.combinations(np.flatnonzero(player_arrays['position'] == code), quota)
+                       for starters in itertools.combinations(rows, formation[code])]
+            option_price = np.array([price[list(rows)].sum() for rows, _ in options])
+            option_score = np.array([score[list(starters)].sum() for _, starters in options])
+            option_top = np.array([score[list(starters)].max() for _, starters in options])
+            option_counts = np.stack([np.bincount(club[list(rows)], minlength=n_clubs) for rows, _ in options])
+            total_price = (total_price[:, None] + option_price[None, :]).ravel()
+            total_score = (total_score[:, None] + option_score[None, :]).ravel()
+            captain = np.maximum(captain[:, None], option_top[None, :]).ravel()
+            counts = (counts[:, None, :] + option_counts[None, :, :]).reshape(-1, n_clubs)
+            fits = (total_price <= budget) & (counts <= max_per_team).all(axis=1)
+            total_price, total_score, captain, counts = total_price[fits], total_score[fits], captain[fits], counts[fits]
+        if len(total_score):
+            best = max(best, (total_score + captain).max())
+    return best
+
+def check_lineup_optimizer(pools):
+    """Compare optimize_lineup_squad with brute_force_lineup_squad on random pools, return the number of pools compared."""
+    rng = np.random.default_rng(1)
+    # Few players beyond the quotas keep brute force small, few clubs make the club limit bind
+    shapes = [((3, 6, 6, 4), 6), ((3, 6, 6, 4), 8), ((2, 7, 6, 4), 7)]
+    for i in range(pools):
+        sizes, n_clubs = shapes[i % len(shapes)]
+        player_arrays = random_pool(rng, sizes, n_clubs)
+        # Between the cheapest and the dearest 15 players, the pools hold only a few more than a squad
+        prices = np.sort(player_arrays['price'])
+        cheapest, dearest = prices[:sum(SQUAD_QUOTAS)].sum(), prices[-sum(SQUAD_QUOTAS):].sum()
+        budget = int(cheapest + rng.uniform(0.3, 1.0) * (dearest - cheapest))
+        rows, points = optimize_lineup_squad(player_arrays, budget)
+        expected = brute_force_lineup_squad(player_arrays, budget, 3)
+        if rows is None:
+            assert expected == -np.inf, f'pool {i}: the optimizer found no squad, brute force scored {expected:.3f}'
+            continue
+        assert (np.bincount(player_arrays['club'][rows], minlength=n_clubs) <= 3).all() and player_arrays['price'][rows].sum() <= budget
+        assert np.array_equal(np.bincount(player_arrays['position'][rows], minlength=len(SQUAD_QUOTAS)), SQUAD_QUOTAS)
+        assert np.isclose(points, expected, atol=1e-3), f'pool {i}: optimizer {points:.3f}, brute force {expected:.3f}'
+    return pools
+
+def check_optimizer(pools):
+    """
+    Compare optimize_squad with brute_force_squad on random pools, return the number of pools compared.
+    Every other pool has a limit of its own for every club, as the free hit XI has after its bench.
+    """
+    rng = np.random.default_rng(0)
+    # (players per position, quotas, clubs, max per club), brute force stays within a few thousand squads
+    shapes = [((3, 6, 6, 4), SQUAD_QUOTAS, 6, 3), ((6, 8, 8, 6), (1, 2, 2, 1), 4, 2), ((5, 7, 7, 5), (1, 3, 3, 2), 3, 3)]
+    for i in range(pools):
+        sizes, quotas, n_clubs, max_per_team = shapes[i % len(shapes)]
+        player_arrays = random_pool(rng, sizes, n_clubs)
+        if i % 2:
+            max_per_team = rng.integers(1, max_per_team + 1, size=n_clubs)
+        budget = int(rng.uniform(0.6, 1.0) * np.sort(player_arrays['price'])[::-1][:sum(quotas)].sum())
+        rows, value = optimize_squad(player_arrays, budget, quotas, max_per_team)
+        expected = brute_force_squad(player_arrays, budget, quotas, max_per_team)
+        if rows is None:
+            assert expected == -np.inf, f'pool {i}: the optimizer found no squad, brute force scored {expected:.3f}'
+            continue
+        counts = np.bincount(player_arrays['club'][rows], minlength=n_clubs)
+        assert (counts <= max_per_team).all() and player_arrays['price'][rows].sum() <= budget
+        assert np.array_equal(np.bincount(player_arrays['position'][rows], minlength=len(quotas)), quotas)
+        assert np.isclose(value, expected, atol=1e-4), f'pool {i}: optimizer {value:.3f}, brute force {expected:.3f}'
+    return pools
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--check', action='store_true', help='compare the optimizer with brute force on small random pools')
+    parser.add_argument('--pools', type=int, default=200, help='random pools compared with --check')
+    args = parser.parse_args()
+    if args.check:
+        start = time.perf_counter()
+        print(f'optimize_squad matched brute force on {check_optimizer(args.pools)} pools in {time.perf_counter() - start:.1f}s')
+        start = time.perf_counter()
+        print(f'optimize_lineup_squad matched brute force on {check_lineup_optimizer(args.pools)} pools in {time.perf_counter() - start:.1f}s')
+        return
+
+    _, all_players_df, _, _ = load_source_data()
+    next_gameweek = int(all_players_df.columns[10])
+    numeric_df = all_players_df.assign(**{' Price ': parse_number(all_players_df[' Price '])})
+
+    greedy, greedy_time = timed(legacy_wildcard, numeric_df, 0.5, 99.5)
+    exact, exact_time = timed(recommend_transfers_wildcard, all_players_df, 0.5, 99.5)
+    horizon, horizon_time = timed(recommend_transfers_wildcard, all_players_df, 0.5, 99.5, gameweeks=range(next_gameweek, next_gameweek + 3))
+
+    print(f'players={len(all_players_df)}  budget=100.0')
+    print(f'greedy, BCV            {greedy_time * 1e3:8.1f} ms  BCV {greedy["BCV"].sum():6.2f}  players {len(greedy)}')
+    print(f'optimizer, BCV         {exact_time * 1e3:8.1f} ms  BCV {exact["BCV"].sum():6.2f}  players {len(exact)}')
+    print(f'optimizer, 3 gameweeks {horizon_time * 1e3:8.1f} ms  points {horizon["Score"].sum():6.2f}  players {len(horizon)}')
+
+
+if __name__ == '__main__':
+    main()
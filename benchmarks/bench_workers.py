@@ -0,0 +1,47 @@
+"""
+Wall-clock time of worker.process_managers, serial versus concurrent, against a mocked FPL API.
+
+A few managers answer with API errors, they are skipped without ending the run.
+"""
+import argparse
+import tempfile
+import time
+
+from mock_fpl_server import MockFplServer, build_bootstrap
+from fpl_client import FplClient, set_client
+from get_fpl_team import load_source_data
+from player_resolver import build_player_index
+from worker import process_managers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--managers', type=int, default=60)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every mocked API response')
+    parser.add_argument('--failing', type=int, default=2, help='managers whose picks answer 404 and 503 in turn')
+    args = parser.parse_args()
+
+    df, all_players_df, matching_names_df, _ = load_source_data()
+    next_gameweek = int(df.columns[10])
+    managers = [{'ID': manager_id, 'Manager': f'Manager {manager_id}', 'Wildcard': False} for manager_id in range(1, args.managers + 1)]
+
+    failing = {manager_id: (404, 503)[manager_id % 2] for manager_id in range(1, args.failing + 1)}
+    with MockFplServer(build_bootstrap(all_players_df, next_gameweek), latency=args.latency, failing=failing) as server:
+        baseline = None
+        for workers in args.workers:
+            cache_dir = tempfile.mkdtemp()
+            set_client(FplClient(server.url, cache_dir))
+            start = time.perf_counter()
+            player_index = build_player_index(all_players_df, matching_names_df, cache_dir=cache_dir)
+            fragments = process_managers(managers, next_gameweek, all_players_df, player_index, workers)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            assert len(fragments) == len(managers)
+            assert sum(fragment.get('skipped', False) for fragment in fragments) == len(failing)
+            print(f'workers={workers:3d}  managers={len(managers)}  {elapsed:7.2f}s  speedup x{baseline / elapsed:.1f}')
+        print(f"requests: {server.counts}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../python'))
+
+ELEMENT_TYPES = {'GK': 1, 'D': 2, 'M': 3, 'F': 4}
+SQUAD_QUOTAS = {'GK': 2, 'D': 5, 'M': 5, 'F': 3}
+# Deadline of gameweek 1, the later ones follow weekly
+SEASON_START = datetime(2024, 8, 16, 17, 30, tzinfo=timezone.utc)
+
+
+def build_bootstrap(players_df, next_gameweek):
+    """Build a bootstrap-static payload whose players match the rows of a TransferAlgorithm frame."""
+    players_df = players_df[players_df['Team'].notna()]
+    teams = sorted(players_df['Team'].unique())
+    team_ids = {team: i + 1 for i, team in enumerate(teams)}
+    elements = []
+    for element_id, row in enumerate(players_df.itertuples(index=False), start=1):
+        elements.append({
+            'id': element_id,
+            'web_name': row.Player,
+            'first_name': '',
+            'second_name': row.Player,
+            'element_type': ELEMENT_TYPES[row.Position],
+            'team': team_ids[row.Team],
+        })
+    events = [{
+        'id': gameweek,
+        'is_current': gameweek == next_gameweek - 1,
+        'is_next': gameweek == next_gameweek,
+        'finished': gameweek < next_gameweek,
+        'deadline_time': (SEASON_START + timedelta(weeks=gameweek - 1)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+    } for gameweek in range(1, 39)]
+    return {
+        'elements': elements,
+        'teams': [{'id': team_id, 'short_name': team} for team, team_id in team_ids.items()],
+        'events': events,
+    }
+
+
+def build_picks(bootstrap, manager_id):
+    """Pick a legal-shaped 15 man squad for a manager, the same one on every call, fielded 4-4-2 and captained by a midfielder."""
+    rng = np.random.default_rng(manager_id)
+    squad = {}
+    for position, count in SQUAD_QUOTAS.items():
+        ids = [e['id'] for e in bootstrap['elements'] if e['element_type'] == ELEMENT_TYPES[position]]
+        squad[position] = [int(element) for element in rng.choice(ids, size=count, replace=False)]
+    # The API lists the XI first, goalkeeper to forwards, then the bench
+    order = squad['GK'][:1] + squad['D'][:4] + squad['M'][:4] + squad['F'][:2] + squad['GK'][1:] + squad['D'][4:] + squad['M'][4:] + squad['F'][2:]
+    picks = [{'element': element, 'position': i + 1, 'multiplier': (2 if i == 5 else 1) if i < 11 else 0, 'is_captain': i == 5}
+             for i, element in enumerate(order)]
+    return {'picks': picks, 'entry_history': {'bank': 15, 'value': 1000, 'points': int(rng.integers(30, 90)), 'event_transfers_cost': 0}}
+
+
+def build_history(bootstrap, manager_id):
+    """Transfers made and chips played by a manager in the finished gameweeks, the same ones on every call."""
+    rng = np.random.default_rng(manager_id)
+    finished = [event['id'] for event in bootstrap['events'] if event['finished']]
+    chips = [{'name': name, 'event': int(rng.choice(finished))} for name in ('wildcard', 'bboost', '3xc', 'freehit')
+             if finished and rng.random() < 0.3]
+    transfers = rng.choice([0, 0, 1, 1, 2], size=len(finished))
+    current = [{'event': event, 'event_transfers': int(count), 'event_transfers_cost': 0} for event, count in zip(finished, transfers)]
+    return {'current': current, 'past': [], 'chips': chips}
+
+
+def build_live(bootstrap, gameweek):
+    """Points scored by every player in a gameweek, the same ones on every call."""
+    points = np.random.default_rng(gameweek).poisson(2.5, size=len(bootstrap['elements']))
+    return {'elements': [{'id': e['id'], 'stats': {'total_points': int(p), 'minutes': 90 if p else 0}}
+                         for e, p in zip(bootstrap['elements'], points)]}
+
+
+class MockFplServer:
+    """Local stand-in for the FPL endpoints that counts requests and adds a fixed latency."""
+
+    def __init__(self, bootstrap, latency=0.02, standings=None, failing=None):
+        self.bootstrap = bootstrap
+        self.bootstrap_body = json.dumps(bootstrap).encode('utf8')
+        self.latency = latency
+        # Number of entries in each mocked classic league, keyed by league id
+        self.standings = standings or {}
+        # Status answered for every entry endpoint of these managers, e.g. 404 for a deleted team
+        self.failing = failing or {}
+        self.counts = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/api'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, kind):
+        return self.counts.get(kind, 0)
+
+    def handle(self, request):
+        time.sleep(self.latency)
+        parts = [part for part in request.path.split('?')[0].split('/') if part][1:]
+        status, body, headers = 404, b'{}', {}
+        if parts == ['bootstrap-static']:
+            kind = 'bootstrap-static'
+            if request.headers.get('If-None-Match') == '"mock"':
+                status, body = 304, b''
+            else:
+                status, body, headers = 200, self.bootstrap_body, {'ETag': '"mock"'}
+        elif len(parts) >= 2 and parts[0] == 'entry' and int(parts[1]) in self.failing:
+            kind = 'failing'
+            status = self.failing[int(parts[1])]
+        elif len(parts) == 5 and parts[0] == 'entry' and parts[4] == 'picks':
+            kind = 'picks'
+            status, body = 200, json.dumps(build_picks(self.bootstrap, int(parts[1]))).encode('utf8')
+        elif len(parts) == 3 and parts[0] == 'entry' and parts[2] == 'history':
+            kind = 'history'
+            status, body = 200, json.dumps(build_history(self.bootstrap, int(parts[1]))).encode('utf8')
+        elif len(parts) == 2 and parts[0] == 'entry':
+            kind = 'entry'
+            entry = {'id': int(parts[1]), 'last_deadline_bank': 15, 'last_deadline_value': 1000}
+            status, body = 200, json.dumps(entry).encode('utf8')
+        elif len(parts) == 3 and parts[0] == 'event' and parts[2] == 'live':
+            kind = 'live'
+            status, body = 200, json.dumps(build_live(self.bootstrap, int(parts[1]))).encode('utf8')
+        elif len(parts) == 3 and parts[0] == 'leagues-classic' and parts[2] == 'standings':
+            kind = 'standings'
+            query = dict(item.split('=') for item in request.path.partition('?')[2].split('&') if item)
+            page = int(query.get('page_standings', 1))
+            status, body = 200, json.dumps(self.standings_page(int(parts[1]), page)).encode('utf8')
+        else:
+            kind = 'other'
+        with self._lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+        request.send_response(status)
+        for key, value in headers.items():
+            request.send_header(key, value)
+        request.send_header('Content-Type', 'application/json')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+    def standings_page(self, league_id, page, page_size=50):
+        entries = self.standings.get(league_id, 0)
+        first = (page - 1) * page_size
+        results = [{'entry': i, 'entry_name': f'Team {i}', 'player_name': f'Manager {i}', 'rank': i}
+                   for i in range(first + 1, min(first + page_size, entries) + 1)]
+        return {'league': {'id': league_id}, 'standings': {'page': page, 'has_next': first + page_size < entries, 'results': results}}
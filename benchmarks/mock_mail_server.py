@@ -0,0 +1,290 @@
+import hashlib
+import imaplib
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../python'))
+
+# Mock UIDs start well above the sequence numbers so code mixing the two fails loudly
+FIRST_UID = 101
+
+
+def build_source_mail(gameweek, csv_url, attachment_size=0):
+    """Build a Transfer Algorithm email: plain and HTML text with the CSV link, optionally an image attachment."""
+    message = EmailMessage()
+    message['From'] = 'The Transfer Algorithm <bingo@patreon.com>'
+    message['Subject'] = f'GW {gameweek} - the Transfer Algorithm'
+    message.set_content(f'The Transfer Algorithm for gameweek {gameweek} is out: {csv_url}')
+    message.add_alternative(f'<html><body><p>Gameweek {gameweek}</p><a href="{csv_url}">Download the CSV</a>'
+                            f'<a href="https://www.patreon.com/">Patreon</a></body></html>', subtype='html')
+    if attachment_size:
+        message.add_attachment(os.urandom(attachment_size), maintype='image', subtype='png', filename='chart.png')
+    return message
+
+
+def body_structure(part):
+    """BODYSTRUCTURE of an email.message part, enough of RFC 3501 for imaplib clients."""
+    if part.is_multipart():
+        children = ''.join(body_structure(child) for child in part.get_payload())
+        return f'({children} "{part.get_content_subtype().upper()}")'
+    payload = part.get_payload().encode('ascii')
+    charset = part.get_param('charset')
+    params = f'("CHARSET" "{charset}")' if charset else 'NIL'
+    encoding = part.get('Content-Transfer-Encoding', '7BIT').upper()
+    structure = f'"{part.get_content_maintype().upper()}" "{part.get_content_subtype().upper()}" {params} NIL NIL "{encoding}" {len(payload)}'
+    if part.get_content_maintype() == 'text':
+        structure += f' {len(payload.splitlines())}'
+    return f'({structure})'
+
+
+class MockImapServer:
+    """
+    Local IMAP4 stand-in for the mailbox, serving LOGIN, SELECT, (UID) SEARCH, (UID) FETCH, CLOSE and LOGOUT.
+
+    FETCH understands RFC822, BODYSTRUCTURE and BODY[n] / BODY.PEEK[n]. The bytes sent to clients are counted.
+    """
+
+    def __init__(self, messages=(), uidvalidity=1):
+        self.messages = list(messages)
+        self.uidvalidity = uidvalidity
+        self.bytes_sent = 0
+        self.commands = []
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_client(self)
+
+        self.tcp_server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.tcp_server.daemon_threads = True
+        self.port = self.tcp_server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.tcp_server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.tcp_server.shutdown()
+        self.tcp_server.server_close()
+
+    def connect(self):
+        """Return a logged in imaplib client."""
+        client = imaplib.IMAP4('127.0.0.1', self.port)
+        client.login('user', 'password')
+        return client
+
+    def deliver(self, message):
+        with self._lock:
+            self.messages.append(message)
+
+    def serve_client(self, handler):
+        def send(data):
+            with self._lock:
+                self.bytes_sent += len(data)
+            handler.wfile.write(data)
+
+        send(b'* OK IMAP4rev1 mock ready\r\n')
+        for line in handler.rfile:
+            tag, command, args = (line.decode().rstrip('\r\n').split(' ', 2) + ['', ''])[:3]
+            command = command.upper()
+            uid = command == 'UID'
+            if uid:
+                command, _, args = args.partition(' ')
+                command = command.upper()
+            with self._lock:
+                self.commands.append(command)
+            if command == 'CAPABILITY':
+                send(b'* CAPABILITY IMAP4rev1\r\n')
+            elif command == 'SELECT':
+                send(f'* {len(self.messages)} EXISTS\r\n* OK [UIDVALIDITY {self.uidvalidity}] UIDs valid\r\n'.encode())
+                send(f'{tag} OK [READ-WRITE] SELECT completed\r\n'.encode())
+                continue
+            elif command == 'SEARCH':
+                matches = self.search(args, uid)
+                send(f'* SEARCH {" ".join(map(str, matches))}\r\n'.encode())
+            elif command == 'FETCH':
+                number, _, items = args.partition(' ')
+                send(self.fetch(int(number), items.strip('()').upper(), uid))
+            elif command == 'LOGOUT':
+                send(b'* BYE mock logging out\r\n')
+                send(f'{tag} OK LOGOUT completed\r\n'.encode())
+                return
+            send(f'{tag} OK {command} completed\r\n'.encode())
+
+    def search(self, criteria, uid):
+        """Match FROM and SUBJECT as substrings and UID n:* ranges, SINCE is ignored."""
+        values = dict((key.upper(), value) for key, value in re.findall(r'(FROM|SUBJECT) "([^"]*)"', criteria, re.I))
+        uid_range = re.search(r'UID (\d+):\*', criteria, re.I)
+        last_uid = FIRST_UID + len(self.messages) - 1
+        matches = []
+        for sequence, message in enumerate(self.messages, 1):
+            message_uid = FIRST_UID + sequence - 1
+            if 'FROM' in values and values['FROM'].lower() not in message['From'].lower():
+                continue
+            if 'SUBJECT' in values and values['SUBJECT'].lower() not in message['Subject'].lower():
+                continue
+            # 'n:*' includes the last message even when n is above its UID
+            if uid_range and message_uid < min(int(uid_range.group(1)), last_uid):
+                continue
+            matches.append(message_uid if uid else sequence)
+        return matches
+
+    def fetch(self, number, items, uid):
+        sequence = number - FIRST_UID + 1 if uid else number
+        message = self.messages[sequence - 1]
+        prefix = f'* {sequence} FETCH (UID {FIRST_UID + sequence - 1} ' if uid else f'* {sequence} FETCH ('
+        if items == 'RFC822':
+            body = message.as_bytes()
+            return f'{prefix}RFC822 {{{len(body)}}}\r\n'.encode() + body + b')\r\n'
+        if items == 'BODYSTRUCTURE':
+            return f'{prefix}BODYSTRUCTURE {body_structure(message)})\r\n'.encode()
+        part_number = re.fullmatch(r'BODY(?:\.PEEK)?\[([\d.]+)\]', items).group(1)
+        part = message
+        for index in part_number.split('.'):
+            if part.is_multipart():
+                part = part.get_payload()[int(index) - 1]
+        body = part.get_payload().encode('ascii')
+        return f'{prefix}BODY[{part_number}] {{{len(body)}}}\r\n'.encode() + body + b')\r\n'
+
+
+class MockFileServer:
+    """Local HTTP file server that answers If-None-Match with 304 and counts the body bytes it sends."""
+
+    def __init__(self, files):
+        self.files = dict(files)
+        self.bytes_sent = 0
+        self.requests = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                server.handle(self)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def url(self, path):
+        return f'{self.base_url}/{path}'
+
+    def handle(self, request):
+        body = self.files.get(request.path.lstrip('/'))
+        if body is None:
+            request.send_response(404)
+            request.send_header('Content-Length', '0')
+            request.end_headers()
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        not_modified = request.headers.get('If-None-Match') == etag
+        if not_modified:
+            body = b''
+        with self._lock:
+            self.requests += 1
+            self.not_modified += not_modified
+            self.bytes_sent += len(body)
+        request.send_response(304 if not_modified else 200)
+        request.send_header('ETag', etag)
+        request.send_header('Content-Type', 'text/csv')
+        request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        request.wfile.write(body)
+
+
+class MockSmtpServer:
+    """
+    Local SMTP sink that keeps every accepted message.
+
+    connect_latency stands in for the TLS handshake and login of a real server. Every fail_every-th
+    message is answered with a temporary 451 error and every drop_every-th connection is dropped
+    after its first message.
+    """
+
+    def __init__(self, connect_latency=0.0, fail_every=0, drop_every=0):
+        self.connect_latency = connect_latency
+        self.fail_every = fail_every
+        self.drop_every = drop_every
+        self.messages = []
+        self.connections = 0
+        self.attempts = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_client(self)
+
+        self.tcp_server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), Handler)
+        self.tcp_server.daemon_threads = True
+        self.port = self.tcp_server.server_address[1]
+
+    def __enter__(self):
+        threading.Thread(target=self.tcp_server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.tcp_server.shutdown()
+        self.tcp_server.server_close()
+
+    def serve_client(self, handler):
+        with self._lock:
+            self.connections += 1
+            connection = self.connections
+        time.sleep(self.connect_latency)
+        handler.wfile.write(b'220 mock ESMTP ready\r\n')
+        sender, recipients, received = None, [], 0
+        for line in handler.rfile:
+            command = line.decode().strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                handler.wfile.write(b'250-mock\r\n250-PIPELINING\r\n250 8BITMIME\r\n')
+            elif verb in ('HELO', 'NOOP'):
+                handler.wfile.write(b'250 OK\r\n')
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                handler.wfile.write(b'250 OK\r\n')
+            elif verb == 'MAIL':
+                sender = command.partition(':')[2].split()[0].strip('<>')
+                handler.wfile.write(b'250 OK\r\n')
+            elif verb == 'RCPT':
+                recipients.append(command.partition(':')[2].strip().strip('<>'))
+                handler.wfile.write(b'250 OK\r\n')
+            elif verb == 'DATA':
+                handler.wfile.write(b'354 End data with <CR><LF>.<CR><LF>\r\n')
+                data = b''.join(iter(handler.rfile.readline, b'.\r\n'))
+                with self._lock:
+                    self.attempts += 1
+                    fail = self.fail_every and self.attempts % self.fail_every == 0
+                    if not fail:
+                        self.messages.append({'from': sender, 'to': recipients, 'data': data})
+                handler.wfile.write(b'451 Try again later\r\n' if fail else b'250 OK queued\r\n')
+                sender, recipients = None, []
+                received += 1
+                if self.drop_every and connection % self.drop_every == 0 and received == 1:
+                    return
+            elif verb == 'QUIT':
+                handler.wfile.write(b'221 Bye\r\n')
+                return
+            else:
+                handler.wfile.write(b'502 Command not implemented\r\n')
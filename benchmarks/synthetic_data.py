@@ -0,0 +1,154 @@
+"""
+Synthetic source data in the format of the Transfer Algorithm CSV, for benchmarks at sizes the real file doesn't reach.
+
+    python benchmarks/synthetic_data.py out_dir --players 20000 --gameweeks 38
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+CLUBS = ['ARS', 'AVL', 'BOU', 'BRE', 'BRI', 'CHE', 'CPL', 'EVE', 'FUL', 'IPS',
+         'LEI', 'LIV', 'MCI', 'MUN', 'NEW', 'NOT', 'SOU', 'TOT', 'WHM', 'WOL']
+# The CSV lists midfielders, forwards, defenders and goalkeepers in separate blocks, each numbered from 1
+POSITION_SHARES = {'M': 0.39, 'F': 0.18, 'D': 0.38, 'GK': 0.05}
+# Columns with minutes, UPPM, PPG and fixture ratio, the defender and goalkeeper blocks leave them empty
+OUTFIELD_STATS = ('M', 'F')
+SYLLABLES = ['ba', 'ca', 'de', 'do', 'fe', 'ga', 'gu', 'ha', 'ki', 'ko', 'la', 'li', 'ma', 'mo', 'na', 'ne',
+             'pa', 'pe', 'ra', 'ri', 'ro', 'sa', 'se', 'si', 'ta', 'te', 'to', 'va', 'vi', 'za', 'zé', 'ñu',
+             'rt', 'ns', 'ck', 'ld', 'sk', 'ic', 'ør', 'ül']
+FIRST_NAMES = ['Pape', 'Reiss', 'Diego', 'Luis', 'Jan', 'Tom', 'Ben', 'Yves', 'Joël', 'André', 'Kai', 'Emil']
+PLACEHOLDER_SHARE = 0.03
+EMPTY_SHARE = 0.02
+DASH_SHARE = 0.04
+
+
+def first_gameweek_for(gameweeks):
+    """Next gameweek of a CSV with this many gameweek columns, the real file starts at 9 and ends by 38."""
+    return min(9, 39 - gameweeks)
+
+def player_names(rng, count):
+    """Unique surnames with accents, a first name in parentheses tells namesakes apart as in the real file."""
+    lengths = rng.integers(2, 4, size=count)
+    picks = rng.integers(0, len(SYLLABLES), size=(count, 3))
+    names, seen = [], set()
+    for length, syllables in zip(lengths, picks):
+        name = ''.join(SYLLABLES[s] for s in syllables[:length]).capitalize()
+        candidate = name
+        for first_name in FIRST_NAMES:
+            if candidate not in seen:
+                break
+            candidate = f'{name} ({first_name})'
+        if candidate in seen:
+            candidate = f'{name} {len(seen)}'
+        seen.add(candidate)
+        names.append(candidate)
+    return names
+
+def format_numbers(values, decimals=2):
+    """Pad numbers as the CSV does: ' 5.23 ', negatives as ' (0.05)' and missing values as ' -   '."""
+    text = np.char.mod(f'%.{decimals}f', np.abs(np.nan_to_num(values)))
+    padded = np.where(values < 0, np.char.add(np.char.add(' (', text), ')'), np.char.add(np.char.add(' ', text), ' '))
+    return np.where(np.isnan(values), ' -   ', padded)
+
+def position_block(rng, position, count, gameweeks, fixtures):
+    """Rows of one position block: players, placeholders with BCV (1.00) and unnamed rows without a club."""
+    placeholders = int(count * PLACEHOLDER_SHARE)
+    empty = int(count * EMPTY_SHARE)
+    players = count - placeholders - empty
+
+    clubs = rng.integers(0, len(CLUBS), size=count)
+    price = np.clip(np.round(3.9 + rng.lognormal(0.4, 0.7, size=count), 1), 3.9, 15.0)
+    regular = rng.random(count) < 0.7
+    ppg = np.where(regular, np.clip((price - 3.5) * 0.6 + rng.normal(0, 0.8, size=count), 0.3, None), rng.uniform(0, 1, size=count))
+    projections = ppg[:, None] * fixtures[clubs] * rng.normal(1, 0.12, size=(count, gameweeks)).clip(0.3)
+    # Injured and new players have no projection for the first few gameweeks
+    unavailable = (rng.random(count) < DASH_SHARE)[:, None] & (np.arange(gameweeks) < rng.integers(1, gameweeks, size=count)[:, None])
+    projections[unavailable] = np.nan
+    bcv = np.nanmean(projections, axis=1) / 10 - (price - 3.9) * 0.05 + rng.normal(0, 0.03, size=count)
+
+    projections[players:] = np.nan
+    bcv[players:players + placeholders] = -1.0
+    price[players:players + placeholders] = 100.0
+    bcv[players + placeholders:] = np.nan
+
+    block = {
+        'No.': np.arange(1, count + 1).astype(str),
+        ' BCV ': format_numbers(np.round(bcv, 2)),
+        'Position': np.full(count, position),
+        'Player': player_names(rng, count),
+        'Team': np.array(CLUBS)[clubs],
+        ' Price ': format_numbers(price, 1),
+    }
+    block['Player'][players + placeholders:] = ['0'] * empty
+    block['Team'][players + placeholders:] = ''
+    block[' Price '][players + placeholders:] = ''
+    if position in OUTFIELD_STATS:
+        minutes = np.where(regular, rng.uniform(45, 90, size=count), rng.uniform(0, 45, size=count))
+        minutes[rng.random(count) < DASH_SHARE] = np.nan
+        block[' Weighted minutes '] = format_numbers(minutes)
+        block[' Weighted UPPM '] = format_numbers(rng.uniform(0.02, 0.09, size=count), 3)
+        block[' PPG - longer term '] = format_numbers(np.where(np.isnan(minutes), np.nan, ppg))
+        block['Fixture ratio'] = np.char.add(np.char.mod('%d', np.round(fixtures[clubs].mean(axis=1) * 100)), '%')
+    else:
+        for column in (' Weighted minutes ', ' Weighted UPPM ', ' PPG - longer term ', 'Fixture ratio'):
+            block[column] = np.full(count, '')
+    return block, projections
+
+def build_transfer_algorithm(players, gameweeks, seed=0):
+    """DataFrame of strings holding a TransferAlgorithm.csv with `players` rows and `gameweeks` projection columns."""
+    rng = np.random.default_rng(seed)
+    first_gameweek = first_gameweek_for(gameweeks)
+    gameweek_columns = [str(gameweek) for gameweek in range(first_gameweek, first_gameweek + gameweeks)]
+    # How kind each club's fixture is in each gameweek, shared by its players
+    fixtures = rng.uniform(0.7, 1.3, size=(len(CLUBS), gameweeks))
+
+    counts = {position: int(players * share) for position, share in POSITION_SHARES.items()}
+    counts['M'] += players - sum(counts.values())
+    blocks = []
+    for position, count in counts.items():
+        block, projections = position_block(rng, position, count, gameweeks, fixtures)
+        frame = pd.DataFrame(block)
+        frame[gameweek_columns] = np.stack([format_numbers(column) for column in projections.T], axis=1)
+        if blocks:
+            # An empty row separates the blocks
+            blocks.append(pd.DataFrame([[''] * frame.shape[1]], columns=frame.columns))
+        blocks.append(frame)
+    return pd.concat(blocks, ignore_index=True)
+
+def write_source_data(directory, players=700, gameweeks=8, managers=10, seed=0):
+    """
+    Write a source_data folder: TransferAlgorithm.csv, an empty matching_names.csv and manager_ids_2024.csv.
+
+    Returns:
+    The next gameweek of the CSV.
+    """
+    os.makedirs(directory, exist_ok=True)
+    df = build_transfer_algorithm(players, gameweeks, seed)
+    df.to_csv(os.path.join(directory, 'TransferAlgorithm.csv'), index=False, encoding='ISO-8859-1')
+    # Synthetic web names are the player names, so no name needs matching by hand
+    pd.DataFrame(columns=['web_name', 'Player']).to_csv(os.path.join(directory, 'matching_names.csv'), index=False)
+    pd.DataFrame({
+        'ID': range(1, managers + 1),
+        'Manager': [f'Manager {i}' for i in range(1, managers + 1)],
+        'Wildcard': [i % 5 == 0 for i in range(1, managers + 1)],
+        'Include': True,
+    }).to_csv(os.path.join(directory, 'manager_ids_2024.csv'), index=False)
+    return first_gameweek_for(gameweeks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--players', type=int, default=700)
+    parser.add_argument('--gameweeks', type=int, default=8)
+    parser.add_argument('--managers', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    next_gameweek = write_source_data(args.directory, args.players, args.gameweeks, args.managers, args.seed)
+    print(f'{args.players} players, gameweeks {next_gameweek}-{next_gameweek + args.gameweeks - 1} written to {args.directory}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+import argparse
+import filecmp
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import numpy as np
+import pandas as pd
+import requests
+from fpl_client import get_client, read_json_file, write_file_atomic
+from get_fpl_team import load_projections, get_source_data_path
+from league import iter_league_pages, get_reports_path
+from lineup import best_lineups, lineup_points
+from player_resolver import build_player_index
+from ranked_players import build_player_arrays, build_projection_matrix
+from transfer_recommendation import best_single_transfers
+
+# Gameweeks a recommended transfer is scored over, the window of the emailed recommendations
+TRANSFER_WINDOW = 3
+# Managers evaluated together by one task of the process pool
+REPLAY_CHUNK_SIZE = 1000
+# Fields of bootstrap-static kept in the archive, enough to match players to the projections
+ELEMENT_FIELDS = ('id', 'web_name', 'first_name', 'second_name', 'team', 'element_type')
+# Columns of the replay results, see replay_chunk
+RESULT_COLUMNS = ['manager', 'gameweek', 'projected_points', 'points', 'best_points', 'manager_points',
+                  'transfer_out', 'transfer_in', 'projected_gain', 'actual_gain', 'scored_gameweeks']
+
+
+def snapshot_source(next_gameweek, bootstrap, source_data_path=None, archive_dir=None):
+    """
+    Keep the source data a gameweek's recommendations were made from.
+
+    Copies TransferAlgorithm.csv and matching_names.csv and the FPL players of bootstrap-static to
+    archive/gwNN/. A later snapshot of the same gameweek replaces the earlier one, so the archive holds
+    the last data before the deadline.
+    """
+    source_data_path = source_data_path or get_source_data_path()
+    gameweek_dir = get_gameweek_path(next_gameweek, archive_dir)
+    os.makedirs(gameweek_dir, exist_ok=True)
+    for name in ('TransferAlgorithm.csv', 'matching_names.csv'):
+        source, target = os.path.join(source_data_path, name), os.path.join(gameweek_dir, name)
+        if not os.path.exists(target) or not filecmp.cmp(source, target, shallow=False):
+            shutil.copyfile(source, f'{target}.tmp')
+            os.replace(f'{target}.tmp', target)
+    players = {
+        'elements': [{field: element.get(field) for field in ELEMENT_FIELDS} for element in bootstrap['elements']],
+        'teams': [{'id': team['id'], 'short_name': team['short_name']} for team in bootstrap['teams']],
+    }
+    write_file_atomic(os.path.join(gameweek_dir, 'players.json'), json.dumps(players, separators=(',', ':')).encode('utf8'))
+    return gameweek_dir
+
+def archive_results(manager_ids, gameweeks=None, archive_dir=None, workers=4):
+    """
+    Fetch what the replay scores against: every player's points and the managers' picks of finished gameweeks.
+
+    Parameters:
+    - manager_ids: managers whose picks are archived.
+    - gameweeks: gameweeks to archive, every snapshot in the archive when None. Unfinished ones are skipped.
+    - archive_dir: folder of the archive, archive/ at the repository root by default.
+    - workers: concurrent API requests.
+
+    Returns:
+    Number of API requests made. Points and picks already in the archive are not fetched again.
+
+    archive/gwNN/live.json holds {element: points} and archive/gwNN/picks.json {manager: {'squad', 'bank',
+    'points', 'transfers_cost'}}, where the squad and bank are those the gameweek's recommendations were
+    made for (the picks of the gameweek before) and points are what the manager scored.
+    """
+    finished = {event['id'] for event in get_client().get_bootstrap_static()['events'] if event['finished']}
+    gameweeks = archived_gameweeks(archive_dir) if gameweeks is None else gameweeks
+    manager_ids = [int(manager_id) for manager_id in manager_ids]
+    requests_made = 0
+    # Picks of the last gameweek archived, they are the squads going into the next one
+    previous, previous_gameweek = {}, None
+    get_client().resize_pool(max(workers, 1))
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        # Gameweek 1 has no squad before its deadline to recommend for
+        for gameweek in sorted(set(gameweeks) & finished - {1}):
+            gameweek_dir = get_gameweek_path(gameweek, archive_dir)
+            os.makedirs(gameweek_dir, exist_ok=True)
+            live_path = os.path.join(gameweek_dir, 'live.json')
+            if not os.path.exists(live_path):
+                live = get_client().get_live(gameweek)
+                requests_made += 1
+                points = {element['id']: element['stats']['total_points'] for element in live['elements']}
+                write_file_atomic(live_path, json.dumps(points, separators=(',', ':')).encode('utf8'))
+
+            picks_path = os.path.join(gameweek_dir, 'picks.json')
+            archived = read_json_file(picks_path) if os.path.exists(picks_path) else {}
+            missing = [manager_id for manager_id in manager_ids if str(manager_id) not in archived]
+            if previous_gameweek != gameweek - 1:
+                previous = {}
+            fetch_before = [manager_id for manager_id in missing if manager_id not in previous]
+            before = {**previous, **dict(zip(fetch_before, executor.map(partial(fetch_picks, gameweek=gameweek - 1), fetch_before)))}
+            played = dict(zip(missing, executor.map(partial(fetch_picks, gameweek=gameweek), missing)))
+            requests_made += len(fetch_before) + len(missing)
+            previous, previous_gameweek = played, gameweek
+            if not missing:
+                continue
+
+            for manager_id in missing:
+                if before[manager_id] is None or played[manager_id] is None:
+                    continue
+                archived[str(manager_id)] = {
+                    'squad': before[manager_id]['squad'],
+                    'bank': before[manager_id]['bank'],
+                    'points': played[manager_id]['points'],
+                    'transfers_cost': played[manager_id]['transfers_cost'],
+                }
+            write_file_atomic(picks_path, json.dumps(archived, separators=(',', ':')).encode('utf8'))
+    return requests_made
+
+def fetch_picks(manager_id, gameweek):
+    """A manager's squad, bank and points of a gameweek, None when the manager didn't play it."""
+    try:
+        picks = get_client().get_picks(manager_id, gameweek)
+    except requests.HTTPError as e:
+        # Managers who joined later have no picks for the gameweeks before
+        if e.response is not None and e.response.status_code == 404:
+            return None
+        raise
+    return {
+        'squad': [pick['element'] for pick in picks['picks']],
+        'bank': picks['entry_history']['bank'],
+        'points': picks['entry_history']['points'],
+        'transfers_cost': picks['entry_history'].get('event_transfers_cost', 0),
+    }
+
+def replay(gameweeks=None, archive_dir=None, workers=None, chunk_size=REPLAY_CHUNK_SIZE):
+    """
+    Replay the lineup and transfer recommendations of archived gameweeks and score them against actual points.
+
+    Parameters:
+    - gameweeks: gameweeks to replay, every gameweek with a snapshot, picks and points when None.
+    - archive_dir: folder of the archive, archive/ at the repository root by default.
+    - workers: processes of the pool, one per CPU when None.
+    - chunk_size: managers evaluated together by one task.
+
+    Returns:
+    DataFrame with a row per (manager, gameweek), see replay_chunk.
+
+    Runs from the archive alone, nothing is fetched. Each task evaluates a chunk of one gameweek's
+    managers as a batch, so the snapshot is parsed once per task rather than once per manager.
+    """
+    archive_dir = archive_dir or get_archive_path()
+    if gameweeks is None:
+        gameweeks = [gameweek for gameweek in archived_gameweeks(archive_dir)
+                     if all(os.path.exists(os.path.join(get_gameweek_path(gameweek, archive_dir), name)) for name in ('picks.json', 'live.json'))]
+    tasks = []
+    for gameweek in gameweeks:
+        manager_ids = sorted(int(manager_id) for manager_id in read_json_file(os.path.join(get_gameweek_path(gameweek, archive_dir), 'picks.json')))
+        tasks.extend((gameweek, manager_ids[start:start + chunk_size]) for start in range(0, len(manager_ids), chunk_size))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # The projection and player index caches of a snapshot are written once, before its chunks read them
+        list(executor.map(prepare_gameweek, [archive_dir] * len(gameweeks), gameweeks))
+        chunks = executor.map(replay_chunk, [archive_dir] * len(tasks), *zip(*tasks)) if tasks else []
+        results = [row for chunk in chunks for row in chunk]
+    return pd.DataFrame(results, columns=RESULT_COLUMNS)
+
+def prepare_gameweek(archive_dir, gameweek):
+    load_gameweek(archive_dir, gameweek)
+
+def load_gameweek(archive_dir, gameweek):
+    """Return the projections, player index and archived players of a gameweek's snapshot."""
+    gameweek_dir = get_gameweek_path(gameweek, archive_dir)
+    _, all_players_df = load_projections(os.path.join(gameweek_dir, 'TransferAlgorithm.csv'))
+    matching_names_df = pd.read_csv(os.path.join(gameweek_dir, 'matching_names.csv'))
+    players = read_json_file(os.path.join(gameweek_dir, 'players.json'))
+    player_index = build_player_index(all_players_df, matching_names_df, bootstrap=players, cache_dir=gameweek_dir)
+    return all_players_df, player_index, players
+
+def replay_chunk(archive_dir, gameweek, manager_ids):
+    """
+    Evaluate the recommendations for a batch of managers in one gameweek.
+
+    Each result has the projected and actual points of the recommended XI with its captain counted twice
+    (no automatic substitutions), the best XI of the same squad in hindsight, the manager's own score,
+    and the best recommended transfer with its projected and actual gain over the transfer window.
+    """
+    all_players_df, player_index, players = load_gameweek(archive_dir, gameweek)
+    picks = read_json_file(os.path.join(get_gameweek_path(gameweek, archive_dir), 'picks.json'))
+    window = [g for g in range(gameweek, gameweek + TRANSFER_WINDOW) if str(g) in all_players_df.columns]
+    points_by_gameweek = [read_points(archive_dir, g, players) for g in window]
+    scored = [points for points in points_by_gameweek if points is not None]
+
+    entries = [picks[str(manager_id)] for manager_id in manager_ids]
+    elements = np.array([entry['squad'] for entry in entries], dtype=np.int64)
+    rows = player_index.rows(elements.ravel()).reshape(elements.shape)
+    known = rows >= 0
+
+    # Lineup: picked on the projections of the gameweek, scored with its actual points
+    player_arrays = build_player_arrays(all_players_df, [str(g) for g in window])
+    projections = build_projection_matrix(all_players_df, [gameweek])[:, 0]
+    positions = np.where(known, player_arrays['position'][np.where(known, rows, 0)], -1)
+    lineup = best_lineups(np.where(known, projections[np.where(known, rows, 0)], np.nan), positions)
+    current = points_by_gameweek[0] if window and window[0] == gameweek else None
+    actual = current[elements] if current is not None else np.full(elements.shape, np.nan)
+    starters = lineup['starters']
+    xi_points = np.where(starters >= 0, np.take_along_axis(actual, np.maximum(starters, 0), axis=1), 0).sum(axis=1)
+    lineup_actual = xi_points + np.take_along_axis(actual, lineup['captain'][:, None], axis=1)[:, 0]
+    element_positions = np.full(int(elements.max()) + 1, -1)
+    for element in players['elements']:
+        if element['id'] < len(element_positions):
+            element_positions[element['id']] = element['element_type'] - 1
+    best_points = lineup_points(actual, element_positions[elements])
+
+    # Transfer: the best single move on the window's projections, scored with the window's actual points
+    banks = np.array([entry['bank'] for entry in entries], dtype=np.int64)
+    sell, buy, gain, _ = (a[:, 0] for a in best_single_transfers(player_arrays, rows, banks, top_k=1))
+    row_elements = np.full(len(all_players_df), -1, dtype=np.int64)
+    for element, row in player_index.rows_by_element.items():
+        row_elements[row] = element
+    legal = np.isfinite(gain) & (row_elements[buy] >= 0)
+    actual_gain = sum(window_points[row_elements[buy]] - window_points[row_elements[sell]] for window_points in scored) if scored else np.zeros(len(entries))
+
+    return [{
+        'manager': manager_id,
+        'gameweek': gameweek,
+        'projected_points': round(float(lineup['points'][i]), 2),
+        'points': float(lineup_actual[i]),
+        'best_points': float(best_points[i]),
+        'manager_points': entry['points'] - entry['transfers_cost'],
+        'transfer_out': player_arrays['player'][sell[i]] if legal[i] else None,
+        'transfer_in': player_arrays['player'][buy[i]] if legal[i] else None,
+        'projected_gain': round(float(gain[i]), 2) if legal[i] else np.nan,
+        'actual_gain': float(actual_gain[i]) if legal[i] and scored else np.nan,
+        'scored_gameweeks': len(scored),
+    } for i, (manager_id, entry) in enumerate(zip(manager_ids, entries))]
+
+def read_points(archive_dir, gameweek, players):
+    """Array of the archived points of a gameweek indexed by element id, None when they are not archived."""
+    live_path = os.path.join(get_gameweek_path(gameweek, archive_dir), 'live.json')
+    if not os.path.exists(live_path):
+        return None
+    live = read_json_file(live_path)
+    points = np.zeros(max([int(element) for element in live] + [element['id'] for element in players['elements']]) + 1)
+    points[np.array(list(map(int, live)), dtype=np.int64)] = list(live.values())
+    return points
+
+def summarize(results):
+    """Totals of a replay: how the recommended XI and transfers did against hindsight and the managers."""
+    transfers = results.dropna(subset=['actual_gain'])
+    return {
+        'evaluations': len(results),
+        'gameweeks': int(results['gameweek'].nunique()),
+        'managers': int(results['manager'].nunique()),
+        'points': round(float(results['points'].mean()), 2),
+        'projected_points': round(float(results['projected_points'].mean()), 2),
+        'best_points': round(float(results['best_points'].mean()), 2),
+        'manager_points': round(float(results['manager_points'].mean()), 2),
+        'lineup_efficiency': round(float(results['points'].sum() / results['best_points'].sum()), 4) if results['best_points'].sum() else None,
+        'transfers': len(transfers),
+        'projected_gain': round(float(transfers['projected_gain'].mean()), 2) if len(transfers) else None,
+        'actual_gain': round(float(transfers['actual_gain'].mean()), 2) if len(transfers) else None,
+        'transfer_hit_rate': round(float((transfers['actual_gain'] > 0).mean()), 4) if len(transfers) else None,
+    }
+
+def archived_gameweeks(archive_dir=None):
+    """Gameweeks with a source data snapshot in the archive, in order."""
+    archive_dir = archive_dir or get_archive_path()
+    if not os.path.isdir(archive_dir):
+        return []
+    return sorted(int(name[2:]) for name in os.listdir(archive_dir)
+                  if name.startswith('gw') and name[2:].isdigit() and os.path.exists(os.path.join(archive_dir, name, 'TransferAlgorithm.csv')))
+
+def get_gameweek_path(gameweek, archive_dir=None):
+    return os.path.join(archive_dir or get_archive_path(), f'gw{int(gameweek):02d}')
+
+def get_archive_path():
+    # Get the directory of the current script
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Construct the path to the 'archive' folder relative to the script
+    archive_path = os.path.join(script_dir, '../archive')
+
+    # Return the absolute path
+    return os.path.abspath(archive_path)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Archive finished gameweeks and backtest the recommendations against them.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    archive_parser = subparsers.add_parser('archive', help='fetch the picks and points of finished gameweeks with a snapshot')
+    archive_parser.add_argument('--gameweeks', type=int, nargs='+', help='gameweeks to archive, every snapshot by default')
+    archive_parser.add_argument('--league', type=int, help='classic league whose entries are archived instead of the manager list')
+    archive_parser.add_argument('--workers', type=int, default=8, help='concurrent API requests')
+    replay_parser = subparsers.add_parser('replay', help='score the recommendations of archived gameweeks, offline')
+    replay_parser.add_argument('--gameweeks', type=int, nargs='+', help='gameweeks to replay, every complete one by default')
+    replay_parser.add_argument('--workers', type=int, help='processes, one per CPU by default')
+    replay_parser.add_argument('--output', help='CSV of the results, reports/backtest.csv by default')
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        if args.league is not None:
+            manager_ids = [manager['ID'] for _, managers in iter_league_pages(args.league) for manager in managers]
+        else:
+            manager_ids = pd.read_csv(os.path.join(get_source_data_path(), 'manager_ids_2024.csv'))['ID'].tolist()
+        print(f"{archive_results(manager_ids, args.gameweeks, workers=args.workers)} requests made")
+    else:
+        results = replay(args.gameweeks, workers=args.workers)
+        output = args.output or os.path.join(get_reports_path(), 'backtest.csv')
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+        results.to_csv(output, index=False)
+        print(json.dumps(summarize(results), indent=1))
+        print(f"Results written to {output}")
@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from lineup import lineup_points
+
+# Chips that are timed, by their name in the chip history of the API
+CHIPS = {'bboost': 'Bench Boost', '3xc': 'Triple Captain', 'freehit': 'Free Hit'}
+# Free hit squads are built for budgets rounded down to this many tenths, so managers with close budgets share them
+FREE_HIT_BUDGET_STEP = 5
+
+
+def chip_gains(projections, positions):
+    """
+    Expected gain of bench boost and triple captain in every gameweek for a batch of squads.
+
+    Parameters:
+    - projections: (squads, players, gameweeks) array of projected points, NaN counts as 0.
+    - positions: (squads, players) array of position codes 0-3 (GK, D, M, F), -1 for unknown players.
+
+    Returns:
+    Dictionary of (squads, gameweeks) arrays:
+    - 'lineup': points of the best XI with the captain counted twice, as lineup.lineup_points.
+    - 'bboost': points of the bench behind that XI.
+    - '3xc': points of the captain, counted a third time.
+
+    Every (squad, gameweek) pair is one row of a single lineup_points batch.
+    """
+    values = np.nan_to_num(np.asarray(projections, dtype=np.float64), nan=0.0)
+    n_squads, n_players, n_gameweeks = values.shape
+    flat = values.transpose(0, 2, 1).reshape(-1, n_players)
+    flat_positions = np.repeat(np.asarray(positions), n_gameweeks, axis=0)
+    known = flat_positions >= 0
+    lineup = lineup_points(flat, flat_positions)
+    captain = np.max(np.where(known, flat, -np.inf), axis=1)
+    squad_points = np.where(known, flat, 0.0).sum(axis=1)
+    return {
+        'lineup': lineup.reshape(n_squads, n_gameweeks),
+        'bboost': (squad_points + captain - lineup).reshape(n_squads, n_gameweeks),
+        '3xc': captain.reshape(n_squads, n_gameweeks),
+    }
+
+def free_hit_points(ranked, budgets, gameweeks):
+    """
+    XI points of the best free hit squad of every budget in every gameweek, as a (squads, gameweeks) array.
+
+    Budgets are in tenths and rounded down to FREE_HIT_BUDGET_STEP, the squads come from
+    RankedPlayers.free_hit_squad and are built once per gameweek and rounded budget. A free hit squad only plays one
+    gameweek, so it is picked for its XI and captain and its bench only has to fit the budget and the club limit, see
+    squad_optimizer.optimize_lineup_squad.
+    NaN where no squad fits.
+    """
+    floors = np.asarray(budgets, dtype=np.int64) // FREE_HIT_BUDGET_STEP * FREE_HIT_BUDGET_STEP
+    points = np.full((len(floors), len(gameweeks)), np.nan)
+    for budget in np.unique(floors):
+        for j, gameweek in enumerate(gameweeks):
+            rows = ranked.free_hit_squad(gameweek, int(budget))
+            if rows is not None:
+                points[floors == budget, j] = lineup_points(ranked.projection_matrix([gameweek])[rows, 0], ranked.position[rows])[0]
+    return points
+
+def evaluate_chips(ranked, squads, budgets, gameweeks):
+    """
+    Expected gain of every chip in every gameweek for a batch of squads, e.g. a whole league.
+
+    Parameters:
+    - ranked: RankedPlayers of the projection table.
+    - squads: (squads, players) rows of each squad's players in the table, -1 for players without data.
+    - budgets: (squads,) money for a free hit squad in tenths, bank plus team value.
+    - gameweeks: gameweeks to evaluate, every one a column of the table.
+
+    Returns:
+    Dictionary of (squads, gameweeks) arrays keyed by chip, and 'lineup' with the points of the squad itself.
+    The squads are kept as they are over the whole horizon.
+    """
+    squads = np.atleast_2d(squads)
+    known = squads >= 0
+    projections = np.where(known[:, :, None], ranked.projection_matrix(gameweeks)[np.where(known, squads, 0)], np.nan)
+    gains = chip_gains(projections, np.where(known, ranked.position[np.where(known, squads, 0)], -1))
+    gains['freehit'] = free_hit_points(ranked, np.broadcast_to(budgets, len(squads)), gameweeks) - gains['lineup']
+    return gains
+
+def available_chips(history):
+    """Chips of CHIPS that the manager hasn't played this season, from the entry history of the API."""
+    played = {chip['name'] for chip in history.get('chips', [])}
+    return [chip for chip in CHIPS if chip not in played]
+
+def recommend_chips(gains, gameweeks, chips):
+    """
+    Table of the gameweek with the largest expected gain of each chip, for one squad of evaluate_chips.
+
+    Returns:
+    DataFrame with the chip, its best gameweek and gain, and its gain in every gameweek.
+    """
+    rows = []
+    for chip in chips:
+        chip_gain = gains[chip][0]
+        best = int(np.nanargmax(chip_gain)) if not np.isnan(chip_gain).all() else None
+        row = {'Chip': CHIPS[chip], 'Best Gameweek': gameweeks[best] if best is not None else None,
+               'Gain': round(float(chip_gain[best]), 2) if best is not None else np.nan}
+        row.update({str(gameweek): round(float(gain), 2) for gameweek, gain in zip(gameweeks, chip_gain)})
+        rows.append(row)
+    return pd.DataFrame(rows, columns=['Chip', 'Best Gameweek', 'Gain'] + [str(gameweek) for gameweek in gameweeks])
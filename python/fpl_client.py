@@ -0,0 +1,170 @@
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+import pandas as pd
+from instrumentation import get_metrics
+
+# Base URL of the FPL API, can be pointed at a local stand-in with FPL_API_URL
+FPL_API_URL = os.getenv('FPL_API_URL', 'https://fantasy.premierleague.com/api')
+
+# Number of keep-alive connections kept open to the API host
+POOL_SIZE = int(os.getenv('FPL_POOL_SIZE', 10))
+
+# How long a cached bootstrap-static payload is trusted before it is revalidated
+BOOTSTRAP_TTL_SECONDS = int(os.getenv('FPL_BOOTSTRAP_TTL', 3600))
+
+
+class FplClient:
+    """Thin client for the FPL API that fetches bootstrap-static at most once per run."""
+
+    def __init__(self, base_url=None, cache_dir=None, ttl=None, session=None, pool_size=None):
+        self.base_url = (base_url or FPL_API_URL).rstrip('/')
+        self.cache_dir = cache_dir or get_cache_path()
+        self.ttl = BOOTSTRAP_TTL_SECONDS if ttl is None else ttl
+        self.session = session or requests.Session()
+        self.pool_size = 0
+        self._adapter = None
+        self._pool_lock = threading.Lock()
+        self.resize_pool(pool_size or POOL_SIZE)
+        self._bootstrap = None
+        self._players_df = None
+        # Set by refresh, the next load asks the API even when the disk copy is younger than the TTL
+        self._revalidate = False
+        # Managers are processed from several threads, the shared payload is loaded under a lock
+        self._lock = threading.RLock()
+
+    def resize_pool(self, pool_size):
+        """
+        Keep up to pool_size keep-alive connections so concurrent requests don't reconnect. The pool only grows,
+        a pool that is large enough already is kept with its open connections.
+        """
+        with self._pool_lock:
+            if pool_size <= self.pool_size:
+                return
+            old_adapter, self._adapter = self._adapter, HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.session.mount('http://', self._adapter)
+            self.session.mount('https://', self._adapter)
+            self.pool_size = pool_size
+            if old_adapter is not None:
+                old_adapter.close()
+
+    def get_json(self, path, headers=None):
+        response = self.session.get(f"{self.base_url}/{path.lstrip('/')}", headers=headers)
+        get_metrics().count_http(len(response.content))
+        response.raise_for_status()
+        return response.json()
+
+    def get_entry(self, manager_id):
+        return self.get_json(f"entry/{manager_id}/")
+
+    def get_picks(self, manager_id, gameweek):
+        return self.get_json(f"entry/{manager_id}/event/{gameweek}/picks/")
+
+    def get_history(self, manager_id):
+        return self.get_json(f"entry/{manager_id}/history/")
+
+    def get_live(self, gameweek):
+        return self.get_json(f"event/{gameweek}/live/")
+
+    def get_league_standings(self, league_id, page=1):
+        return self.get_json(f"leagues-classic/{league_id}/standings/?page_standings={page}")
+
+    def get_bootstrap_static(self):
+        """Return the bootstrap-static payload from memory, disk or the API, in that order."""
+        with self._lock:
+            if self._bootstrap is None:
+                self._bootstrap = self._load_bootstrap_static()
+            return self._bootstrap
+
+    def refresh(self):
+        """
+        Forget the bootstrap-static payload held in memory and revalidate the disk copy with the API on the next use,
+        whatever its age. The session and its connections are kept.
+        """
+        with self._lock:
+            self._bootstrap = None
+            self._players_df = None
+            self._revalidate = True
+
+    def _load_bootstrap_static(self):
+        payload_path, meta_path = self._bootstrap_cache_paths()
+        meta = None
+        if os.path.exists(payload_path) and os.path.exists(meta_path):
+            meta = read_json_file(meta_path)
+
+        # Trust the disk copy without asking the API while it is younger than the TTL, unless refresh asked for a check
+        if meta is not None and not self._revalidate and time.time() - meta.get('fetched_at', 0) < self.ttl:
+            return read_json_file(payload_path)
+
+        # Otherwise revalidate with the API, sending the validators from the last download
+        headers = {}
+        if meta is not None:
+            if meta.get('etag'):
+                headers['If-None-Match'] = meta['etag']
+            if meta.get('last_modified'):
+                headers['If-Modified-Since'] = meta['last_modified']
+
+        response = self.session.get(f"{self.base_url}/bootstrap-static/", headers=headers)
+        get_metrics().count_http(len(response.content))
+        if response.status_code == 304 and meta is not None:
+            bootstrap = read_json_file(payload_path)
+        else:
+            response.raise_for_status()
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_file_atomic(payload_path, response.content)
+            bootstrap = response.json()
+            meta = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+            }
+
+        meta['fetched_at'] = time.time()
+        write_file_atomic(meta_path, json.dumps(meta).encode('utf8'))
+        self._revalidate = False
+        return bootstrap
+
+    def get_players(self):
+        """Return the bootstrap-static players as a DataFrame indexed by element id."""
+        with self._lock:
+            if self._players_df is None:
+                self._players_df = pd.DataFrame(self.get_bootstrap_static()['elements']).set_index('id', drop=False).rename_axis(None)
+            return self._players_df
+
+    def _bootstrap_cache_paths(self):
+        return (os.path.join(self.cache_dir, 'bootstrap-static.json'),
+                os.path.join(self.cache_dir, 'bootstrap-static.meta.json'))
+
+
+_client = None
+
+def get_client():
+    """Return the client shared by the whole run."""
+    global _client
+    if _client is None:
+        _client = FplClient()
+    return _client
+
+def set_client(client):
+    """Replace the shared client, e.g. with one pointed at a local stand-in."""
+    global _client
+    _client = client
+    return client
+
+def read_json_file(file_path):
+    with open(file_path, 'rb') as f:
+        return json.load(f)
+
+def write_file_atomic(file_path, content):
+    temp_file_path = f"{file_path}.tmp"
+    with open(temp_file_path, 'wb') as f:
+        f.write(content)
+    os.replace(temp_file_path, file_path)
+
+def get_cache_path():
+    # The cache lives in '.cache' at the repository root unless FPL_CACHE_DIR is set
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    cache_path = os.getenv('FPL_CACHE_DIR', os.path.join(script_dir, '../.cache'))
+    return os.path.abspath(cache_path)
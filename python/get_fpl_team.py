@@ -1,155 +1,153 @@
 import pandas as pd
-import requests
 import os
 from datetime import datetime
-
-def load_source_data():
-    source_data_path = get_source_data_path()
-    df = pd.read_csv(f'{source_data_path}/TransferAlgorithm.csv', encoding='ISO-8859-1')
-    df = extract_bcv_values(df)
-    df = filter_dataframe(df)
-    all_players_df = df.sort_values(by='BCV', ascending=False)
+from fpl_client import get_client
+from instrumentation import get_metrics, timed
+from source_loader import read_transfer_algorithm
+from lineup import best_lineups
+from chips import evaluate_chips, available_chips, recommend_chips
+from simulation import risk_table
+from report_renderer import make_section
+from scheduler import parse_deadline
+from ranked_players import get_ranked_players, POSITION_CODES
+from transfer_recommendation import recommend_transfers_one_transfer, recommend_transfers_wildcard
+from transfer_planner import banked_free_transfers, plan_transfers, plan_to_dataframe, PLANNER_BEAM_WIDTH
+
+@timed('load_source_data')
+def load_source_data(source_data_path=None):
+    source_data_path = source_data_path or get_source_data_path()
+    df, all_players_df = load_projections(f'{source_data_path}/TransferAlgorithm.csv')
     matching_names_df = pd.read_csv(f'{source_data_path}/matching_names.csv')
     managers_df = pd.read_csv(f'{source_data_path}/manager_ids_2024.csv')
+    # Rank the players once, every manager of the run queries the same index
+    get_ranked_players(all_players_df)
     return df, all_players_df, matching_names_df, managers_df
 
-def process_manager(buffer, manager_id, manager_name, wildcard, next_gameweek, all_players_df, matching_names_df):
-   
-    your_team_df = read_team_from_api(manager_id, next_gameweek - 1)
-    current_bank_value, current_team_value = read_manager_info_from_api(manager_id)
-    print(f"{manager_name}'s Team value: {current_team_value}")
-    print(f"{manager_name}'s current bank: {current_bank_value}")
-    your_team_df = merge_with_matching_names(your_team_df, matching_names_df)
-    merged_team_df = merge_with_all_players(your_team_df, all_players_df)
-    non_matching_rows = merged_team_df['BCV'].isna()
-    merged_team_df.loc[non_matching_rows, ['Position', 'Team', ' Price ', 'BCV']] = [None, None, None, None]
+def load_projections(csv_path):
+    """Return the filtered projection table and the same table ordered by BCV, best first."""
+    df = read_transfer_algorithm(csv_path)
+    df = extract_bcv_values(df)
+    df = filter_dataframe(df)
+    all_players_df = df.sort_values(by='BCV', ascending=False)
+    return df, all_players_df
+
+def process_manager(manager_id, manager_name, wildcard, next_gameweek, all_players_df, player_index, plan_horizon=5, beam_width=PLANNER_BEAM_WIDTH, picks=None, entry=None, history=None, simulate=0):
+    """
+    Analyse a manager's team and return the result as summary lines and titled tables for report_renderer.
+
+    With `simulate` scenarios, the recommended XI and transfers are also scored on sampled points, see simulation.py.
+    """
+    picks = picks or get_client().get_picks(manager_id, next_gameweek - 1)
+    history = history or get_client().get_history(manager_id)
+    your_team_df = read_team_from_api(manager_id, next_gameweek - 1, picks)
+    current_bank_value, current_team_value = read_manager_info_from_api(manager_id, entry)
+    result = {
+        'manager': manager_name,
+        'summary': [f"{manager_name}'s Team value: {current_team_value}", f"{manager_name}'s current bank: {current_bank_value}"],
+        'sections': [],
+    }
+    sections = result['sections']
+    metrics = get_metrics()
+    with metrics.stage('merge'):
+        squad = player_index.rows(your_team_df['element'])
+        merged_team_df = gather_players(your_team_df, all_players_df, squad)
 
     position_order = {"GK": 1, "D": 2, "M": 3, "F": 4}
-    merged_team_df['PositionOrder'] = merged_team_df['Position'].map(position_order)
+    merged_team_df['PositionOrder'] = merged_team_df['Position'].map(position_order).astype(float)
     merged_team_df_BCV = merged_team_df.sort_values(by=['PositionOrder', 'BCV'], ascending=[True, False]).drop(columns='PositionOrder')
-    
-    non_matching_players = merged_team_df[non_matching_rows]
-    if not non_matching_players.empty:
-        print("\nThe following players did not have matching data:")
-        non_matching_players.to_html(columns = ['web_name'], index=False, buf = buffer)
-    
-    print(f"\n{manager_name}'s Full Merged Team Data:")
-    #html_parts.append(buffer.getvalue())
-    merged_team_df_BCV.to_html(columns = ['web_name', 'Position', 'Team', ' Price ', 'BCV', str(next_gameweek), str(next_gameweek + 1), str(next_gameweek + 2)], index=False, buf=buffer)
-    #html_parts.append(html_table)
-    # Define FPL team position rules
-    fpl_positions = {'GK': 1, 'D': 3, 'M': 4, 'F': 2}  # Minimum required players, added temp fix to prioritize midfielders and forwards
-    starting_eleven = {'GK': [], 'D': [], 'M': [], 'F': []}
-    bench = {'GK': [], 'D': [], 'M': [], 'F': []}
-
-    # Sort players for the next gameweek and pick the starting 11 and bench players according to FPL rules
-    sorted_players = merged_team_df.sort_values(by=str(next_gameweek), ascending=False)
-    # Populate the starting eleven and bench
-    for position, min_count in fpl_positions.items():
-        position_players = sorted_players[sorted_players['Position'] == position]
-        starting_players = position_players.head(min_count)
-        bench_players = position_players.iloc[min_count:]
-        starting_eleven[position].extend(starting_players.to_dict('records'))  # Extend the list of dicts
-        bench[position].extend(bench_players.to_dict('records'))  # Extend the list of dicts
-
-    # Count the total players in starting eleven
-    total_starting_players = sum(len(players) for players in starting_eleven.values())
-
-    # Add additional players to the starting eleven if less than 11
-    additional_players_needed = 11 - total_starting_players
-    if additional_players_needed > 0:
-        for position in sorted(fpl_positions, key=fpl_positions.get, reverse=True):
-            if additional_players_needed == 0:
-                break
-            available_bench_players = [player for player in bench[position] if player not in starting_eleven[position]]
-            additional_players = available_bench_players[:additional_players_needed]
-            starting_eleven[position].extend(additional_players)
-            additional_players_needed -= len(additional_players)
-            # Remove the additional players from the bench
-            bench[position] = [player for player in bench[position] if player not in additional_players]
-
-    # Flatten the starting_eleven and bench dictionaries to create a combined list of DataFrames
-    starting_eleven_df_list = [pd.DataFrame(starting_eleven[pos]) for pos in starting_eleven if starting_eleven[pos]]
-    bench_df_list = [pd.DataFrame(bench[pos]) for pos in bench if bench[pos]]
-
-    # Concatenate the starting eleven and bench dataframes
-    selected_starting_eleven = pd.concat(starting_eleven_df_list) if starting_eleven_df_list else pd.DataFrame()
-    selected_bench = pd.concat(bench_df_list) if bench_df_list else pd.DataFrame()
-
-    # If DataFrames are not empty, sort them by 'PositionOrder'
-    if not selected_starting_eleven.empty:
-        selected_starting_eleven['PositionOrder'] = selected_starting_eleven['Position'].map(position_order)
-        selected_starting_eleven = selected_starting_eleven.sort_values(by='PositionOrder')
-
-    if not selected_bench.empty:
-        selected_bench = selected_bench.sort_values(by=str(next_gameweek), ascending=False)
-
-    # Print the recommended starting eleven and bench
-    print(f"\n{manager_name}'s Recommended Starting 11 for Gameweek {next_gameweek}:")
-    selected_starting_eleven.to_html(columns = ['element', 'web_name', 'Position', 'Team', ' Price ', 'BCV', str(next_gameweek)], index=False, buf=buffer)
-
-    print(f"\n{manager_name}'s Recommended Bench for Gameweek {next_gameweek}:")
-    selected_bench.to_html(columns=['element', 'web_name', 'Position', 'Team', ' Price ', 'BCV', str(next_gameweek)], index=False, buf=buffer)
-
-    '''
+    sections.append(make_section(f"{manager_name}'s Full Merged Team Data:", merged_team_df_BCV,
+                                 ['web_name', 'Position', 'Team', ' Price ', 'BCV', str(next_gameweek), str(next_gameweek + 1), str(next_gameweek + 2)], kind='team'))
+
+    # Pick the best starting 11 over every legal formation, players without projection data go to the bench
+    positions = merged_team_df['Position'].astype(object).map(POSITION_CODES).fillna(-1).to_numpy(dtype=int)
+    with metrics.stage('lineup'):
+        lineup = best_lineups(merged_team_df[str(next_gameweek)].to_numpy(dtype=float), positions)
+    starters = lineup['starters'][0]
+    selected_starting_eleven = merged_team_df.iloc[starters[starters >= 0]]
+    bench = lineup['bench'][0]
+    selected_bench = merged_team_df.iloc[bench[bench >= 0]]
+    captain = merged_team_df['web_name'].iat[lineup['captain'][0]]
+    vice_captain = merged_team_df['web_name'].iat[lineup['vice_captain'][0]]
+    formation = '-'.join(str(count) for count in lineup['formation'][0][1:])
+
+    lineup_columns = ['element', 'web_name', 'Position', 'Team', ' Price ', 'BCV', str(next_gameweek)]
+    sections.append(make_section(f"{manager_name}'s Recommended Starting 11 for Gameweek {next_gameweek} ({formation}), captain {captain}, vice-captain {vice_captain}:",
+                                 selected_starting_eleven, lineup_columns, kind='lineup'))
+    sections.append(make_section(f"{manager_name}'s Recommended Bench for Gameweek {next_gameweek}:", selected_bench, lineup_columns, kind='bench'))
+
     if wildcard:
-        result_df = recommend_transfers_wildcard(all_players_df, current_bank_value, current_team_value)
-        print(result_df)
+        # Pick the best squad money can buy over the same three gameweeks shown in the team table
+        with metrics.stage('wildcard'):
+            wildcard_df = recommend_transfers_wildcard(all_players_df, current_bank_value, current_team_value, gameweeks=range(next_gameweek, next_gameweek + 3))
+        sections.append(make_section(f"{manager_name}'s Recommended Wildcard Squad for Gameweeks {next_gameweek}-{next_gameweek + 2}:", wildcard_df,
+                                     footer=f"Total Team Value: {wildcard_df['Price'].sum():.1f}, Money Left in Bank: {current_bank_value + current_team_value - wildcard_df['Price'].sum():.1f}",
+                                     kind='wildcard'))
     else:
-        recommendations = recommend_transfers_one_transfer(all_players_df, current_bank_value, current_team_value, your_team_df)
-        print(recommendations)
-    '''
-
-    return buffer
-
-    
-
-def merge_with_matching_names(your_team_df, matching_names_df):
-    your_team_df = pd.merge(
-        left=your_team_df,
-        right=matching_names_df,
-        how='left',
-        left_on='web_name',
-        right_on='web_name'
-    )
-    your_team_df['Player'] = your_team_df['Player'].combine_first(your_team_df['web_name'])
-    return your_team_df
-
-def merge_with_all_players(your_team_df, all_players_df):
-    merged_team_df = pd.merge(
-        left=your_team_df,
-        right=all_players_df,
-        how='left',
-        on='Player'
-    )
+        # Score single transfers over the same three gameweeks
+        with metrics.stage('transfers'):
+            recommendations = recommend_transfers_one_transfer(all_players_df, current_bank_value, merged_team_df, gameweeks=range(next_gameweek, next_gameweek + 3), top_k=5, squad=squad)
+        sections.append(make_section(f"{manager_name}'s Recommended Transfers for Gameweeks {next_gameweek}-{next_gameweek + 2}:", recommendations, kind='transfers'))
+
+        # Plan transfers over the next gameweeks that have projections
+        plan_gameweeks = [gameweek for gameweek in range(next_gameweek, next_gameweek + plan_horizon) if str(gameweek) in all_players_df.columns]
+        ranked = get_ranked_players(all_players_df)
+        player_arrays = ranked.player_arrays()
+        if plan_gameweeks and (squad >= 0).all():
+            projections = ranked.projection_matrix(plan_gameweeks)
+            free_transfers = banked_free_transfers(history, next_gameweek)
+            with metrics.stage('planner'):
+                plan = plan_transfers(player_arrays, projections, squad, int(round(current_bank_value * 10)), free_transfers, beam_width=beam_width)
+            sections.append(make_section(f"{manager_name}'s Transfer Plan for Gameweeks {plan_gameweeks[0]}-{plan_gameweeks[-1]} "
+                                         f"with {free_transfers} Free Transfer{'s' if free_transfers > 1 else ''}:",
+                                         plan_to_dataframe(plan, player_arrays, plan_gameweeks), kind='plan'))
+
+    window = [gameweek for gameweek in range(next_gameweek, next_gameweek + 3) if str(gameweek) in all_players_df.columns]
+    if simulate and window:
+        # The manager's last XI and captain are the current choice the recommendations are compared with
+        current = {pick['element']: (pick['position'] <= 11) * (2 if pick.get('is_captain') else 1) for pick in picks['picks']}
+        multipliers = your_team_df['element'].map(current).fillna(0).to_numpy()
+        with metrics.stage('simulation'):
+            risk_df = risk_table(get_ranked_players(all_players_df), squad, multipliers, lineup, window, int(round(current_bank_value * 10)),
+                                 simulate, (int(manager_id),), transfers=0 if wildcard else 5)
+        sections.append(make_section(f"{manager_name}'s Recommendations over {simulate} Simulated Scenarios:", risk_df,
+                                     footer=f"XI rows are points in gameweek {window[0]}, transfer rows are points gained over gameweeks {window[0]}-{window[-1]}. "
+                                            "Beats current is the % of scenarios where the choice beats the last XI and captain, or making no transfer.",
+                                     kind='risk'))
+
+    # Time the chips the manager has left over every gameweek with projections, keeping the current squad
+    chips = available_chips(history)
+    chip_gameweeks = [gameweek for gameweek in get_ranked_players(all_players_df).gameweeks if gameweek >= next_gameweek]
+    if chips and chip_gameweeks:
+        with metrics.stage('chips'):
+            gains = evaluate_chips(get_ranked_players(all_players_df), squad, int(round((current_bank_value + current_team_value) * 10)), chip_gameweeks)
+        sections.append(make_section(f"{manager_name}'s Chip Timing for Gameweeks {chip_gameweeks[0]}-{chip_gameweeks[-1]}:",
+                                     recommend_chips(gains, chip_gameweeks, chips), kind='chips'))
+
+    return result
+
+def gather_players(your_team_df, all_players_df, rows):
+    """Take the projection rows of the team's players, players without a row get empty projections."""
+    merged_team_df = all_players_df.reset_index(drop=True).reindex(rows).reset_index(drop=True)
+    merged_team_df.insert(0, 'element', your_team_df['element'].to_numpy())
+    merged_team_df.insert(1, 'web_name', your_team_df['web_name'].to_numpy())
     return merged_team_df
 
-def read_team_from_api(manager_id, gameweek):
-	# Fetch the team data for the given manager_id and gameweek
-	team_url = f"https://fantasy.premierleague.com/api/entry/{manager_id}/event/{gameweek}/picks/"
-	team_response = requests.get(team_url)
-	team_response.raise_for_status()
-	team_data = team_response.json()
+def read_team_from_api(manager_id, gameweek, team_data=None):
+	# Fetch the team data for the given manager_id and gameweek, unless the caller already has it
+	team_data = team_data or get_client().get_picks(manager_id, gameweek)
 	team_df = pd.DataFrame(team_data['picks'])[['element']]
 
-	# Fetch the static bootstrap data with player information
-	bootstrap_url = "https://fantasy.premierleague.com/api/bootstrap-static/"
-	bootstrap_response = requests.get(bootstrap_url)
-	bootstrap_response.raise_for_status()
-	bootstrap_data = bootstrap_response.json()
-	players_df = pd.DataFrame(bootstrap_data['elements'])[['id', 'web_name']]
+	# Player information comes from the bootstrap-static table shared by the whole run
+	players_df = get_client().get_players()[['id', 'web_name']]
 
 	# Merge the dataframes based on the player 'id' and the 'element' from the team
 	merged_df = pd.merge(team_df, players_df, left_on='element', right_on='id')[['element', 'web_name']]
 
 	return merged_df
 
-def read_manager_info_from_api(manager_id):
-	# Fetch manager data using the given manager_id
-	manager_url = f"https://fantasy.premierleague.com/api/entry/{manager_id}/"
-	manager_response = requests.get(manager_url)
-	manager_response.raise_for_status()
-	manager_data = manager_response.json()
+def read_manager_info_from_api(manager_id, manager_data=None):
+	# Fetch manager data using the given manager_id, unless the caller already has it
+	manager_data = manager_data or get_client().get_entry(manager_id)
 
 	# Extract necessary information and divide by 10
 	current_bank_value = manager_data["last_deadline_bank"] / 10
@@ -158,8 +156,7 @@ def read_manager_info_from_api(manager_id):
 	return current_bank_value, current_team_value
 
 def get_gameweek_info_from_api():
-    response = requests.get('https://fantasy.premierleague.com/api/bootstrap-static/')
-    data = response.json()
+    data = get_client().get_bootstrap_static()
     last_gameweek_api = None
     next_gameweek_api = None
         
@@ -175,6 +172,13 @@ def get_gameweek_info_from_api():
 
     return last_gameweek_api, next_gameweek_api, last_gameweek_api_deadline_date
 
+def get_next_deadline_from_api():
+    """Deadline of the next gameweek in epoch seconds, None after the last gameweek of the season."""
+    for gameweek in get_client().get_bootstrap_static()['events']:
+        if gameweek['is_next']:
+            return parse_deadline(gameweek['deadline_time'])
+    return None
+
 
 def read_team_from_csv(file_path):
 	"""Read the team from a CSV file and categorize players."""
@@ -194,31 +198,30 @@ def read_team_from_csv(file_path):
 	return category_to_players, num_team_members
 
 def extract_bcv_values(dataframe):
-	"""Extract BCV values from the dataframe."""
-	dataframe['BCV'] = dataframe[' BCV '].str.extract(r'([-+]?\d*\.\d+|\d+)').astype(float)
-	dataframe['BCV'] = dataframe['BCV'].abs()
+	"""Extract BCV values from the dataframe, parenthesized values in the CSV are negative."""
+	dataframe['BCV'] = dataframe[' BCV '].astype(float)
 	return dataframe
 
 def filter_dataframe(dataframe):
-	"""Filter out players with BCV equal to 1.00 and remove rows with 'nan' position type."""
-	dataframe = dataframe[dataframe['BCV'] != 1.00]
+	"""Filter out the placeholder players with BCV (1.00) and remove rows with 'nan' position type."""
+	dataframe = dataframe[dataframe['BCV'].abs() != 1.00]
 	dataframe = dataframe[dataframe['Position'].notna()]
-	dataframe = dataframe[dataframe['Player'] != 'Wood'] # Removes the defender Wood from the source data since the web_name Wood in the FPL api matches the forward
 	return dataframe
 
-def get_top_players_by_position(buffer, all_players_df, next_gameweek):
-    """Get the top 10 players for each position based on BCV values."""
+def get_top_players_by_position(all_players_df, next_gameweek):
+    """Get the top 10 players for each position based on BCV values, as titled tables for report_renderer."""
+    ranked = get_ranked_players(all_players_df)
     top_players_by_position = {}
-    for position in all_players_df['Position'].unique():
-        top_players = all_players_df[all_players_df['Position'] == position].head(10)
-        top_players_by_position[position] = top_players
-    
+    # Positions in the order their best player appears in the table
+    for position in sorted((p for p in POSITION_CODES if len(ranked.top(p, 1))), key=lambda p: ranked.top(p, 1)[0]):
+        top_players_by_position[position] = all_players_df.iloc[ranked.top(position, 10)]
+
     position_keys = {"GK": "goalkeepers", "D": "defenders", "M": "midfielders", "F": "forwards"}
+    sections = []
     for position_key in top_players_by_position:
-        print(f"\nTop 10 {position_keys[position_key]} by BCV for Gameweek {next_gameweek}:")
-        top_players_df = top_players_by_position[position_key]
-        top_players_df.to_html(columns = ['BCV', 'Player', 'Position', 'Team', ' Price ', str(next_gameweek), str(next_gameweek + 1), str(next_gameweek + 2)], index=False, buf=buffer)
-    return buffer
+        sections.append(make_section(f"Top 10 {position_keys[position_key]} by BCV for Gameweek {next_gameweek}:", top_players_by_position[position_key],
+                                     ['BCV', 'Player', 'Position', 'Team', ' Price ', str(next_gameweek), str(next_gameweek + 1), str(next_gameweek + 2)], kind='top'))
+    return sections
 
 def get_source_data_path():
     # Get the directory of the current script
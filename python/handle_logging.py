@@ -5,19 +5,22 @@ from datetime import datetime
 import pytz
 
 class TZFormatter(logging.Formatter):
+    # Looked up once, building the timezone for every record is slow
+    timezone = pytz.timezone('Europe/Oslo')  # Replace with your timezone
+
     def formatTime(self, record, datefmt=None):
-        dt = datetime.fromtimestamp(record.created)
-        tz = pytz.timezone('Europe/Oslo')  # Replace with your timezone
-        return dt.astimezone(tz).strftime(datefmt or self.default_time_format)
+        dt = datetime.fromtimestamp(record.created, self.timezone)
+        return dt.strftime(datefmt or self.default_time_format)
 
 def initiate_logging():
     logger = logging.getLogger(__name__)
+    # A daemon runs the worker many times in one process, its handler is only added once
+    if logger.handlers:
+        return logger
     logger.setLevel(logging.DEBUG)
     formatter = TZFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    logger_file_path = os.path.join(script_dir, '../status.log')
     logger_file_handler = logging.handlers.RotatingFileHandler(
-        os.path.abspath(logger_file_path),
+        get_log_path(),
         maxBytes=1024 * 1024,
         backupCount=1,
         encoding="utf8",
@@ -26,4 +29,9 @@ def initiate_logging():
     logger_file_handler.setFormatter(formatter)
     logger.addHandler(logger_file_handler)
     
-    return logger
\ No newline at end of file
+    return logger
+
+def get_log_path():
+    # status.log lives at the repository root
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(script_dir, '../status.log'))
@@ -0,0 +1,150 @@
+import cProfile
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+# Allocation sites listed in the tracemalloc snapshot of a profiled run
+TRACEMALLOC_TOP = 30
+# Managers broken down in the run summary, a league run lists its slowest ones
+SUMMARY_MANAGERS = 50
+
+
+class RunMetrics:
+    """Wall time of each pipeline stage, split per manager, and the HTTP traffic of one run."""
+
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        self.managers = {}
+        # Managers whose breakdown compact dropped, they still count in 'managers_total'
+        self.managers_dropped = 0
+        self.http = {'requests': 0, 'bytes': 0}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as stage `name`, attributed to the manager this thread is working on, if any."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def manager(self, manager_id):
+        """Attribute the stages this thread runs inside the block to a manager."""
+        previous = getattr(self._local, 'manager', None)
+        self._local.manager = manager_id
+        try:
+            yield
+        finally:
+            self._local.manager = previous
+
+    def add(self, name, seconds):
+        manager = getattr(self._local, 'manager', None)
+        with self._lock:
+            total = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            total['seconds'] += seconds
+            total['calls'] += 1
+            if manager is not None:
+                stages = self.managers.setdefault(str(manager), {})
+                stages[name] = stages.get(name, 0.0) + seconds
+
+    def count_http(self, size):
+        """Count one HTTP response of `size` body bytes."""
+        with self._lock:
+            self.http['requests'] += 1
+            self.http['bytes'] += size
+
+    def compact(self):
+        """
+        Keep the per-manager breakdown of the SUMMARY_MANAGERS slowest managers only, so a league run holds a bounded
+        breakdown however many pages it streams. Call it between pages, when no manager is in progress.
+        """
+        with self._lock:
+            slowest = self._slowest()
+            self.managers_dropped += len(self.managers) - len(slowest)
+            self.managers = dict(slowest)
+
+    def _slowest(self):
+        return sorted(self.managers.items(), key=lambda item: sum(item[1].values()), reverse=True)[:SUMMARY_MANAGERS]
+
+    def summary(self, **fields):
+        """
+        JSON-serializable summary of the run with any extra fields, e.g. its outcome.
+
+        The per-manager breakdown keeps the SUMMARY_MANAGERS managers with the most time, so a league run of thousands
+        of entries still logs one short line. 'managers_total' counts them all.
+        """
+        with self._lock:
+            slowest = self._slowest()
+            return {
+                'started': datetime.fromtimestamp(self.started).isoformat(timespec='seconds'),
+                'seconds': round(time.time() - self.started, 3),
+                **fields,
+                'stages': {name: {'seconds': round(total['seconds'], 4), 'calls': total['calls']} for name, total in self.stages.items()},
+                'managers': {manager: {name: round(seconds, 4) for name, seconds in stages.items()} for manager, stages in slowest},
+                'managers_total': len(self.managers) + self.managers_dropped,
+                'http': dict(self.http),
+            }
+
+
+def timed(name):
+    """Decorator timing every call of a function as stage `name` of the current run."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with get_metrics().stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@contextmanager
+def profiling(directory, enabled=True):
+    """
+    Profile the block with cProfile and tracemalloc when enabled.
+
+    Writes profile_<time>.prof (open with pstats or snakeviz) and tracemalloc_<time>.txt with the
+    largest allocation sites at the end of the block to `directory`. cProfile only sees the thread that enters
+    the block, work done on other threads or processes is missing from the profile.
+    """
+    if not enabled:
+        yield
+        return
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        profiler.dump_stats(os.path.join(directory, f'profile_{stamp}.prof'))
+        with open(os.path.join(directory, f'tracemalloc_{stamp}.txt'), 'w', encoding='utf8') as f:
+            f.write(f'peak {peak / 2 ** 20:.1f} MiB\n')
+            for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                f.write(f'{stat}\n')
+
+
+_metrics = None
+
+def get_metrics():
+    """Return the metrics of the current run."""
+    global _metrics
+    if _metrics is None:
+        _metrics = RunMetrics()
+    return _metrics
+
+def set_metrics(metrics):
+    """Start collecting into new metrics, e.g. at the start of a run."""
+    global _metrics
+    _metrics = metrics
+    return metrics
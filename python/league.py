@@ -0,0 +1,85 @@
+import json
+import os
+from fpl_client import get_client, get_cache_path, read_json_file, write_file_atomic
+
+
+def iter_league_pages(league_id, start_page=1):
+    """Yield (page, managers) for each standings page of a classic league, starting at start_page."""
+    page = start_page
+    while True:
+        standings = get_client().get_league_standings(league_id, page)['standings']
+        managers = [{'ID': entry['entry'], 'Manager': entry['player_name'], 'Wildcard': False}
+                    for entry in standings['results']]
+        yield page, managers
+        if not standings['has_next']:
+            break
+        page += 1
+
+def process_league(league_id, next_gameweek, process_page, report_path=None, checkpoint_path=None):
+    """
+    Stream a classic league through process_page one standings page at a time.
+
+    Parameters:
+    - league_id: int, id of the classic league.
+    - next_gameweek: int, gameweek the report is made for.
+    - process_page: callable taking a list of managers and returning their HTML parts in order.
+    - report_path: str, file the report is appended to, defaults to reports/league_<id>_gw<gw>.html.
+    - checkpoint_path: str, JSON file recording the last finished page, defaults to .cache/league_<id>.json.
+
+    Returns:
+    Path of the finished report.
+
+    Each page is appended to the report and then checkpointed, so only one page of managers is held in
+    memory and an interrupted run resumes after the last page that was fully written.
+    """
+    report_path = report_path or os.path.join(get_reports_path(), f'league_{league_id}_gw{next_gameweek}.html')
+    checkpoint_path = checkpoint_path or os.path.join(get_cache_path(), f'league_{league_id}.json')
+
+    checkpoint = read_json_file(checkpoint_path) if os.path.exists(checkpoint_path) else {}
+    resuming = (checkpoint.get('league_id') == league_id and checkpoint.get('gameweek') == next_gameweek
+                and os.path.exists(report_path))
+    if resuming and checkpoint.get('finished'):
+        return report_path
+
+    os.makedirs(os.path.dirname(report_path), exist_ok=True)
+    os.makedirs(os.path.dirname(checkpoint_path), exist_ok=True)
+    with open(report_path, 'r+b' if resuming else 'wb') as report:
+        if resuming:
+            # Drop anything written after the last checkpoint, e.g. half a page from a crashed run
+            report.truncate(checkpoint['report_size'])
+            report.seek(checkpoint['report_size'])
+            start_page = checkpoint['page'] + 1
+        else:
+            start_page = 1
+
+        for page, managers in iter_league_pages(league_id, start_page):
+            for html_part in process_page(managers):
+                report.write(html_part.encode('utf8'))
+                report.write(b'\n')
+            report.flush()
+            os.fsync(report.fileno())
+            save_checkpoint(checkpoint_path, league_id, next_gameweek, page, report.tell(), finished=False)
+
+        save_checkpoint(checkpoint_path, league_id, next_gameweek, page, report.tell(), finished=True)
+
+    return report_path
+
+def save_checkpoint(checkpoint_path, league_id, gameweek, page, report_size, finished):
+    checkpoint = {
+        'league_id': league_id,
+        'gameweek': gameweek,
+        'page': page,
+        'report_size': report_size,
+        'finished': finished,
+    }
+    write_file_atomic(checkpoint_path, json.dumps(checkpoint).encode('utf8'))
+
+def get_reports_path():
+    # Get the directory of the current script
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+
+    # Construct the path to the 'reports' folder relative to the script
+    reports_path = os.path.join(script_dir, '../reports')
+
+    # Return the absolute path
+    return os.path.abspath(reports_path)
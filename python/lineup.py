@@ -0,0 +1,87 @@
+import numpy as np
+
+# Every legal FPL formation as (GK, D, M, F) starters
+FORMATIONS = np.array([(1, d, m, f) for d in range(3, 6) for m in range(2, 6) for f in range(1, 4) if d + m + f == 10])
+
+
+def best_lineups(projections, positions):
+    """
+    Pick the starting XI, bench order, captain and vice-captain for a batch of squads.
+
+    Parameters:
+    - projections: (squads, players) array of projected points, NaN counts as 0.
+    - positions: (squads, players) array of position codes 0-3 (GK, D, M, F), -1 for unknown players.
+
+    Returns:
+    Dictionary of arrays, players are referenced by their column in the squad arrays:
+    - 'starters': (squads, 11) starters ordered by position and projection, -1 when fewer can start.
+    - 'bench': (squads, players - fewest starters of any squad) every player who doesn't start, the substitute goalkeeper
+      first, then outfield players by projection, padded with -1 after a squad's last substitute.
+    - 'captain', 'vice_captain': (squads,) the two best starters.
+    - 'formation': (squads, 4) starters per position.
+    - 'points': (squads,) XI points with the captain counted twice.
+
+    Every formation is scored at once from per-position prefix sums of the sorted projections, a
+    formation that needs more players of a position than the squad has scores -inf.
+    """
+    values = np.nan_to_num(np.atleast_2d(np.asarray(projections, dtype=np.float64)), nan=0.0)
+    positions = np.atleast_2d(positions)
+    n_squads, n_players = values.shape
+    known = positions >= 0
+
+    ranks = np.empty((4, n_squads, n_players), dtype=np.int64)
+    prefix = np.empty((4, n_squads, n_players + 1))
+    for code in range(4):
+        masked = np.where(positions == code, values, -np.inf)
+        order = np.argsort(-masked, axis=1, kind='stable')
+        # Rank of every player within his position, best first
+        np.put_along_axis(ranks[code], order, np.arange(n_players)[None, :].repeat(n_squads, axis=0), axis=1)
+        prefix[code, :, 0] = 0.0
+        prefix[code, :, 1:] = np.cumsum(np.take_along_axis(masked, order, axis=1), axis=1)
+
+    totals = sum(prefix[code][:, FORMATIONS[:, code]] for code in range(4))
+    best = np.argmax(totals, axis=1)
+    formation = FORMATIONS[best]
+    # Squads that can't field a legal XI start whoever is available in the highest scoring shape
+    formation = np.where(np.isfinite(totals[np.arange(n_squads), best])[:, None], formation,
+                         np.minimum(formation, np.stack([(positions == code).sum(axis=1) for code in range(4)], axis=1)))
+
+    is_starter = np.zeros((n_squads, n_players), dtype=bool)
+    for code in range(4):
+        is_starter |= (positions == code) & (ranks[code] < formation[:, code][:, None])
+
+    order = np.lexsort((-values, positions, ~is_starter), axis=1)
+    starters = np.where(np.take_along_axis(is_starter, order[:, :11], axis=1), order[:, :11], -1)
+    # Bench: goalkeeper first, outfield players by projection, unknown players last. Every player who doesn't start is
+    # on it, also when fewer than 11 can start
+    n_bench = n_players - int(is_starter.sum(axis=1).min(initial=n_players))
+    bench = np.lexsort((-values, ~known, positions != 0, is_starter), axis=1)[:, :n_bench]
+    bench = np.where(np.take_along_axis(is_starter, bench, axis=1), -1, bench)
+
+    starter_values = np.where(is_starter, values, -np.inf)
+    leaders = np.argsort(-starter_values, axis=1, kind='stable')[:, :2]
+    captain, vice_captain = leaders[:, 0], leaders[:, 1]
+    points = np.where(is_starter, values, 0.0).sum(axis=1) + values[np.arange(n_squads), captain]
+
+    return {
+        'starters': starters,
+        'bench': bench,
+        'captain': captain,
+        'vice_captain': vice_captain,
+        'formation': formation,
+        'points': points,
+    }
+
+def lineup_points(projections, positions):
+    """XI points with the captain counted twice for a batch of squads, without picking the players."""
+    values = np.nan_to_num(np.atleast_2d(np.asarray(projections, dtype=np.float64)), nan=0.0)
+    positions = np.atleast_2d(positions)
+    totals = 0.0
+    for code in range(4):
+        sorted_values = -np.sort(-np.where(positions == code, values, -np.inf), axis=1)
+        prefix = np.concatenate([np.zeros((len(values), 1)), np.cumsum(sorted_values, axis=1)], axis=1)
+        totals = totals + prefix[:, FORMATIONS[:, code]]
+    # The best goalkeeper and the best outfield player start in every formation, so the captain is the
+    # best known player of the squad
+    captain = np.max(np.where(positions >= 0, values, -np.inf), axis=1)
+    return np.max(totals, axis=1) + captain
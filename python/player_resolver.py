@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+import pandas as pd
+from fpl_client import get_client, get_cache_path, read_json_file, write_file_atomic
+from instrumentation import timed
+
+# FPL short names of the clubs that the Transfer Algorithm abbreviates differently
+CLUB_ALIASES = {'BHA': 'BRI', 'CRY': 'CPL', 'NFO': 'NOT', 'WHU': 'WHM'}
+# FPL element_type to the positions used in TransferAlgorithm.csv
+ELEMENT_POSITIONS = {1: 'GK', 2: 'D', 3: 'M', 4: 'F'}
+# Letters that have no ASCII decomposition in Unicode
+FOLDED_LETTERS = str.maketrans({'ø': 'o', 'Ø': 'o', 'æ': 'ae', 'Æ': 'ae', 'ß': 'ss', 'ł': 'l', 'Ł': 'l', 'đ': 'd', 'Đ': 'd', 'ı': 'i'})
+
+
+def fold_name(name):
+    """Lowercase ASCII form of a name, 'Ødegaard' and 'Odegaard' fold to the same string."""
+    name = unicodedata.normalize('NFKD', str(name).translate(FOLDED_LETTERS))
+    name = ''.join(char for char in name if not unicodedata.combining(char)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', name).split())
+
+def split_player_name(player):
+    """Split 'Wood (Chris)' into the folded name 'wood' and the folded hint 'chris'."""
+    base, _, hint = str(player).partition('(')
+    return fold_name(base), fold_name(hint)
+
+
+class PlayerIndex:
+    """Maps FPL element ids to rows of the projection table and remembers the picks it could not map."""
+
+    def __init__(self, rows_by_element, web_names, key=None):
+        self.rows_by_element = rows_by_element
+        self.web_names = web_names
+        # Hash of the projections, FPL players and overrides the index was built from
+        self.key = key
+        self.unresolved = set()
+        self._lock = threading.Lock()
+
+    def rows(self, elements):
+        """Return the projection rows of the elements, -1 for elements without projection data."""
+        rows = np.array([self.rows_by_element.get(int(element), -1) for element in elements], dtype=np.int64)
+        missing = {int(element) for element, row in zip(elements, rows) if row < 0}
+        if missing:
+            with self._lock:
+                self.unresolved |= missing
+        return rows
+
+    def unresolved_names(self):
+        """Web names of every picked player without projection data so far in this run."""
+        return sorted(self.web_names.get(element, str(element)) for element in self.unresolved)
+
+
+@timed('player_index')
+def build_player_index(all_players_df, matching_names_df, bootstrap=None, cache_dir=None):
+    """
+    Build, or load from the cache, the element id -> projection row index for this source data.
+
+    Parameters:
+    - all_players_df: DataFrame of projections, rows are referenced by position.
+    - matching_names_df: DataFrame of manual web_name -> Player overrides.
+    - bootstrap: bootstrap-static payload, fetched through the shared client when None.
+    - cache_dir: folder of the persisted index, defaults to the FPL cache.
+
+    Returns:
+    PlayerIndex for the run.
+
+    Players are matched on folded names within their club and position, so players sharing a name at
+    different clubs or positions don't collide. The overrides in matching_names.csv win over name matching.
+    """
+    bootstrap = bootstrap or get_client().get_bootstrap_static()
+    elements = bootstrap['elements']
+    web_names = {element['id']: element['web_name'] for element in elements}
+
+    # The index is valid for as long as the projections, the FPL players and the overrides are unchanged
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(all_players_df[['Player', 'Team', 'Position']].astype(str), index=False).to_numpy().tobytes())
+    digest.update(json.dumps([[e['id'], e['web_name'], e['team'], e['element_type']] for e in elements]).encode('utf8'))
+    digest.update(pd.util.hash_pandas_object(matching_names_df, index=False).to_numpy().tobytes())
+    key = digest.hexdigest()
+
+    index_path = os.path.join(cache_dir or get_cache_path(), 'player_index.json')
+    if os.path.exists(index_path):
+        cached = read_json_file(index_path)
+        if cached.get('key') == key:
+            return PlayerIndex({int(element): row for element, row in cached['rows'].items()}, web_names, key)
+
+    rows_by_element = match_elements(all_players_df, matching_names_df, bootstrap)
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    write_file_atomic(index_path, json.dumps({'key': key, 'rows': rows_by_element}).encode('utf8'))
+    return PlayerIndex(rows_by_element, web_names, key)
+
+def match_elements(all_players_df, matching_names_df, bootstrap):
+    """Return {element id: projection row} for every FPL element that matches exactly one row."""
+    clubs = {team['id']: CLUB_ALIASES.get(team['short_name'], team['short_name']) for team in bootstrap.get('teams', [])}
+    overrides = {fold_name(web_name): player for web_name, player in zip(matching_names_df['web_name'], matching_names_df['Player'])}
+
+    rows_by_group, rows_by_name = {}, {}
+    players = all_players_df['Player'].astype(str).to_numpy()
+    for row, (player, team, position) in enumerate(zip(players, all_players_df['Team'].astype(object), all_players_df['Position'].astype(object))):
+        rows_by_group.setdefault((team, position), []).append(row)
+        rows_by_name.setdefault(fold_name(player), []).append(row)
+    split_names = [split_player_name(player) for player in players]
+
+    rows_by_element = {}
+    for element in bootstrap['elements']:
+        position = ELEMENT_POSITIONS.get(element['element_type'])
+        candidates = rows_by_group.get((clubs.get(element['team']), position), [])
+        row = match_element(element, candidates, players, split_names, overrides)
+        if row is None:
+            # Fall back to a name that is unique across the whole table, e.g. after a transfer between clubs
+            same_name = [r for r in rows_by_name.get(fold_name(element['web_name']), []) if all_players_df['Position'].iat[r] == position]
+            row = same_name[0] if len(same_name) == 1 else None
+        if row is not None:
+            rows_by_element[element['id']] = row
+    return rows_by_element
+
+def match_element(element, candidates, players, split_names, overrides):
+    """Return the one candidate row matching the element, trying stricter rules first."""
+    web_name = fold_name(element['web_name'])
+    first_name = fold_name(element.get('first_name', ''))
+    full_name = fold_name(f"{element.get('first_name', '')} {element.get('second_name', '')}")
+    second_name = fold_name(element.get('second_name', ''))
+
+    rules = [
+        # Manual override from matching_names.csv
+        lambda row: web_name in overrides and players[row] == overrides[web_name],
+        # Same name, with the first name hint of 'Wood (Chris)' when there is one
+        lambda row: split_names[row][0] == web_name and (not split_names[row][1] or split_names[row][1] in full_name),
+        lambda row: split_names[row][0] == web_name,
+        # The table uses the full or the last name where FPL uses a short web name
+        lambda row: split_names[row][0] in (full_name, second_name) or (split_names[row][1] and split_names[row][1] in first_name and split_names[row][0] in full_name),
+        lambda row: bool(split_names[row][0]) and set(split_names[row][0].split()) <= set(full_name.split()),
+    ]
+    for rule in rules:
+        matches = [row for row in candidates if rule(row)]
+        if len(matches) == 1:
+            return matches[0]
+        if len(matches) > 1:
+            return None
+    return None
@@ -0,0 +1,166 @@
+import hashlib
+import imaplib
+import json
+import os
+import time
+
+# A run that finds nothing to do still makes a full run this often, in case the CSV changed behind the same link
+PRECHECK_MAX_AGE_SECONDS = int(os.getenv('FPL_PRECHECK_MAX_AGE', 72 * 3600))
+
+SOURCE_SENDER = 'bingo@patreon.com'
+IMAP_HOST = os.getenv('FPL_IMAP_HOST', 'imap.gmail.com')
+IMAP_PORT = int(os.getenv('FPL_IMAP_PORT', 993))
+# FPL_IMAP_SSL=0 logs in without SSL, only meant for a local mock mailbox
+IMAP_SSL = os.getenv('FPL_IMAP_SSL', '1') != '0'
+
+SOURCE_FILES = ('TransferAlgorithm.csv', 'matching_names.csv', 'manager_ids_2024.csv')
+PRECHECK_VERSION = 1
+
+
+def nothing_due(settings, path=None, source_data_path=None, now=None, mailbox=None, mail_state_path=None):
+    """
+    Check, with the standard library only, whether a run can end before the pipeline is loaded.
+
+    Parameters:
+    - settings: JSON-serializable run settings, a change in them means a full run.
+    - path: state file written by save_state.
+    - source_data_path: folder of the source files.
+    - now: epoch seconds, time.time() when None.
+    - mailbox: function returning a logged in IMAP4 connection, connect_to_mailbox when None.
+    - mail_state_path: state file of update_source_data, with the UID of the last source email seen.
+
+    Returns:
+    The reason nothing can have changed, None when a full run is needed.
+
+    Nothing can have changed while the last full run sent or kept the report of the next gameweek, its deadline
+    hasn't passed (so picks, banks and the gameweek are as they were), the source files hash the same, the
+    mailbox has no source email of the gameweek above the last UID seen and the last full run is less than
+    PRECHECK_MAX_AGE_SECONDS old. The mailbox is asked last, with one UID SEARCH, as it is the only check
+    that leaves the machine.
+    """
+    path = path or get_precheck_path()
+    now = time.time() if now is None else now
+    try:
+        with open(path, 'rb') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get('version') != PRECHECK_VERSION or state.get('settings') != settings:
+        return None
+    if now >= state['deadline'] or now - state['checked'] >= PRECHECK_MAX_AGE_SECONDS:
+        return None
+    if hash_source_files(source_data_path) != state['source']:
+        return None
+    if new_source_mail(state['next_gameweek'], state['checked'], mailbox, mail_state_path):
+        return None
+    return f"The report of gameweek {state['next_gameweek']} is up to date until its deadline, no check is due."
+
+def new_source_mail(next_gameweek, since, mailbox=None, mail_state_path=None):
+    """
+    Whether the mailbox has a source email of the gameweek that the last full run didn't see, e.g. a CSV sent
+    again within the gameweek. True as well when it can't tell: no UID was recorded or the mailbox can't be reached.
+    """
+    mail_state_path = mail_state_path or os.path.join(os.path.dirname(get_precheck_path()), 'source_mail.json')
+    try:
+        with open(mail_state_path, 'rb') as f:
+            seen = json.load(f)
+    except (OSError, ValueError):
+        return True
+    if not seen.get('last_uid'):
+        return True
+    state = dict(seen)
+    try:
+        imap_server = (mailbox or connect_to_mailbox)()
+        try:
+            uids = search_new_mail(imap_server, next_gameweek, time.strftime('%d-%b-%Y', time.gmtime(since)), state)
+        finally:
+            imap_server.logout()
+    except (imaplib.IMAP4.error, OSError):
+        return True
+    # A new UIDVALIDITY resets the last UID, and the UIDs seen before mean nothing
+    return bool(uids) or state['last_uid'] != seen['last_uid']
+
+def search_new_mail(imap_server, next_gameweek_api, since_date, state):
+    """Return the UIDs, oldest first, of the gameweek's emails that arrived after the last run."""
+    imap_server.select('inbox')
+    _, (uidvalidity,) = imap_server.response('UIDVALIDITY')
+    uidvalidity = uidvalidity.decode() if uidvalidity else None
+    # UIDs only compare within one UIDVALIDITY of the mailbox
+    if state.get('uidvalidity') != uidvalidity:
+        state.update(uidvalidity=uidvalidity, last_uid=0)
+
+    last_uid = state['last_uid']
+    criteria = f'FROM "{SOURCE_SENDER}" SUBJECT "GW {next_gameweek_api} - the Transfer Algorithm"'
+    criteria = f'UID {last_uid + 1}:* {criteria}' if last_uid else f'SINCE "{since_date}" {criteria}'
+    _, data = imap_server.uid('SEARCH', None, f'({criteria})')
+    # 'n:*' always matches the newest message, even when its UID is below n
+    return sorted(uid for uid in map(int, data[0].split()) if uid > last_uid)
+
+def connect_to_mailbox():
+    """Log in to the mailbox with EMAIL_ADDRESS and EMAIL_PASSWORD from the environment or the .env file."""
+    credentials = read_env_file(get_env_file_path())
+    credentials.update((key, os.environ[key]) for key in ('EMAIL_ADDRESS', 'EMAIL_PASSWORD') if key in os.environ)
+    imap_server = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT) if IMAP_SSL else imaplib.IMAP4(IMAP_HOST, IMAP_PORT)
+    imap_server.login(credentials.get('EMAIL_ADDRESS', ''), credentials.get('EMAIL_PASSWORD', ''))
+    return imap_server
+
+def read_env_file(path):
+    """KEY=VALUE lines of a .env file, without python-dotenv."""
+    values = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf8') as f:
+            for line in f:
+                key, sep, value = line.strip().partition('=')
+                if sep and not key.startswith('#'):
+                    values[key.strip()] = value.strip().strip('"\'')
+    return values
+
+def save_state(next_gameweek, deadline, settings, path=None, source_data_path=None, checked=None):
+    """Record a full run that left nothing to send, `deadline` in epoch seconds."""
+    path = path or get_precheck_path()
+    state = {
+        'version': PRECHECK_VERSION,
+        'next_gameweek': next_gameweek,
+        'deadline': deadline,
+        'source': hash_source_files(source_data_path),
+        'settings': settings,
+        'checked': time.time() if checked is None else checked,
+    }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w', encoding='utf8') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
+
+def clear_state(path=None):
+    """Forget the last run, so the next run is a full one."""
+    path = path or get_precheck_path()
+    if os.path.exists(path):
+        os.remove(path)
+
+def hash_source_files(source_data_path=None):
+    source_data_path = source_data_path or get_source_data_path()
+    digest = hashlib.sha256()
+    for name in SOURCE_FILES:
+        file_path = os.path.join(source_data_path, name)
+        if os.path.exists(file_path):
+            with open(file_path, 'rb') as f:
+                digest.update(hashlib.sha256(f.read()).digest())
+        else:
+            digest.update(b'missing')
+    return digest.hexdigest()
+
+def get_precheck_path():
+    # Kept with the other run-to-run state, see fpl_client.get_cache_path, which this module can't import
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    cache_path = os.getenv('FPL_CACHE_DIR', os.path.join(script_dir, '../.cache'))
+    return os.path.abspath(os.path.join(cache_path, 'precheck.json'))
+
+def get_env_file_path():
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(script_dir, '../.env'))
+
+def get_source_data_path():
+    # Same folder as get_fpl_team.get_source_data_path, without importing pandas
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(script_dir, '../source_data'))
@@ -0,0 +1,191 @@
+import threading
+
+import numpy as np
+import pandas as pd
+from squad_optimizer import club_undominated, optimize_lineup_squad, MAX_PLAYERS_PER_TEAM
+from source_loader import parse_number
+
+POSITION_CODES = {"GK": 0, "D": 1, "M": 2, "F": 3}
+POSITION_NAMES = list(POSITION_CODES)
+
+def build_player_arrays(all_players_df, score_columns=('BCV',)):
+    """
+    Convert the player table to the arrays used by the transfer engine.
+
+    Parameters:
+    - all_players_df: DataFrame containing all available players.
+    - score_columns: columns summed into each player's score, e.g. a window of gameweek columns.
+
+    Returns:
+    Dictionary of arrays aligned with the rows of all_players_df. Prices are integer tenths so that
+    budget checks are exact, players without a known position or club get the code -1.
+    """
+    scores = sum(parse_number(all_players_df[column]).fillna(0.0) for column in score_columns)
+    clubs, club_names = pd.factorize(all_players_df['Team'])
+    return {
+        'player': all_players_df['Player'].to_numpy(),
+        'price': np.rint(parse_number(all_players_df[' Price ']).fillna(1000.0).to_numpy() * 10).astype(np.int32),
+        'score': np.asarray(scores, dtype=np.float32),
+        'position': all_players_df['Position'].astype(object).map(POSITION_CODES).fillna(-1).to_numpy(np.int8),
+        'club': clubs.astype(np.int16),
+        'club_names': np.asarray(club_names),
+    }
+
+def build_projection_matrix(all_players_df, gameweeks):
+    """Return a (players, gameweeks) float32 array of projected points, dashes count as 0."""
+    return np.column_stack([parse_number(all_players_df[str(gameweek)]).fillna(0.0).to_numpy(np.float32) for gameweek in gameweeks])
+
+class RankedPlayers:
+    """
+    The player table partitioned by position, each position's rows sorted by BCV, by price and by the
+    projection of every gameweek, with the rows of every club.
+
+    Rows are positions in all_players_df. Top-k and cheapest-k are slices of the sorted rows, the best
+    affordable players outside a set skip whole blocks of players that cost too much through a table of
+    block minimum prices, and club counts are a bincount of club codes. The arrays of the transfer engine
+    and its pool of buyable players are kept per score window, so every manager of a run shares them.
+    """
+
+    def __init__(self, all_players_df):
+        self.frame = all_players_df
+        arrays = build_player_arrays(all_players_df)
+        self.price, self.position, self.club = arrays['price'], arrays['position'], arrays['club']
+        self.club_names = arrays['club_names']
+        self.gameweeks = [int(column) for column in all_players_df.columns if str(column).isdigit()]
+        self.projections = build_projection_matrix(all_players_df, self.gameweeks) if self.gameweeks else np.zeros((len(self.price), 0), np.float32)
+
+        self.position_rows = [np.flatnonzero(self.position == code) for code in range(len(POSITION_CODES))]
+        self.club_rows = [np.flatnonzero(self.club == code) for code in range(len(self.club_names))]
+        # Missing BCV sorts last, as in the table itself
+        self.by_bcv = self.sort_positions(-parse_number(all_players_df['BCV']).to_numpy(dtype=float))
+        self.by_price = self.sort_positions(self.price)
+        self.by_gameweek = {gameweek: self.sort_positions(-self.projections[:, i]) for i, gameweek in enumerate(self.gameweeks)}
+
+        self._arrays = {('BCV',): arrays}
+        self._pools = {}
+        self._free_hit_squads = {}
+        self._price_blocks = {}
+        self._lock = threading.Lock()
+
+    def sort_positions(self, key):
+        """Rows of every position in ascending key order, ties by row."""
+        return [rows[np.lexsort((rows, key[rows]))] for rows in self.position_rows]
+
+    def ranking(self, position, gameweek=None):
+        return (self.by_bcv if gameweek is None else self.by_gameweek[gameweek])[POSITION_CODES[position]]
+
+    def top(self, position, k, gameweek=None):
+        """The k best rows of a position by BCV, or by the projection of one gameweek."""
+        return self.ranking(position, gameweek)[:k]
+
+    def cheapest(self, position, k):
+        """The k cheapest rows of a position."""
+        return self.by_price[POSITION_CODES[position]][:k]
+
+    def club_counts(self, rows):
+        """Players per club code among rows, -1 entries and players without a club are left out."""
+        clubs = self.club[np.asarray(rows)[np.asarray(rows) >= 0]]
+        return np.bincount(clubs[clubs >= 0], minlength=len(self.club_names))
+
+    def best_affordable(self, position, max_price, exclude=(), k=1, gameweek=None, club_counts=None, max_per_team=MAX_PLAYERS_PER_TEAM):
+        """
+        The k best rows of a position costing at most max_price.
+
+        Parameters:
+        - position: position name, e.g. 'M'.
+        - max_price: price limit in tenths.
+        - exclude: rows that can't be picked, e.g. the current squad.
+        - k: number of rows returned.
+        - gameweek: gameweek whose projection ranks the players, BCV is used when None.
+        - club_counts: players per club code already owned, clubs at max_per_team are skipped.
+
+        Returns:
+        Int array of up to k rows, best first. Each row is found in O(log n) steps plus one step per
+        excluded or blocked player ranked before it.
+        """
+        ranking = self.ranking(position, gameweek)
+        blocks = self.price_blocks(position, gameweek)
+        exclude = {int(row) for row in exclude}
+        found, start = [], 0
+        while len(found) < k:
+            # Skip blocks whose cheapest player costs too much, widest first: the skipped lengths add up
+            # to the distance to the next affordable player
+            for level in range(len(blocks) - 1, -1, -1):
+                if start < len(blocks[level]) and blocks[level][start] > max_price:
+                    start += 1 << level
+            if start >= len(ranking):
+                break
+            row = int(ranking[start])
+            club = self.club[row]
+            if row not in exclude and club >= 0 and (club_counts is None or club_counts[club] < max_per_team):
+                found.append(row)
+            start += 1
+        return np.array(found, dtype=np.int64)
+
+    def price_blocks(self, position, gameweek=None):
+        """blocks[level][i] is the cheapest price among ranking[i:i + 2 ** level]."""
+        key = (position, gameweek)
+        with self._lock:
+            if key not in self._price_blocks:
+                ranking = self.ranking(position, gameweek)
+                blocks = [self.price[ranking]]
+                while (1 << len(blocks)) <= len(ranking):
+                    width = 1 << (len(blocks) - 1)
+                    blocks.append(np.minimum(blocks[-1][:-width], blocks[-1][width:]))
+                self._price_blocks[key] = blocks
+            return self._price_blocks[key]
+
+    def player_arrays(self, score_columns=('BCV',)):
+        """build_player_arrays of the table, built once per score window."""
+        key = tuple(score_columns)
+        with self._lock:
+            if key not in self._arrays:
+                self._arrays[key] = build_player_arrays(self.frame, key)
+            return self._arrays[key]
+
+    def projection_matrix(self, gameweeks):
+        """build_projection_matrix of the table, sliced from the projections of every gameweek."""
+        return self.projections[:, [self.gameweeks.index(gameweek) for gameweek in gameweeks]]
+
+    def buy_pool(self, score_columns, top_k):
+        """Rows that can be among the top_k single transfers of any squad, see best_single_transfers."""
+        key = (tuple(score_columns), top_k)
+        arrays = self.player_arrays(score_columns)
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = buy_pool(arrays, top_k)
+            return self._pools[key]
+
+    def free_hit_squad(self, gameweek, budget):
+        """
+        Rows of the squad whose XI and captain score the most in one gameweek within `budget` tenths, None when none
+        fits, built once.
+        """
+        key = (gameweek, budget)
+        arrays = self.player_arrays([str(gameweek)])
+        with self._lock:
+            if key not in self._free_hit_squads:
+                self._free_hit_squads[key] = optimize_lineup_squad(arrays, budget)[0]
+            return self._free_hit_squads[key]
+
+def buy_pool(player_arrays, top_k):
+    """
+    Rows that can be among the top_k single transfers of any squad.
+
+    A player is left out when players of his position who score at least as much for at most his price
+    play for top_k + quota + 15 // 3 clubs: the squad holds at most quota of them and fills at most 5
+    clubs, so top_k of them are legal buys for any sale that allows him, each gaining at least as much.
+    """
+    return club_undominated(player_arrays['price'], player_arrays['score'], player_arrays['position'], player_arrays['club'],
+                            len(player_arrays['club_names']), extra=top_k)
+
+_ranked = None
+_ranked_lock = threading.Lock()
+
+def get_ranked_players(all_players_df):
+    """Return the RankedPlayers of all_players_df, built on first use and kept while the same table is in use."""
+    global _ranked
+    with _ranked_lock:
+        if _ranked is None or _ranked.frame is not all_players_df:
+            _ranked = RankedPlayers(all_players_df)
+        return _ranked
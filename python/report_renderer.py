@@ -0,0 +1,85 @@
+import html
+from string import Template
+import numpy as np
+import pandas as pd
+
+# Templates are compiled once at import and filled for every manager
+DOCUMENT_HTML = Template('<html>\n<body>\n$content</body>\n</html>\n')
+MANAGER_HTML = Template('<div>\n<p>$summary</p>\n$sections</div>\n<hr>\n')
+MANAGER_TEXT = Template('$summary\n\n$sections')
+SECTION_HTML = Template('<h3>$title</h3>\n$table$footer')
+SECTION_TEXT = Template('$title\n$table$footer')
+NOTE_HTML = Template('<p>$note</p>\n')
+TABLE_HTML = Template('<table border="1">\n<thead><tr>$header</tr></thead>\n<tbody>\n$rows</tbody>\n</table>\n')
+
+
+def format_column(series):
+    """Display strings of a column, floats rounded to 2 decimals without trailing zeros and NaN left empty."""
+    if pd.api.types.is_float_dtype(series):
+        return ['' if np.isnan(value) else f'{value:g}' for value in series.to_numpy(dtype=float).round(2)]
+    values = series.to_numpy(dtype=object)
+    return ['' if missing else str(value) for value, missing in zip(values, pd.isna(values))]
+
+def frame_to_table(df, columns=None):
+    """Turn the columns of a DataFrame into a table of display strings: {'columns': [...], 'rows': [[...]]}."""
+    columns = list(df.columns if columns is None else columns)
+    cells = [format_column(df[column]) for column in columns]
+    return {'columns': [str(column).strip() for column in columns], 'rows': [list(row) for row in zip(*cells)]}
+
+def make_section(title, df, columns=None, footer=None, kind=None):
+    """A titled table of a report, with an optional line below it. `kind` tells sections apart without their title."""
+    return {'title': title, 'table': frame_to_table(df, columns), 'footer': footer, 'kind': kind}
+
+
+def render_table_html(table):
+    header = ''.join(f'<th>{html.escape(column)}</th>' for column in table['columns'])
+    rows = ''.join('<tr>' + ''.join(f'<td>{html.escape(cell)}</td>' for cell in row) + '</tr>\n' for row in table['rows'])
+    return TABLE_HTML.substitute(header=header, rows=rows)
+
+def render_table_text(table):
+    widths = [max([len(column)] + [len(row[i]) for row in table['rows']]) for i, column in enumerate(table['columns'])]
+    lines = ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip()
+             for row in [table['columns'], ['-' * width for width in widths]] + table['rows']]
+    return '\n'.join(lines) + '\n'
+
+def render_sections(sections):
+    """Render titled tables to (html, text)."""
+    html_parts, text_parts = [], []
+    for section in sections:
+        footer = section.get('footer')
+        html_parts.append(SECTION_HTML.substitute(title=html.escape(section['title']), table=render_table_html(section['table']),
+                                                  footer=NOTE_HTML.substitute(note=html.escape(footer)) if footer else ''))
+        text_parts.append(SECTION_TEXT.substitute(title=section['title'], table=render_table_text(section['table']),
+                                                  footer=f'{footer}\n' if footer else ''))
+    return ''.join(html_parts), '\n'.join(text_parts)
+
+def render_manager(result):
+    """Render the result of get_fpl_team.process_manager to a {'html', 'text'} fragment."""
+    sections_html, sections_text = render_sections(result['sections'])
+    return {
+        'html': MANAGER_HTML.substitute(summary='<br>\n'.join(html.escape(line) for line in result['summary']), sections=sections_html),
+        'text': MANAGER_TEXT.substitute(summary='\n'.join(result['summary']), sections=sections_text),
+    }
+
+def render_report(fragments, notes=(), shared=None):
+    """
+    Assemble the HTML and plain text bodies of a report.
+
+    Parameters:
+    - fragments: per-manager {'html', 'text'} fragments from render_manager, in report order.
+    - notes: lines shown after the managers.
+    - shared: {'html', 'text'} fragment shown at the end, rendered once and reused for every report.
+
+    Returns:
+    (html, text) bodies.
+    """
+    parts = list(fragments) + [{'html': NOTE_HTML.substitute(note=html.escape(note)), 'text': f'{note}\n'} for note in notes]
+    if shared is not None:
+        parts.append(shared)
+    return (DOCUMENT_HTML.substitute(content=''.join(part['html'] for part in parts)),
+            '\n'.join(part['text'] for part in parts))
+
+def render_shared(sections):
+    """Render sections shared by every report, e.g. the top players by position, to a {'html', 'text'} fragment."""
+    sections_html, sections_text = render_sections(sections)
+    return {'html': sections_html, 'text': sections_text}
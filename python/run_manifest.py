@@ -0,0 +1,76 @@
+import hashlib
+import json
+import os
+import threading
+from fpl_client import get_cache_path, read_json_file, write_file_atomic
+
+# Bump when the report layout or the recommendation logic changes, so reports from older code are rebuilt
+MANIFEST_VERSION = 5
+
+
+def hash_content(*parts):
+    """sha256 of JSON-serializable parts, numpy scalars are hashed through their string form."""
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode('utf8')).hexdigest()
+
+def hash_files(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+
+class RunManifest:
+    """
+    Inputs and outputs of the last run, kept in the FPL cache so an unchanged run can skip its work.
+
+    Every manager's report fragment is stored under a key hashing the source data, the gameweek state,
+    the run settings and the manager's picks and bank. A manager whose key is unchanged reuses the stored
+    fragment, and an email body equal to the last one sent is not sent again.
+    """
+
+    def __init__(self, path=None, force=False):
+        self.path = path or os.path.join(get_cache_path(), 'run_manifest.json')
+        previous = {}
+        if not force and os.path.exists(self.path):
+            previous = read_json_file(self.path)
+        # A manifest written by other code is not trusted
+        self.previous = previous if previous.get('version') == MANIFEST_VERSION else {}
+        self.source_key = None
+        self.managers = {}
+        self.rebuilt = []
+        self._lock = threading.Lock()
+
+    def set_source(self, *parts):
+        """Set the inputs shared by every manager, e.g. file hashes, gameweek state and settings."""
+        self.source_key = hash_content(MANIFEST_VERSION, *parts)
+
+    def manager_key(self, manager_id, *parts):
+        return hash_content(self.source_key, manager_id, *parts)
+
+    def cached_fragment(self, manager_id, key):
+        """Return the stored report fragment of the manager when it was built from the same inputs."""
+        entry = self.previous.get('managers', {}).get(str(manager_id))
+        if entry is not None and entry['key'] == key:
+            return entry['fragment']
+        return None
+
+    def record(self, manager_id, key, fragment, rebuilt=True):
+        with self._lock:
+            self.managers[str(manager_id)] = {'key': key, 'fragment': fragment}
+            if rebuilt:
+                self.rebuilt.append(manager_id)
+
+    def report_changed(self, report):
+        return self.previous.get('report') != hash_content(report)
+
+    def save(self, report=None):
+        """Persist this run's fragments, with the hash of the report when it was sent."""
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'source': self.source_key,
+            'report': hash_content(report) if report is not None else self.previous.get('report'),
+            'managers': self.managers,
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_file_atomic(self.path, json.dumps(manifest).encode('utf8'))
@@ -0,0 +1,74 @@
+import bisect
+import time
+from datetime import datetime, timezone
+
+# Seconds between checks for the source email by hours left until the next deadline, checked in order
+POLL_SCHEDULE = ((6, 15 * 60), (24, 30 * 60), (72, 2 * 3600))
+# Far from any deadline, and after the last one of the season
+FAR_POLL_SECONDS = 6 * 3600
+# The API is updated for a while after a deadline, the first check of the new gameweek waits for that
+AFTER_DEADLINE_SECONDS = 30 * 60
+
+
+class SystemClock:
+    """The wall clock of a schedule. Anything with the same time() and sleep() runs a schedule in fast-forward."""
+
+    def time(self):
+        return time.time()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+def parse_deadline(deadline_time):
+    """Epoch seconds of an API deadline_time such as '2024-08-16T17:30:00Z'."""
+    return datetime.strptime(deadline_time, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp()
+
+def event_deadlines(bootstrap):
+    """Sorted deadlines of every gameweek in the bootstrap-static calendar, in epoch seconds."""
+    return sorted(parse_deadline(event['deadline_time']) for event in bootstrap['events'] if event.get('deadline_time'))
+
+def poll_delay(now, deadlines):
+    """
+    Seconds until the next check at `now`, given the sorted deadlines of the season.
+
+    Checks come more often as the next deadline gets closer. A check that would fall after the deadline is
+    moved to AFTER_DEADLINE_SECONDS past it instead, so every gameweek is picked up soon after it starts.
+    """
+    i = bisect.bisect_right(deadlines, now)
+    if i == len(deadlines):
+        return FAR_POLL_SECONDS
+    left = deadlines[i] - now
+    delay = next((seconds for hours, seconds in POLL_SCHEDULE if left <= hours * 3600), FAR_POLL_SECONDS)
+    return delay if delay <= left else left + AFTER_DEADLINE_SECONDS
+
+def run_schedule(tick, get_deadlines, clock=None, ticks=None, logger=None):
+    """
+    Call tick() on the poll schedule of the event calendar.
+
+    Parameters:
+    - tick: one check, e.g. a worker run.
+    - get_deadlines: returns the sorted deadlines after a tick, the last known ones are kept when it fails.
+    - clock: object with time() and sleep(seconds), SystemClock when None.
+    - ticks: number of checks made before returning, forever when None.
+    - logger: failed checks are logged here and the schedule goes on.
+
+    Returns:
+    List of (time, delay) of every check made.
+    """
+    clock = clock or SystemClock()
+    deadlines, checks = [], []
+    while ticks is None or len(checks) < ticks:
+        started = clock.time()
+        try:
+            tick()
+            deadlines = get_deadlines()
+        except Exception as e:
+            # A daemon outlives a failed check, the next one is made on schedule
+            if logger is None:
+                raise
+            logger.error(f"Scheduled run failed: {e!r}")
+        delay = poll_delay(clock.time(), deadlines)
+        checks.append((started, delay))
+        clock.sleep(delay)
+    return checks
@@ -1,40 +1,173 @@
+import hashlib
+import json
 import os
-from dotenv import load_dotenv
 import smtplib
+import time
+from dotenv import load_dotenv
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from fpl_client import get_cache_path
+
+# SMTP server, can be pointed at a local sink with SMTP_HOST/SMTP_PORT
+SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+
+# Messages sent per second, Gmail throttles accounts that send in bursts
+EMAIL_RATE_LIMIT = float(os.getenv('EMAIL_RATE_LIMIT', 1.0))
+# Attempts per message on temporary failures, the wait doubles after every attempt
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 4))
+EMAIL_BACKOFF_SECONDS = float(os.getenv('EMAIL_BACKOFF_SECONDS', 2.0))
+
+# Failures worth another attempt on a fresh connection, on top of the 4xx replies that are temporary by definition
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
 
-def send_email(message, next_gameweek_api):
-    # Load environment variables from .env file
-    load_dotenv('../.env')
-
-    # Get the email credentials from environment variables
-    email_address = os.getenv('EMAIL_ADDRESS')
-    email_password = os.getenv('EMAIL_PASSWORD')
-    
-    # set up the SMTP server
-    smtp_server = smtplib.SMTP(host='smtp.gmail.com', port=587)
-    smtp_server.starttls()
-    smtp_server.login(email_address, email_password)
-
-    # create a message
-    msg = MIMEMultipart()
-    msg['From'] = email_address
-    msg['To'] = email_address
+def send_email(html_message, text_message, next_gameweek_api):
+    """Send the report to the sender's own address, raising when it can't be delivered."""
+    queue = DeliveryQueue()
+    _, _, failed = queue.deliver([build_message(queue.sender, queue.sender, next_gameweek_api, html_message, text_message)])
+    if failed:
+        raise smtplib.SMTPException(f"The report was not delivered: {failed[0][1]}")
+
+def build_message(sender, recipient, next_gameweek_api, html_message, text_message):
+    # create a message with plain text and HTML versions of the report
+    msg = MIMEMultipart('alternative')
+    msg['From'] = sender
+    msg['To'] = recipient
     msg['Subject'] = f"FPL Transfer Recommendations - GW {next_gameweek_api}"
 
-    # format the message as HTML
-    html_message = f"""
-    <html>
-    <body>
-    <p>{message}</p>
-    </body>
-    </html>
+    # add in the message body, mail clients show the last part they can display
+    msg.attach(MIMEText(text_message, 'plain'))
+    msg.attach(MIMEText(html_message, 'html'))
+    return msg
+
+def delivery_id(msg):
+    """Identify a message by recipient, subject and content, so a rerun with the same report doesn't send it again."""
+    digest = hashlib.sha256()
+    for part in msg.walk():
+        if not part.is_multipart():
+            digest.update(part.get_payload(decode=True))
+    return f"{msg['To']}|{msg['Subject']}|{digest.hexdigest()[:16]}"
+
+
+class DeliveryQueue:
     """
+    Sends messages over one authenticated SMTP connection per batch.
 
-    # add in the message body
-    msg.attach(MIMEText(html_message, 'html'))
+    Sends are spaced to stay under rate_limit messages per second. Temporary failures (4xx replies,
+    dropped connections) are retried on a new connection with exponential backoff. Permanent failures
+    are returned to the caller. Every delivered message is appended to a record in the cache, and a
+    rerun skips the messages listed there.
+
+    The connection is always upgraded with STARTTLS before logging in, and a server that doesn't offer it is an
+    error. tls=False sends in plain text, only for a local sink such as the benchmarks' mock server.
+    """
+
+    def __init__(self, host=None, port=None, username=None, password=None, rate_limit=None, max_attempts=None,
+                 backoff=None, record_path=None, sleep=time.sleep, tls=True):
+        # Load the email credentials from the .env file
+        load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../.env'))
+        self.host = host or SMTP_HOST
+        self.port = port or SMTP_PORT
+        self.username = username or os.getenv('EMAIL_ADDRESS')
+        self.password = password or os.getenv('EMAIL_PASSWORD')
+        self.sender = self.username
+        self.rate_limit = EMAIL_RATE_LIMIT if rate_limit is None else rate_limit
+        self.max_attempts = max_attempts or EMAIL_MAX_ATTEMPTS
+        self.backoff = EMAIL_BACKOFF_SECONDS if backoff is None else backoff
+        self.record_path = record_path or os.path.join(get_cache_path(), 'delivered.jsonl')
+        self.sleep = sleep
+        self.tls = tls
+        self.connections = 0
+        self._smtp = None
+        self._last_send = None
+
+    def delivered(self):
+        """Ids of every message delivered so far."""
+        if not os.path.exists(self.record_path):
+            return set()
+        with open(self.record_path, encoding='utf8') as f:
+            return {json.loads(line)['id'] for line in f if line.strip()}
+
+    def deliver(self, messages, resend=False):
+        """
+        Send the messages that were not delivered before, or all of them with resend.
+
+        Returns:
+        (sent, skipped, failed): ids sent now, ids skipped because they were delivered before and
+        (id, error) pairs of messages that could not be delivered.
+        """
+        delivered = set() if resend else self.delivered()
+        sent, skipped, failed = [], [], []
+        os.makedirs(os.path.dirname(self.record_path), exist_ok=True)
+        try:
+            with open(self.record_path, 'a', encoding='utf8') as record:
+                for msg in messages:
+                    message_id = delivery_id(msg)
+                    if message_id in delivered:
+                        skipped.append(message_id)
+                        continue
+                    error = self._send_with_retries(msg)
+                    if error is not None:
+                        failed.append((message_id, error))
+                        continue
+                    # Record each message as soon as it is accepted, so a crash halfway doesn't resend the batch
+                    record.write(json.dumps({'id': message_id, 'to': msg['To'], 'sent_at': time.time()}) + '\n')
+                    record.flush()
+                    delivered.add(message_id)
+                    sent.append(message_id)
+        finally:
+            self.close()
+        return sent, skipped, failed
+
+    def _send_with_retries(self, msg):
+        for attempt in range(self.max_attempts):
+            try:
+                self._wait_for_rate_limit()
+                self._connection().send_message(msg)
+                return None
+            except smtplib.SMTPResponseException as e:
+                if not 400 <= e.smtp_code < 500:
+                    return f'{e.smtp_code} {e.smtp_error!r}'
+                error = e
+            except smtplib.SMTPRecipientsRefused as e:
+                codes = [code for code, _ in e.recipients.values()]
+                if not all(400 <= code < 500 for code in codes):
+                    return f'recipients refused: {e.recipients!r}'
+                error = e
+            except TRANSIENT_ERRORS as e:
+                error = e
+            # Start over on a new connection after a back-off
+            self.close()
+            if attempt + 1 < self.max_attempts:
+                self.sleep(self.backoff * 2 ** attempt)
+        return repr(error)
+
+    def _wait_for_rate_limit(self):
+        if self.rate_limit and self._last_send is not None:
+            wait = self._last_send + 1 / self.rate_limit - time.monotonic()
+            if wait > 0:
+                self.sleep(wait)
+        self._last_send = time.monotonic()
+
+    def _connection(self):
+        if self._smtp is None:
+            smtp = smtplib.SMTP(host=self.host, port=self.port)
+            smtp.ehlo()
+            if self.tls:
+                # Raises SMTPNotSupportedError when STARTTLS isn't offered, rather than sending the password in plain text
+                smtp.starttls()
+                smtp.ehlo()
+            if self.password and smtp.has_extn('auth'):
+                smtp.login(self.username, self.password)
+            self._smtp = smtp
+            self.connections += 1
+        return self._smtp
 
-    # send the message via the server
-    smtp_server.send_message(msg)
-    smtp_server.quit()
\ No newline at end of file
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
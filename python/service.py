@@ -0,0 +1,248 @@
+import argparse
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+import requests
+from fpl_client import get_client
+from get_fpl_team import load_source_data, process_manager, get_top_players_by_position, get_gameweek_info_from_api, get_source_data_path
+from handle_logging import initiate_logging
+from player_resolver import build_player_index
+from precheck import hash_source_files
+from report_renderer import render_sections
+from scheduler import event_deadlines, run_schedule
+from transfer_planner import PLANNER_BEAM_WIDTH
+
+# Sections of a manager's result served by each endpoint, the full result is served at /manager/<id>
+MANAGER_VIEWS = {
+    'lineup': ('team', 'lineup', 'bench'),
+    'transfers': ('transfers', 'wildcard', 'plan'),
+    'chips': ('chips',),
+}
+# Values of the format and wildcard query parameters, anything else is answered with a 400
+FORMATS = ('json', 'html', 'text')
+WILDCARD_VALUES = {'1': True, 'true': True, '0': False, 'false': False}
+
+
+class ServiceError(Exception):
+    """An error answered with its HTTP status instead of a 500."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ServiceState:
+    """The source data of one gameweek and the results computed from it, replaced as a whole when either changes."""
+
+    def __init__(self, source_key, next_gameweek_api, source_data_path):
+        self.source_key = source_key
+        self.next_gameweek_api = next_gameweek_api
+        self.df, self.all_players_df, self.matching_names_df, self.managers_df = load_source_data(source_data_path)
+        self.next_gameweek = int(self.df.columns[10])
+        self.player_index = build_player_index(self.all_players_df, self.matching_names_df)
+        # Picks and banks of the last gameweek are fixed until the next deadline, so a result holds for the whole state
+        self.results = {}
+        self.top_players = None
+        # Encoded answers by endpoint, format and wildcard, a repeated request costs a lookup
+        self.responses = {}
+        self.managers = {int(row['ID']): row for _, row in self.managers_df.iterrows()}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def lock(self, key):
+        """Lock of one cached result, so concurrent requests for it compute it once."""
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+
+class RecommendationService:
+    """
+    Recommendations of any manager over HTTP, from source data and results kept in memory between requests.
+
+    Parameters:
+    - source_data_path: folder of the source files, the repository's source_data when None.
+    - plan_horizon, beam_width: transfer plan settings as in worker.py.
+    - check_mail: look for a new CSV in the mailbox on every refresh, as a worker run does.
+    - logger: where state changes and failed requests are logged, status.log when None.
+    """
+
+    def __init__(self, source_data_path=None, plan_horizon=5, beam_width=None, check_mail=True, logger=None):
+        self.source_data_path = source_data_path or get_source_data_path()
+        self.plan_horizon = plan_horizon
+        self.beam_width = PLANNER_BEAM_WIDTH if beam_width is None else beam_width
+        self.check_mail = check_mail
+        self.state = None
+        self.logger = logger or initiate_logging()
+        self._refresh_lock = threading.Lock()
+
+    def refresh(self):
+        """
+        Read the gameweek from the API and, with check_mail, fetch a new CSV. The state is rebuilt when the CSV was
+        updated, the source files hash differently or the API moved on to another gameweek, which drops every
+        cached result at once. Requests keep being served from the old state while the new one loads.
+        """
+        with self._refresh_lock:
+            get_client().refresh()
+            last_gameweek_api, next_gameweek_api, last_gameweek_api_deadline_date = get_gameweek_info_from_api()
+            is_updated = False
+            if self.check_mail:
+                from update_source_data import fetch_new_source_data_from_gmail
+                _, is_updated = fetch_new_source_data_from_gmail(next_gameweek_api, last_gameweek_api_deadline_date, source_data_path=self.source_data_path)
+            source_key = hash_source_files(self.source_data_path)
+            state = self.state
+            if is_updated or state is None or state.source_key != source_key or state.next_gameweek_api != next_gameweek_api:
+                self.state = ServiceState(source_key, next_gameweek_api, self.source_data_path)
+                self.logger.info(f"Service state loaded for gameweek {self.state.next_gameweek}, API gameweek {next_gameweek_api}.")
+            return self.state
+
+    def current_state(self):
+        state = self.state or self.refresh()
+        if state.next_gameweek != state.next_gameweek_api:
+            raise ServiceError(503, f'Next gameweek from API ({state.next_gameweek_api}) does not match the next gameweek from CSV ({state.next_gameweek}).')
+        return state
+
+    def manager_result(self, manager_id, wildcard=None, state=None):
+        """The process_manager result of a manager, computed once per state."""
+        state = state or self.current_state()
+        row = state.managers.get(manager_id)
+        if wildcard is None:
+            wildcard = row is not None and bool(row.get('Wildcard', False))
+        key = (manager_id, wildcard)
+        with state.lock(key):
+            if key not in state.results:
+                client = get_client()
+                try:
+                    picks = client.get_picks(manager_id, state.next_gameweek - 1)
+                    entry = client.get_entry(manager_id)
+                    history = client.get_history(manager_id)
+                except requests.HTTPError as e:
+                    if e.response is not None and e.response.status_code == 404:
+                        raise ServiceError(404, f'Manager {manager_id} was not found.')
+                    raise ServiceError(502, f'FPL API error: {e}')
+                except requests.RequestException as e:
+                    raise ServiceError(502, f'FPL API error: {e}')
+                name = row['Manager'] if row is not None else entry.get('name') or f'Manager {manager_id}'
+                state.results[key] = process_manager(manager_id, name, wildcard, state.next_gameweek, state.all_players_df,
+                                                     state.player_index, self.plan_horizon, self.beam_width, picks, entry, history)
+            return state.results[key]
+
+    def top_players(self, state=None):
+        state = state or self.current_state()
+        with state.lock('top'):
+            if state.top_players is None:
+                state.top_players = get_top_players_by_position(state.all_players_df, state.next_gameweek)
+            return state.top_players
+
+    def get(self, path, query):
+        """Answer a GET request with (status, content type, body)."""
+        parts = [part for part in path.split('/') if part]
+        if parts == ['health']:
+            state = self.state
+            return respond({'status': 'ok', 'next_gameweek': state and state.next_gameweek,
+                            'cached_results': state and len(state.results)})
+        query = normalize_query(query)
+        state = self.current_state()
+        key = (tuple(parts), query['format'], query['wildcard'])
+        response = state.responses.get(key)
+        if response is None:
+            response = state.responses[key] = self.answer(state, parts, query)
+        return response
+
+    def answer(self, state, parts, query):
+        if parts == ['top-players']:
+            return respond({'next_gameweek': state.next_gameweek, 'sections': self.top_players(state)}, query)
+        if len(parts) in (2, 3) and parts[0] == 'manager' and parts[1].isdigit() and (len(parts) == 2 or parts[2] in MANAGER_VIEWS):
+            result = self.manager_result(int(parts[1]), query['wildcard'], state)
+            sections = result['sections']
+            if len(parts) == 3:
+                sections = [section for section in sections if section['kind'] in MANAGER_VIEWS[parts[2]]]
+            return respond({'manager': result['manager'], 'summary': result['summary'], 'sections': sections}, query)
+        raise ServiceError(404, f"No endpoint at /{'/'.join(parts)}.")
+
+    def serve_forever(self, host='127.0.0.1', port=8000, poll=True):
+        """Serve until interrupted, refreshing on the poll schedule of scheduler.py in the background when `poll`."""
+        httpd = self.make_server(host, port)
+        if poll:
+            threading.Thread(target=run_schedule, args=(self.refresh, lambda: event_deadlines(get_client().get_bootstrap_static())),
+                             kwargs={'logger': self.logger}, daemon=True).start()
+        else:
+            self.refresh()
+        self.logger.info(f"Recommendation service listening on {host}:{httpd.server_port}.")
+        try:
+            httpd.serve_forever()
+        finally:
+            httpd.server_close()
+
+    def make_server(self, host='127.0.0.1', port=0):
+        """An HTTP server for this service, port 0 picks a free port."""
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out in two writes, with Nagle on a keep-alive client waits for the delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+                try:
+                    status, content_type, body = service.get(url.path, query)
+                except ServiceError as e:
+                    status, content_type, body = respond({'error': str(e)}, status=e.status)
+                except Exception as e:
+                    service.logger.error(f"Request {self.path} failed: {e!r}")
+                    status, content_type, body = respond({'error': 'Internal error'}, status=500)
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        httpd = ThreadingHTTPServer((host, port), Handler)
+        httpd.daemon_threads = True
+        return httpd
+
+
+def normalize_query(query):
+    """
+    The format and wildcard of a request's query, so that cached answers are keyed by the few values they can take.
+
+    Returns:
+    Dictionary with 'format', one of FORMATS, and 'wildcard', True, False or None when not given.
+    Other values raise a ServiceError with status 400.
+    """
+    output = query.get('format', 'json').lower()
+    if output not in FORMATS:
+        raise ServiceError(400, f"Unknown format {query['format']!r}, use one of {', '.join(FORMATS)}.")
+    wildcard = query.get('wildcard')
+    if wildcard is not None:
+        if wildcard.lower() not in WILDCARD_VALUES:
+            raise ServiceError(400, f"Unknown wildcard {wildcard!r}, use 1, true, 0 or false.")
+        wildcard = WILDCARD_VALUES[wildcard.lower()]
+    return {'format': output, 'wildcard': wildcard}
+
+def respond(payload, query=None, status=200):
+    """Encode a payload as JSON, or its sections as HTML or text with ?format=html|text."""
+    output = (query or {}).get('format', 'json')
+    if output in ('html', 'text') and 'sections' in payload:
+        html_body, text_body = render_sections(payload['sections'])
+        if output == 'html':
+            return status, 'text/html; charset=utf-8', html_body.encode('utf8')
+        return status, 'text/plain; charset=utf-8', text_body.encode('utf8')
+    return status, 'application/json', json.dumps(payload).encode('utf8')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve FPL recommendations for any manager over HTTP.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--plan-horizon', type=int, default=5, help='gameweeks covered by the transfer plan, 0 turns it off')
+    parser.add_argument('--beam-width', type=int, help='states kept by the transfer planner, transfer_planner.PLANNER_BEAM_WIDTH by default')
+    parser.add_argument('--no-mail', action='store_true', help="serve the CSV in source_data as it is, without checking the mailbox for a new one")
+    args = parser.parse_args()
+    service = RecommendationService(plan_horizon=args.plan_horizon, beam_width=args.beam_width, check_mail=not args.no_mail)
+    service.serve_forever(args.host, args.port)
@@ -0,0 +1,174 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from source_loader import parse_number
+from transfer_recommendation import best_single_transfers
+
+# A player who plays gets gamma distributed points around his projection with this coefficient of variation
+POINTS_CV = 1.0
+# The chance to play is the weighted minutes over 90, at least this much so that rare starters keep a finite mean
+MIN_PLAY_PROBABILITY = 0.1
+MINUTES_COLUMN = ' Weighted minutes '
+# Scenarios sampled by one task of the process pool
+SCENARIO_BATCH = 5000
+# Streams of every manager and batch derive from this seed, so a rerun samples the same scenarios
+SIMULATION_SEED = int(os.getenv('FPL_SIMULATION_SEED', 2024))
+# Processes sampling scenarios, one per CPU by default, 1 samples in the calling thread
+SIMULATION_WORKERS = int(os.getenv('FPL_SIMULATION_WORKERS', os.cpu_count() or 1))
+# Percentiles of a choice's points reported as its downside
+DOWNSIDE_PERCENTILES = (5, 25)
+
+
+def play_probabilities(minutes):
+    """Chance to play of every player from his weighted minutes, 1 where the CSV has no minutes (defenders and goalkeepers)."""
+    minutes = np.asarray(minutes, dtype=np.float64)
+    return np.where(np.isnan(minutes), 1.0, np.clip(minutes / 90, MIN_PLAY_PROBABILITY, 1.0))
+
+def sample_points(rng, expected, play, scenarios):
+    """
+    Sample the points of every player in every gameweek.
+
+    Parameters:
+    - rng: numpy Generator.
+    - expected: (players, gameweeks) projected points, negative projections count as 0.
+    - play: (players,) chance to play in each gameweek.
+    - scenarios: number of samples.
+
+    Returns:
+    (scenarios, players, gameweeks) array. A player plays or not independently in every gameweek and
+    scores gamma distributed points when he does, so the mean of every cell is the projection.
+    """
+    shape = 1 / POINTS_CV ** 2
+    scale = np.maximum(np.nan_to_num(expected, nan=0.0), 0.0) / play[:, None] / shape
+    plays = rng.random((scenarios,) + scale.shape) < play[:, None]
+    return np.where(plays, rng.gamma(shape, np.broadcast_to(scale, plays.shape)), 0.0)
+
+def simulate_batch(expected, play, weights, scenarios, seed, spawn_key):
+    """Points of every choice, (scenarios, choices), in one batch of scenarios sampled from its own stream."""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=spawn_key))
+    points = sample_points(rng, expected, play, scenarios).reshape(scenarios, -1)
+    return points @ weights.reshape(len(weights), -1).T
+
+def simulate_choices(expected, play, weights, baselines, scenarios, key, seed=None):
+    """
+    Score choices on the same sampled scenarios.
+
+    Parameters:
+    - expected, play: projections and chances to play of the players the choices involve, see sample_points.
+    - weights: (choices, players, gameweeks) points each choice gets from each player, e.g. 2 for a captain
+      or -1 for a sold player.
+    - baselines: (choices,) choice each one is compared with, -1 to compare with 0 points.
+    - scenarios: number of scenarios.
+    - key: non-negative ints naming the streams, e.g. (manager_id,). Batch i samples from the stream
+      (seed, key + (i,)), so the result doesn't depend on the pool or on the other managers of the run.
+    - seed: SIMULATION_SEED when None.
+
+    Returns:
+    Dictionary of (choices,) arrays: 'mean', 'p<q>' for each of DOWNSIDE_PERCENTILES, and 'beats', the
+    share of scenarios where a choice scores more than its baseline.
+    """
+    seed = SIMULATION_SEED if seed is None else seed
+    weights = np.asarray(weights, dtype=np.float64)
+    sizes = [min(SCENARIO_BATCH, scenarios - start) for start in range(0, scenarios, SCENARIO_BATCH)]
+    pool = get_pool() if len(sizes) > 1 else None
+    args = [(expected, play, weights, size, seed, tuple(key) + (i,)) for i, size in enumerate(sizes)]
+    if pool is None:
+        batches = [simulate_batch(*arg) for arg in args]
+    else:
+        batches = list(pool.map(simulate_batch, *zip(*args)))
+    values = np.concatenate(batches)
+
+    baselines = np.asarray(baselines)
+    compared = np.where(baselines >= 0, values[:, np.maximum(baselines, 0)], 0.0)
+    result = {'mean': values.mean(axis=0)}
+    for q in DOWNSIDE_PERCENTILES:
+        result[f'p{q}'] = np.percentile(values, q, axis=0)
+    result['beats'] = (values > compared).mean(axis=0)
+    return result
+
+def risk_table(ranked, squad, multipliers, lineup, gameweeks, bank, scenarios, key, transfers=5, seed=None):
+    """
+    Expected points, downside and chance of beating the current choice of the recommended XI and transfers.
+
+    Parameters:
+    - ranked: RankedPlayers of the projection table.
+    - squad: (players,) rows of the squad in the table, -1 for players without data.
+    - multipliers: (players,) the manager's current multipliers, 0 on the bench and 2 for the captain.
+    - lineup: lineup.best_lineups of the squad for gameweeks[0].
+    - gameweeks: gameweeks of the transfer window, the XIs are scored on the first.
+    - bank: int, money in the bank in tenths.
+    - scenarios, key, seed: see simulate_choices.
+    - transfers: number of the best single transfers scored, 0 for none.
+
+    Returns:
+    DataFrame with a row per choice. XI rows are points in the first gameweek, compared with the current XI
+    and captain. Transfer rows are the points gained over the window, compared with making no transfer.
+    """
+    squad = np.asarray(squad)
+    columns = ['Choice', 'Expected'] + [f'P{q}' for q in DOWNSIDE_PERCENTILES] + ['Beats current']
+    if transfers:
+        player_arrays = ranked.player_arrays([str(gameweek) for gameweek in gameweeks])
+        sell, buy, gain, _ = (a[0] for a in best_single_transfers(player_arrays, squad[None, :], np.array([bank]), transfers,
+                                                                  buy_rows=ranked.buy_pool([str(gameweek) for gameweek in gameweeks], transfers)))
+        sell, buy = sell[np.isfinite(gain)], buy[np.isfinite(gain)]
+    else:
+        sell = buy = np.empty(0, dtype=np.int64)
+
+    # Only the players some choice involves are sampled, column i of the samples is table row rows[i]
+    rows = np.unique(np.concatenate([squad[squad >= 0], sell, buy]))
+    if not len(rows):
+        return pd.DataFrame(columns=columns)
+    column = {row: i for i, row in enumerate(rows)}
+    expected = ranked.projection_matrix(gameweeks)[rows].astype(np.float64)
+    play = play_probabilities(parse_number(ranked.frame[MINUTES_COLUMN].iloc[rows]).to_numpy(dtype=float)
+                              if MINUTES_COLUMN in ranked.frame.columns else np.full(len(rows), np.nan))
+
+    players = ranked.frame['Player'].to_numpy()
+    starters = lineup['starters'][0]
+    captain = squad[lineup['captain'][0]]
+    weights = np.zeros((2 + len(sell), len(rows), len(gameweeks)))
+    for slot in starters[starters >= 0]:
+        if squad[slot] >= 0:
+            weights[0, column[squad[slot]], 0] += 1
+    for row, multiplier in zip(squad, multipliers):
+        if row >= 0:
+            weights[1, column[row], 0] += multiplier
+    labels = [f'Recommended XI, captain {players[captain]}' if captain >= 0 else 'Recommended XI', 'Current XI']
+    if captain >= 0:
+        weights[0, column[captain], 0] += 1
+    for i, (out_row, in_row) in enumerate(zip(sell, buy)):
+        weights[2 + i, column[in_row], :] += 1
+        weights[2 + i, column[out_row], :] -= 1
+        labels.append(f'{players[out_row]} -> {players[in_row]}')
+    baselines = [1, -1] + [-1] * len(sell)
+
+    stats = simulate_choices(expected, play, weights, baselines, scenarios, key, seed)
+    table = {'Choice': labels, 'Expected': stats['mean'].round(2)}
+    for q in DOWNSIDE_PERCENTILES:
+        table[f'P{q}'] = stats[f'p{q}'].round(2)
+    # The current XI is the baseline itself
+    table['Beats current'] = np.where(np.arange(len(labels)) == 1, np.nan, (stats['beats'] * 100).round(1))
+    return pd.DataFrame(table, columns=columns)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process pool shared by every simulation of the run, None when SIMULATION_WORKERS is 1."""
+    global _pool
+    with _pool_lock:
+        if _pool is None and SIMULATION_WORKERS > 1:
+            # Managers are processed on threads, spawned processes don't inherit locks held by other threads
+            _pool = ProcessPoolExecutor(max_workers=SIMULATION_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+def set_pool(pool):
+    """Replace the shared pool, e.g. with one of another size. After None the next simulation starts a new one."""
+    global _pool
+    with _pool_lock:
+        _pool = pool
+    return pool
@@ -0,0 +1,92 @@
+import glob
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+
+# Columns kept as categories, everything else except the player name is numeric
+CATEGORICAL_COLUMNS = ['Position', 'Team']
+TEXT_COLUMNS = ['Player']
+# Numeric columns stored at double precision, projections and the other stats are float32
+FLOAT64_COLUMNS = ['No.', ' BCV ', ' Price ']
+
+
+def parse_number(series):
+    """Convert padded CSV numbers such as ' 5.4 ', ' (0.05)' and ' -   ' to floats, dashes become NaN."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    # numpy's string functions run in C, pandas' .str methods call Python for every cell
+    text = np.strings.strip(series.fillna('').to_numpy(dtype=str))
+    negative = np.strings.startswith(text, '(')
+    values = pd.to_numeric(pd.Series(np.strings.strip(text, '()'), index=series.index), errors='coerce')
+    return values.where(~negative, -values)
+
+def parse_percentage(series):
+    """Convert percentages such as '93%' to fractions."""
+    text = np.strings.strip(series.fillna('').to_numpy(dtype=str))
+    return pd.to_numeric(pd.Series(np.strings.rstrip(text, '%'), index=series.index), errors='coerce') / 100
+
+def read_transfer_algorithm(csv_path):
+    """
+    Read TransferAlgorithm.csv as a typed DataFrame, through a binary cache keyed by the file's hash.
+
+    The first read of a CSV parses it once into float columns (parenthesized numbers negative, dashes NaN),
+    categorical Position/Team and stores the result as an .npz file next to the CSV. Later reads of the
+    same content load the arrays directly.
+    """
+    with open(csv_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:16]
+    stem = os.path.splitext(csv_path)[0]
+    cache_path = f'{stem}.{digest}.npz'
+
+    if os.path.exists(cache_path):
+        return load_cache(cache_path)
+
+    df = parse_transfer_algorithm(csv_path)
+    # Caches of older versions of the CSV are never read again
+    for stale_path in glob.glob(f'{glob.escape(stem)}.*.npz'):
+        os.remove(stale_path)
+    save_cache(df, cache_path)
+    return load_cache(cache_path)
+
+def parse_transfer_algorithm(csv_path):
+    """Parse the padded ISO-8859-1 CSV into typed columns."""
+    df = pd.read_csv(csv_path, encoding='ISO-8859-1', dtype=str)
+    for column in df.columns:
+        if column in CATEGORICAL_COLUMNS:
+            df[column] = df[column].str.strip().astype('category')
+        elif column in TEXT_COLUMNS:
+            df[column] = df[column].astype(object)
+        elif np.strings.endswith(np.strings.strip(df[column].fillna('').to_numpy(dtype=str)), '%').any():
+            df[column] = parse_percentage(df[column]).astype(np.float32)
+        else:
+            df[column] = parse_number(df[column]).astype(np.float64 if column in FLOAT64_COLUMNS else np.float32)
+    return df
+
+def save_cache(df, cache_path):
+    # npz keys become file names, so columns are stored by position and their names separately
+    arrays = {'columns': np.array(df.columns, dtype=str)}
+    for i, column in enumerate(df.columns):
+        if isinstance(df[column].dtype, pd.CategoricalDtype):
+            arrays[f'codes_{i}'] = df[column].cat.codes.to_numpy()
+            arrays[f'categories_{i}'] = np.array(df[column].cat.categories, dtype=str)
+        elif column in TEXT_COLUMNS:
+            arrays[f'text_{i}'] = df[column].fillna('').to_numpy(dtype=str)
+        else:
+            arrays[f'values_{i}'] = df[column].to_numpy()
+    temp_path = f'{cache_path}.tmp.npz'
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, cache_path)
+
+def load_cache(cache_path):
+    columns = {}
+    with np.load(cache_path) as arrays:
+        names = arrays['columns']
+        for i, column in enumerate(names):
+            if f'codes_{i}' in arrays:
+                columns[column] = pd.Categorical.from_codes(arrays[f'codes_{i}'], categories=arrays[f'categories_{i}'])
+            elif f'text_{i}' in arrays:
+                columns[column] = arrays[f'text_{i}'].astype(object)
+            else:
+                columns[column] = arrays[f'values_{i}']
+    return pd.DataFrame(columns)
@@ -0,0 +1,298 @@
+import heapq
+import numpy as np
+from lineup import FORMATIONS, lineup_points
+
+# Players per position in a full squad, in the order of ranked_players.POSITION_CODES
+SQUAD_QUOTAS = (2, 5, 5, 3)
+MAX_PLAYERS_PER_TEAM = 3
+
+
+def optimize_squad(player_arrays, budget, quotas=SQUAD_QUOTAS, max_per_team=MAX_PLAYERS_PER_TEAM, floor=-np.inf, copies=None):
+    """
+    Find the squad with the highest total score that fits the quotas, the budget and the club limit.
+
+    Parameters:
+    - player_arrays: dictionary from ranked_players.build_player_arrays.
+    - budget: int, money available for the whole squad in tenths.
+    - quotas: players required per position code.
+    - max_per_team: maximum number of players from one club, or an array with the limit of every club.
+    - floor: squads scoring floor or less are of no interest, the search leaves out every node bounded by it.
+    - copies: (rows,) id of the player behind every row, or None when every row is a player of his own. Rows with
+      the same id are copies of one player in different positions, e.g. as a starter and on the bench, and at
+      most one of them is picked.
+
+    Returns:
+    Tuple (rows, score) with the rows of the optimal squad in player_arrays, or (None, -inf) when no
+    squad fits the budget or scores more than floor.
+
+    The search is a best-first branch and bound. Each node is bounded by the best squad that ignores the
+    club limit, which a knapsack over (players, cost) per position finds exactly. When that squad picks two
+    copies of a player, the node branches on which copy is left out. When it breaks the club limit, the node
+    branches on one of the offending players: leave him out, or keep him for good. The first node whose
+    relaxed squad respects both is optimal. Players that can always be swapped for a better and cheaper one
+    are left out of the search first, see club_undominated.
+    """
+    n_clubs = len(player_arrays['club_names'])
+    max_per_team = np.broadcast_to(max_per_team, n_clubs)
+    extra = 0
+    if copies is not None:
+        # A better and cheaper player may be in the squad already as his copy in another position
+        position = player_arrays['position']
+        extra = [sum(quotas[other] for other in np.unique(position[np.isin(copies, copies[position == code])]) if other not in (-1, code))
+                 for code in range(len(quotas))]
+    pool = club_undominated(player_arrays['price'], player_arrays['score'], player_arrays['position'], player_arrays['club'],
+                                  n_clubs, quotas, max_per_team, extra)
+    price = player_arrays['price'][pool].astype(np.int64)
+    score = player_arrays['score'][pool].astype(np.float64)
+    position = player_arrays['position'][pool]
+    club = player_arrays['club'][pool]
+    copies = None if copies is None else np.asarray(copies)[pool]
+    budget = int(budget)
+
+    def relax(forced, excluded):
+        allowed = (position >= 0) & (club >= 0) & (price <= budget)
+        allowed[list(forced | excluded)] = False
+        forced_rows = np.fromiter(forced, dtype=np.int64, count=len(forced))
+        # Clubs that already have the maximum number of kept players can't supply anyone else
+        full_clubs = np.flatnonzero(np.bincount(club[forced_rows], minlength=n_clubs) >= max_per_team)
+        allowed &= ~np.isin(club, full_clubs)
+        if copies is not None:
+            allowed &= ~np.isin(copies, copies[forced_rows])
+        needs = [quota - int(np.sum(position[forced_rows] == code)) for code, quota in enumerate(quotas)]
+        rows, value = best_squad_ignoring_clubs(price, score, position, allowed, needs, budget - int(price[forced_rows].sum()))
+        if rows is None:
+            return None, -np.inf
+        return np.concatenate([forced_rows, rows]), value + float(score[forced_rows].sum())
+
+    counter = 0
+    rows, bound = relax(frozenset(), frozenset())
+    heap = [(-bound, counter, frozenset(), frozenset(), rows)] if rows is not None and bound > floor else []
+    while heap:
+        neg_bound, _, forced, excluded, rows = heapq.heappop(heap)
+        if copies is not None:
+            ids, id_counts = np.unique(copies[rows], return_counts=True)
+            if id_counts.max() > 1:
+                # Branch on which copy of a player picked twice is left out, kept copies already rule out the others
+                for row in rows[copies[rows] == ids[np.argmax(id_counts)]]:
+                    child_rows, child_bound = relax(forced, excluded | {row})
+                    if child_rows is not None and child_bound > floor:
+                        counter += 1
+                        heapq.heappush(heap, (-child_bound, counter, forced, excluded | {row}, child_rows))
+                continue
+
+        club_counts = np.bincount(club[rows], minlength=n_clubs)
+        over = np.flatnonzero(club_counts > max_per_team)
+        if len(over) == 0:
+            return pool[np.sort(rows)], -neg_bound
+
+        # Branch on the weakest player of the most crowded club who is not kept for good yet
+        crowded = over[np.argmax(club_counts[over])]
+        candidates = [row for row in rows[club[rows] == crowded] if row not in forced]
+        branch_row = min(candidates, key=lambda row: score[row])
+
+        for child_forced, child_excluded in ((forced, excluded | {branch_row}), (forced | {branch_row}, excluded)):
+            if child_forced is not forced and np.sum(club[list(child_forced)] == crowded) < max_per_team[crowded]:
+                # Keeping a player of the relaxed squad leaves the relaxed squad unchanged
+                child_rows, child_bound = rows, -neg_bound
+            else:
+                child_rows, child_bound = relax(child_forced, child_excluded)
+            if child_rows is not None and child_bound > floor:
+                counter += 1
+                heapq.heappush(heap, (-child_bound, counter, child_forced, child_excluded, child_rows))
+
+    return None, -np.inf
+
+def optimize_lineup_squad(player_arrays, budget, max_per_team=MAX_PLAYERS_PER_TEAM):
+    """
+    Find the squad whose best XI, with the captain counted twice, has the highest score within the budget and the club limit.
+
+    Parameters:
+    - player_arrays: dictionary from ranked_players.build_player_arrays, the score of one gameweek.
+    - budget: int, money available for the whole squad in tenths.
+    - max_per_team: maximum number of players from one club.
+
+    Returns:
+    Tuple (rows, points) with the 15 rows of the squad in player_arrays and the points of its XI as lineup.lineup_points,
+    or (None, -inf) when no squad fits the budget.
+
+    Every player has two copies, a starter with his score and a bench player with none, and for every formation of
+    lineup.FORMATIONS one optimize_squad picks the starters of the formation and the bench of the remaining quotas
+    together, so the bench shares the budget and the club limit with the XI exactly.
+    The search starts from the squad with the highest total score, which also tells quickly when no squad fits.
+    A captain adds at most his own score to the best XI without a captain, so only players scoring more than the
+    captain of that XI are tried as captain, by doubling their score, until none of them can beat the best squad.
+    For the same reason a formation's search is cut short once its XI can't come within the best starter's score
+    of the best squad so far.
+    """
+    price, score, position, club = (player_arrays[key] for key in ('price', 'score', 'position', 'club'))
+    n_players = len(price)
+    # Rows below n_players are starters, the rest their copies on the bench in the position codes after the starters'
+    squad_arrays = dict(player_arrays, player=np.concatenate([player_arrays['player']] * 2), price=np.concatenate([price, price]),
+                        score=np.concatenate([score, np.zeros_like(score)]), club=np.concatenate([club, club]),
+                        position=np.concatenate([position, np.where(position >= 0, position + len(SQUAD_QUOTAS), -1)]).astype(np.int8))
+    copies = np.concatenate([np.arange(n_players)] * 2)
+    best_rows, _ = optimize_squad(player_arrays, budget, max_per_team=max_per_team)
+    if best_rows is None:
+        return None, -np.inf
+    best_points = float(lineup_points(score[best_rows][None, :], position[best_rows][None, :])[0])
+    starters = np.flatnonzero((position >= 0) & (club >= 0) & (price <= budget))
+
+    def consider(rows):
+        nonlocal best_rows, best_points
+        if rows is None:
+            return
+        # The XI and its best captain, whichever player was doubled to find it
+        xi = rows[rows < n_players]
+        points = float(score[xi].sum() + score[xi].max())
+        if points > best_points:
+            best_rows, best_points = np.sort(rows % n_players), points
+
+    for formation in FORMATIONS:
+        quotas = tuple(int(quota) for quota in formation) + tuple(int(quota) for quota in np.array(SQUAD_QUOTAS) - formation)
+        rows, value = optimize_squad(squad_arrays, budget, quotas, max_per_team, floor=best_points - score[starters].max(), copies=copies)
+        if rows is None:
+            continue
+        consider(rows)
+        xi = rows[rows < n_players]
+        captains = starters[score[starters] > score[xi].max()]
+        for captain in captains[np.argsort(-score[captains], kind='stable')]:
+            if value + score[captain] <= best_points:
+                break
+            doubled = squad_arrays['score'].astype(np.float64)
+            doubled[captain] *= 2
+            consider(optimize_squad(dict(squad_arrays, score=doubled), budget, quotas, max_per_team, floor=best_points, copies=copies)[0])
+    return best_rows, best_points
+
+def club_undominated(price, score, position, club, n_clubs, quotas=SQUAD_QUOTAS, max_per_team=MAX_PLAYERS_PER_TEAM, extra=0):
+    """
+    Return the sorted rows of the players that an optimal squad may need.
+
+    A player is left out when players of the same position who score at least as much for at most the
+    same price play for quota + 15 // max_per_team different clubs. At most that many clubs are full in
+    any squad, so one of those players is outside the squad at a club with room, and swapping him in
+    doesn't lower the score or break the budget. With extra > 0 the player is kept until extra more
+    clubs dominate him, so that extra such players are available, extra may also be given per position.
+    With a limit per club, the number of clubs that can be full counts the clubs with the lowest limits first.
+    """
+    limits = np.sort(np.broadcast_to(max_per_team, n_clubs))
+    full_clubs = int(np.searchsorted(np.cumsum(limits), sum(quotas), side='right'))
+    extra = np.broadcast_to(extra, len(quotas))
+    keep = []
+    for code, quota in enumerate(quotas):
+        rows = np.flatnonzero((position == code) & (club >= 0))
+        # Ties in score go to the cheaper player, then to the lower row, so no two players dominate each other
+        rows = rows[np.lexsort((rows, price[rows], -score[rows]))]
+        prices = np.where(club[rows][None, :] == np.arange(n_clubs)[:, None], price[rows][None, :], np.inf)
+        # cheapest[c, i] is the cheapest player of club c ranked before player i
+        cheapest = np.minimum.accumulate(prices, axis=1)
+        cheapest = np.concatenate([np.full((n_clubs, 1), np.inf), cheapest[:, :-1]], axis=1)
+        dominating_clubs = (cheapest <= price[rows][None, :]).sum(axis=0)
+        keep.append(rows[dominating_clubs < quota + full_clubs + extra[code]])
+    return np.sort(np.concatenate(keep))
+
+def best_squad_ignoring_clubs(price, score, position, allowed, needs, budget):
+    """Return (rows, score) of the best squad with needs[code] players per position costing at most budget."""
+    if budget < 0 or min(needs) < 0:
+        return None, -np.inf
+
+    tables = []
+    for code, need in enumerate(needs):
+        rows = np.flatnonzero(allowed & (position == code))
+        rows = undominated(rows, price, score, need)
+        if len(rows) < need:
+            return None, -np.inf
+        tables.append(position_knapsack(rows, price, score, need, budget))
+
+    # Combine the positions: best[c] is the best value of the positions so far costing at most c
+    best, splits = tables[0][0][-1], []
+    for table, _ in tables[1:-1]:
+        best, split = max_plus_convolution(best, table[-1])
+        splits.append(split)
+    # Only the full budget matters once the last position is added
+    last = tables[-1][0][-1]
+    candidates = best + last[::-1]
+    split = np.full(budget + 1, np.argmax(candidates))
+    splits.append(split)
+    if not np.isfinite(candidates[split[budget]]):
+        return None, -np.inf
+    value = float(candidates[split[budget]])
+
+    # Walk the splits backwards to find how much of the budget each position used
+    costs, remaining = [], budget
+    for split in reversed(splits):
+        spent_before = int(split[remaining])
+        costs.append(remaining - spent_before)
+        remaining = spent_before
+    costs.append(remaining)
+    costs.reverse()
+
+    selected = []
+    for (table, take_rows), need, cost in zip(tables, needs, costs):
+        selected.extend(take_rows(need, cost))
+    return np.array(selected, dtype=np.int64), value
+
+def undominated(rows, price, score, need):
+    """Drop players that at least `need` others beat on both price and score, they are never required."""
+    if len(rows) <= need:
+        return rows
+    p, s = price[rows], score[rows]
+    at_least_as_good = (p[None, :] <= p[:, None]) & (s[None, :] >= s[:, None])
+    strictly_better = at_least_as_good & ((p[None, :] < p[:, None]) | (s[None, :] > s[:, None]))
+    # Equal players are ordered by row so that exactly one of each tie is kept in front of the other
+    tie_before = at_least_as_good & ~strictly_better & (rows[None, :] < rows[:, None])
+    return rows[(strictly_better | tie_before).sum(axis=1) < need]
+
+def position_knapsack(rows, price, score, need, budget):
+    """
+    Exact knapsack for one position over (number of players, cost).
+
+    Returns (table, take_rows) where table[j][c] is the best score of j players costing at most c and
+    take_rows(j, c) returns the rows that reach it.
+    """
+    table = np.full((need + 1, budget + 1), -np.inf)
+    table[0, :] = 0.0
+    taken = np.zeros((len(rows), need + 1, budget + 1), dtype=bool)
+    for i, row in enumerate(rows):
+        cost, value = int(price[row]), score[row]
+        if cost > budget:
+            continue
+        for j in range(need, 0, -1):
+            candidate = table[j - 1, :budget + 1 - cost] + value
+            improved = candidate > table[j, cost:]
+            table[j, cost:][improved] = candidate[improved]
+            taken[i, j, cost:] = improved
+
+    def take_rows(j, c):
+        selected = []
+        for i in range(len(rows) - 1, -1, -1):
+            if j == 0:
+                break
+            if taken[i, j, c]:
+                selected.append(rows[i])
+                j -= 1
+                c -= int(price[rows[i]])
+        return selected
+
+    return table, take_rows
+
+def max_plus_convolution(a, b):
+    """Return (best, split) with best[c] = max over x <= c of a[x] + b[c - x] and split[c] the best x."""
+    size = len(a)
+    best = np.full(size, -np.inf)
+    split = np.zeros(size, dtype=np.int64)
+    finite_a, finite_b = np.flatnonzero(np.isfinite(a)), np.flatnonzero(np.isfinite(b))
+    if len(finite_a) == 0 or len(finite_b) == 0 or finite_a[0] + finite_b[0] >= size:
+        return best, split
+
+    # Costs below the cheapest option of either side can't be reached, leave them out of the matrix
+    lo_a, lo_b = finite_a[0], finite_b[0]
+    a, b = a[lo_a:], b[lo_b:]
+    width = size - lo_a - lo_b
+    padded_b = np.concatenate([np.full(width - 1, -np.inf), b[:width]])
+    # toeplitz[c, x] == b[c - x], with -inf where x > c
+    toeplitz = np.lib.stride_tricks.sliding_window_view(padded_b, width)[:, ::-1]
+    candidates = a[None, :width] + toeplitz
+    best_x = np.argmax(candidates, axis=1)
+    best[lo_a + lo_b:] = candidates[np.arange(width), best_x]
+    split[lo_a + lo_b:] = best_x + lo_a
+    return best, split
@@ -0,0 +1,151 @@
+import numpy as np
+import pandas as pd
+from lineup import lineup_points
+from squad_optimizer import SQUAD_QUOTAS
+from transfer_recommendation import best_single_transfers
+from ranked_players import buy_pool
+
+# Search width defaults, wider beams find better plans at the cost of latency
+PLANNER_BEAM_WIDTH = 30
+PLANNER_MOVES_PER_STATE = 6
+
+MAX_FREE_TRANSFERS = 5
+HIT_COST = 4
+# Chips that keep the free transfers banked before them
+FREE_TRANSFER_CHIPS = ('wildcard', 'freehit')
+
+
+def to_slot_order(player_arrays, squad):
+    """Order squad rows by position, and by row within a position, so equal squads get equal keys."""
+    squad = np.asarray(squad)
+    positions = player_arrays['position'][squad]
+    if (squad < 0).any() or tuple(np.bincount(positions, minlength=4)) != SQUAD_QUOTAS:
+        raise ValueError("The squad must hold 15 known players split 2/5/5/3 by position.")
+    return squad[np.lexsort((squad, positions))]
+
+def plan_transfers(player_arrays, projections, squad, bank, free_transfers=1, beam_width=PLANNER_BEAM_WIDTH,
+                   moves_per_state=PLANNER_MOVES_PER_STATE, max_transfers_per_gameweek=2):
+    """
+    Search transfer sequences over the projection horizon with a beam search.
+
+    Parameters:
+    - player_arrays: dictionary from ranked_players.build_player_arrays.
+    - projections: (players, gameweeks) array of projected points for each gameweek of the horizon.
+    - squad: rows of the current 15 players in player_arrays.
+    - bank: int, bank balance in tenths.
+    - free_transfers: int, free transfers available for the first gameweek.
+    - beam_width: number of squad states kept after each gameweek.
+    - moves_per_state: number of best single transfers expanded from every state.
+    - max_transfers_per_gameweek: transfers considered in one gameweek, the ones above the free
+      transfers cost 4 points each.
+
+    Returns:
+    List with one dictionary per gameweek holding the transfers (sell row, buy row), the hits taken and the
+    expected points of the best plan found.
+
+    Free transfers roll over up to 5, the bank follows every move. States are ranked by the points banked so
+    far plus the points the squad would score over the rest of the horizon without further transfers, and
+    squad points are memoized per (squad, gameweek).
+    """
+    horizon = projections.shape[1]
+    memo = {}
+
+    def points(squads, gameweek):
+        keys = [squad_row.tobytes() for squad_row in squads]
+        missing = [i for i, key in enumerate(keys) if (key, gameweek) not in memo]
+        if missing:
+            values = lineup_points(projections[squads[missing], gameweek], player_arrays['position'][squads[missing]])
+            for i, value in zip(missing, values):
+                memo[(keys[i], gameweek)] = float(value)
+        return np.array([memo[(key, gameweek)] for key in keys])
+
+    # A state is (squad, bank, free transfers, points so far, plan so far)
+    beam = [(to_slot_order(player_arrays, squad), int(bank), free_transfers, 0.0, [])]
+    for gameweek in range(horizon):
+        # Moves are ranked by what the bought player adds over the rest of the horizon
+        remaining_arrays = dict(player_arrays, score=projections[:, gameweek:].sum(axis=1).astype(np.float32))
+        buy_rows = buy_pool(remaining_arrays, moves_per_state)
+        candidates = [state + ([],) for state in beam]
+        frontier = candidates
+        for _ in range(max_transfers_per_gameweek):
+            if not frontier:
+                break
+            squads = np.stack([state[0] for state in frontier])
+            banks = np.array([state[1] for state in frontier])
+            sells, buys, gains, costs = best_single_transfers(remaining_arrays, squads, banks, top_k=moves_per_state, buy_rows=buy_rows)
+            seen, next_frontier = set(), []
+            for state, sell_row, buy_row, gain_row, cost_row in zip(frontier, sells, buys, gains, costs):
+                squad_state, bank_state, free_state, total, plan, moves = state
+                for sell, buy, gain, cost in zip(sell_row, buy_row, gain_row, cost_row):
+                    if not np.isfinite(gain):
+                        break
+                    new_squad = squad_state.copy()
+                    new_squad[new_squad == sell] = buy
+                    new_squad = to_slot_order(player_arrays, new_squad)
+                    key = (new_squad.tobytes(), len(moves) + 1)
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    next_frontier.append((new_squad, bank_state - int(cost), free_state, total, plan, moves + [(int(sell), int(buy))]))
+            candidates += next_frontier
+            frontier = next_frontier
+
+        # Score every candidate for this gameweek and for holding its squad until the end of the horizon
+        squads = np.stack([state[0] for state in candidates])
+        gameweek_points = points(squads, gameweek)
+        hold_points = sum((points(squads, later) for later in range(gameweek + 1, horizon)), np.zeros(len(candidates)))
+        ranked = []
+        for state, gameweek_point, hold_point in zip(candidates, gameweek_points, hold_points):
+            squad_state, bank_state, free_state, total, plan, moves = state
+            hits = max(len(moves) - free_state, 0)
+            total += gameweek_point - hits * HIT_COST
+            next_free = min(max(free_state - len(moves), 0) + 1, MAX_FREE_TRANSFERS)
+            step = {'transfers': moves, 'hits': hits, 'points': gameweek_point - hits * HIT_COST}
+            ranked.append((total + hold_point, (squad_state, bank_state, next_free, total, plan + [step])))
+
+        # Keep the best state for every distinct (squad, free transfers, bank)
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        beam, seen = [], set()
+        for _, state in ranked:
+            key = (state[0].tobytes(), state[2], state[1])
+            if key not in seen:
+                seen.add(key)
+                beam.append(state)
+            if len(beam) == beam_width:
+                break
+
+    return max(beam, key=lambda state: state[3])[4]
+
+def banked_free_transfers(history, next_gameweek):
+    """
+    Free transfers the manager has for next_gameweek, from the entry history of the API.
+
+    A team has 1 free transfer after its first gameweek, transfers before its first deadline being free. Every
+    later gameweek uses up to its free transfers, the transfers beyond them were hits, and adds one, up to
+    MAX_FREE_TRANSFERS. A gameweek with a wildcard or free hit keeps the free transfers banked before it.
+    """
+    kept = {chip['event'] for chip in history.get('chips', []) if chip['name'] in FREE_TRANSFER_CHIPS}
+    free_transfers = None
+    for gameweek in sorted(history.get('current', []), key=lambda gameweek: gameweek['event']):
+        if gameweek['event'] >= next_gameweek:
+            break
+        if free_transfers is None:
+            free_transfers = 1
+            continue
+        if gameweek['event'] not in kept:
+            free_transfers = max(free_transfers - gameweek['event_transfers'], 0)
+        free_transfers = min(free_transfers + 1, MAX_FREE_TRANSFERS)
+    return 1 if free_transfers is None else free_transfers
+
+def plan_to_dataframe(plan, player_arrays, gameweeks):
+    """Describe a plan from plan_transfers with one row per gameweek."""
+    rows = []
+    for gameweek, step in zip(gameweeks, plan):
+        transfers = ', '.join(f"{player_arrays['player'][sell]} -> {player_arrays['player'][buy]}" for sell, buy in step['transfers'])
+        rows.append({
+            'Gameweek': gameweek,
+            'Transfers': transfers or 'None',
+            'Hits': -HIT_COST * step['hits'],
+            'Expected points': round(step['points'], 2),
+        })
+    return pd.DataFrame(rows)
@@ -1,137 +1,151 @@
+import numpy as np
 import pandas as pd
+from squad_optimizer import optimize_squad, MAX_PLAYERS_PER_TEAM
+from ranked_players import buy_pool, get_ranked_players, POSITION_NAMES
 
-def recommend_transfers_one_transfer(all_players_df, current_bank_value, current_team_df):
+def squad_indices(player_arrays, player_names):
+    """Map squad player names to rows of player_arrays, -1 for players without projection data."""
+    row_by_name = {}
+    for row, name in enumerate(player_arrays['player']):
+        row_by_name.setdefault(name, row)
+    return np.array([row_by_name.get(name, -1) for name in player_names], dtype=np.int32)
+
+def best_single_transfers(player_arrays, squads, banks, top_k=10, chunk_size=256, buy_rows=None):
+    """
+    Score every (sell, buy) pair for a batch of squads with array operations.
+
+    Parameters:
+    - player_arrays: dictionary from build_player_arrays.
+    - squads: int array (squads, players) of rows in player_arrays, -1 for unmatched players.
+    - banks: int array (squads,) of bank balances in tenths.
+    - top_k: number of moves returned per squad.
+    - buy_rows: sorted rows that may be bought, the buy_pool of player_arrays when None.
+
+    Returns:
+    Tuple (sell, buy, gain, cost) of (squads, top_k) arrays sorted by gain. Slots without a legal move
+    have gain -inf. A move is legal when the bought player plays the same position, is not in the squad,
+    is affordable with the bank plus the sale and keeps his club at no more than 3 players.
     """
-    Recommend a player transfer based on available players, bank value, and current team.
+    squads = np.atleast_2d(np.asarray(squads))
+    banks = np.atleast_1d(np.asarray(banks))
+    price, score = player_arrays['price'], player_arrays['score']
+    position, club = player_arrays['position'], player_arrays['club']
+    # Only players that can make a top_k move for some squad are broadcast against the squads
+    if buy_rows is None:
+        buy_rows = buy_pool(player_arrays, top_k)
+    buy_price, buy_score = price[buy_rows], score[buy_rows]
+    buy_position, buy_club = position[buy_rows], club[buy_rows]
+    n_squads, n_buys = squads.shape[0], len(buy_rows)
+    k = min(top_k, squads.shape[1] * n_buys)
+
+    sell_out = np.empty((n_squads, k), dtype=np.int32)
+    buy_out = np.empty((n_squads, k), dtype=np.int32)
+    gain_out = np.empty((n_squads, k), dtype=np.float32)
+    cost_out = np.empty((n_squads, k), dtype=np.int32)
+
+    for start in range(0, n_squads, chunk_size):
+        squad = squads[start:start + chunk_size]
+        bank = banks[start:start + chunk_size]
+        rows = np.arange(len(squad))[:, None]
+        known = squad >= 0
+        sell = np.where(known, squad, 0)
+
+        in_squad = np.zeros((len(squad), len(price)), dtype=bool)
+        in_squad[np.broadcast_to(rows, sell.shape)[known], sell[known]] = True
+        in_squad = in_squad[:, buy_rows]
+        club_counts = np.zeros((len(squad), len(player_arrays['club_names']) + 1), dtype=np.int16)
+        np.add.at(club_counts, (np.broadcast_to(rows, sell.shape)[known], club[sell[known]]), 1)
+
+        # (squads, sell, buy) arrays, the squad axis is broadcast against every available player
+        cost = buy_price[None, None, :] - price[sell][:, :, None]
+        gain = buy_score[None, None, :] - score[sell][:, :, None]
+        same_club = buy_club[None, None, :] == club[sell][:, :, None]
+        buy_club_count = club_counts[:, buy_club][:, None, :] - same_club
+        legal = (
+            known[:, :, None]
+            & (buy_position[None, None, :] == position[sell][:, :, None])
+            & ~in_squad[:, None, :]
+            & (buy_club[None, None, :] >= 0)
+            & (cost <= bank[:, None, None])
+            & (buy_club_count < MAX_PLAYERS_PER_TEAM)
+        )
+        gain = np.where(legal, gain, -np.inf).reshape(len(squad), -1)
+
+        # Partial sort: only the k best moves per squad are ordered
+        best = np.argpartition(-gain, k - 1, axis=1)[:, :k]
+        best_gain = np.take_along_axis(gain, best, axis=1)
+        order = np.argsort(-best_gain, axis=1, kind='stable')
+        best = np.take_along_axis(best, order, axis=1)
+        sell_slot, buy = np.divmod(best, n_buys)
+
+        sell_out[start:start + chunk_size] = np.take_along_axis(sell, sell_slot, axis=1)
+        buy_out[start:start + chunk_size] = buy_rows[buy]
+        gain_out[start:start + chunk_size] = np.take_along_axis(best_gain, order, axis=1)
+        cost_out[start:start + chunk_size] = np.take_along_axis(cost.reshape(len(squad), -1), best, axis=1)
+
+    return sell_out, buy_out, gain_out, cost_out
+
+def recommend_transfers_one_transfer(all_players_df, current_bank_value, current_team_df, gameweeks=None, top_k=10, squad=None):
+    """
+    Recommend the best single transfers for the current team.
 
     Parameters:
     - all_players_df: DataFrame containing all available players.
     - current_bank_value: float, current bank value available for transfers.
     - current_team_df: DataFrame containing the current team members.
+    - gameweeks: gameweeks whose projections are summed to score players, BCV is used when None.
+    - top_k: number of transfers returned.
+    - squad: rows of the current team in all_players_df, looked up by player name when None.
 
     Returns:
-    Dictionary of recommended player transfers for each position.
+    DataFrame of the best legal transfers, sorted by gain.
     """
-    
-    # Exclude current team players from all available players
-    df = all_players_df[~all_players_df['Player'].isin(current_team_df['Player'])]
-    
-    # Fetching all unique positions available in the dataframe
-    positions = df['Position'].unique()
-    
-    recommendations = {}
-    
-    for position in positions:
-        position_players = df[df['Position'] == position]
-        
-        if position_players.empty:
-            continue
-        
-        # Sorting players based on the BCV in descending order to prioritize higher values
-        sorted_players = position_players.sort_values(by='BCV', ascending=False)
-        top_player = sorted_players.iloc[0]
-
-        potential_transfers = []
-
-        # Iterate through sorted players to find potential transfers
-        for _, player_row in sorted_players.iterrows():
-            if player_row['Player'] != top_player['Player']:
-                price_difference = player_row['Price'] - top_player['Price']
-                if price_difference <= current_bank_value:
-                    potential_transfers.append((top_player['Player'], player_row['Player'], player_row['BCV'], price_difference))
-        
-        # Storing potential transfers for each position in the recommendations dictionary
-        if potential_transfers:
-            recommendations[position] = potential_transfers
-    
-    return recommendations
-
-def pick_better_player(current_budget, position, selected_players_list, all_players_df):
-    better_players = all_players_df[(all_players_df['Position'] == position) & (~all_players_df['Player'].isin([x['Player'] for x in selected_players_list]))]
-    better_players = better_players.sort_values(by='BCV', ascending=False)
-    for _, player in better_players.iterrows():
-        if player[' Price '] <= current_budget:
-            selected_players_list.append({
-                'Player': player['Player'],
-                'Position': player['Position'],
-                'BCV': player['BCV'],
-                'Price': player[' Price '],
-                'Team': player['Team']  # Storing team information
-            })
-            current_budget -= player[' Price ']
-            break
-    return current_budget, selected_players_list
-
-def recommend_transfers_wildcard(all_players_df, current_bank_value, current_team_value):
-    positions = {"GK": 2, "D": 5, "M": 5, "F": 3}
-    budget = current_bank_value + current_team_value
-    threshold_budget = 1.0
-
-    team_player_count = {}
-
-    def get_cheap_players(position):
-        return all_players_df[all_players_df['Position'] == position].nsmallest(1, ' Price ').sort_values(by='BCV', ascending=False)
-
-    def add_player_to_selected(player, position):
-        nonlocal budget
-        nonlocal positions
-        nonlocal team_player_count
-        
-        selected_players_list.append({
-            'Player': player['Player'],
-            'Position': position,
-            'BCV': player['BCV'],
-            'Price': player[' Price '],
-            'Team': player['Team']
-        })
-        team = player['Team']
-        team_player_count[team] = team_player_count.get(team, 0) + 1
-        budget -= player[' Price ']
-        positions[position] -= 1
-
-    selected_players_list = []
-
-    for pos in positions:
-        cheap_players = get_cheap_players(pos)
-        if not cheap_players.empty:
-            top_cheap_player = cheap_players.iloc[0]
-            if positions[pos] > 0 and top_cheap_player[' Price '] <= budget:
-                team = top_cheap_player['Team']
-                if team_player_count.get(team, 0) < 3:
-                    add_player_to_selected(top_cheap_player, pos)
-
-    for pos, count in positions.items():
-        position_players = all_players_df[
-            (all_players_df['Position'] == pos) &
-            (~all_players_df['Player'].isin([x['Player'] for x in selected_players_list]))
-        ]
-        position_players = position_players.sort_values(by='BCV', ascending=False)
-        for _, player in position_players.iterrows():
-            if positions[pos] > 0 and player[' Price '] <= budget:
-                team = player['Team']
-                if team_player_count.get(team, 0) < 3:
-                    add_player_to_selected(player, pos)
-
-    while budget > threshold_budget:
-        sorted_selected = sorted(selected_players_list, key=lambda x: (x['Price'], -x['BCV']))
-        player_to_remove = sorted_selected[0]
-        selected_players_list.remove(player_to_remove)
-        budget += player_to_remove['Price']
-        positions[player_to_remove['Position']] += 1
-
-        team_player_count[player_to_remove['Team']] -= 1
-
-        budget, selected_players_list = pick_better_player(budget, player_to_remove['Position'], selected_players_list, all_players_df)
-
-    result_df = pd.DataFrame(selected_players_list)
-    position_order = {"GK": 1, "D": 2, "M": 3, "F": 4}
-    result_df['PositionOrder'] = result_df['Position'].map(position_order)
-    result_df = result_df.sort_values(by=['PositionOrder', 'BCV'], ascending=[True, False]).drop(columns='PositionOrder')
+    score_columns = [str(gameweek) for gameweek in gameweeks] if gameweeks is not None else ['BCV']
+    ranked = get_ranked_players(all_players_df)
+    player_arrays = ranked.player_arrays(score_columns)
+    if squad is None:
+        squad = squad_indices(player_arrays, current_team_df['Player'])
+    bank = int(round(current_bank_value * 10))
+    sell, buy, gain, cost = (a[0] for a in best_single_transfers(player_arrays, squad[None, :], np.array([bank]), top_k,
+                                                                 buy_rows=ranked.buy_pool(score_columns, top_k)))
+
+    legal = np.isfinite(gain)
+    return pd.DataFrame({
+        'Out': player_arrays['player'][sell[legal]],
+        'In': player_arrays['player'][buy[legal]],
+        'Position': [POSITION_NAMES[code] for code in player_arrays['position'][buy[legal]]],
+        'Gain': gain[legal].astype(float).round(2),
+        'Price difference': cost[legal] / 10,
+    })
+
+def recommend_transfers_wildcard(all_players_df, current_bank_value, current_team_value, gameweeks=None):
+    """
+    Recommend the best possible squad for a wildcard or free hit.
 
-    total_members = len(result_df)
-    total_team_value = result_df['Price'].sum()
-    print(f"Total Team Members: {total_members}")
-    print(f"Total Team Value: {total_team_value}")
-    print(f"Money Left in Bank: {budget}")
+    Parameters:
+    - all_players_df: DataFrame containing all available players.
+    - current_bank_value: float, current bank value.
+    - current_team_value: float, current team value.
+    - gameweeks: gameweeks whose projections are summed to score players, BCV is used when None.
 
-    return result_df
+    Returns:
+    DataFrame of the 15 players of the optimal squad, empty when no squad fits the budget.
+    """
+    score_columns = [str(gameweek) for gameweek in gameweeks] if gameweeks is not None else ['BCV']
+    player_arrays = get_ranked_players(all_players_df).player_arrays(score_columns)
+    budget = int(round((current_bank_value + current_team_value) * 10))
+    rows, _ = optimize_squad(player_arrays, budget)
+    if rows is None:
+        return pd.DataFrame(columns=['Player', 'Position', 'Team', 'Price', 'BCV', 'Score'])
+
+    result_df = pd.DataFrame({
+        'Player': player_arrays['player'][rows],
+        'Position': [POSITION_NAMES[code] for code in player_arrays['position'][rows]],
+        'Team': player_arrays['club_names'][player_arrays['club'][rows]],
+        'Price': player_arrays['price'][rows] / 10,
+        'BCV': all_players_df['BCV'].to_numpy()[rows],
+        'Score': player_arrays['score'][rows].astype(float).round(2),
+    })
+    position_order = {"GK": 1, "D": 2, "M": 3, "F": 4}
+    result_df['PositionOrder'] = result_df['Position'].map(position_order)
+    return result_df.sort_values(by=['PositionOrder', 'Score'], ascending=[True, False]).drop(columns='PositionOrder')
@@ -1,96 +1,196 @@
+import base64
+import hashlib
+import itertools
+import json
+import logging
 import os
-import imaplib
-import email
-from dotenv import load_dotenv
-from bs4 import BeautifulSoup
+import quopri
+import re
 import requests
+from fpl_client import get_cache_path, read_json_file, write_file_atomic
+from instrumentation import get_metrics, timed
 from get_fpl_team import get_source_data_path
+from precheck import connect_to_mailbox, search_new_mail
 
-def fetch_new_source_data_from_gmail(next_gameweek_api, last_gameweek_api_deadline_date):
-    is_found = False
-    is_updated = False
-    
-    # Load environment variables from .env file
-    load_dotenv(get_env_file_path())
-
-    # Get the email credentials from environment variables
-    email_address = os.getenv('EMAIL_ADDRESS')
-    email_password = os.getenv('EMAIL_PASSWORD')
-
-    # Connect to Gmail IMAP server
-    imap_server = imaplib.IMAP4_SSL('imap.gmail.com')
-    imap_server.login(email_address, email_password)
-    imap_server.select('inbox')
-
-    # Search for emails from bingo@patreon.com with the specified attachment
-    status, email_ids = imap_server.search(None, f'(FROM "bingo@patreon.com" SUBJECT "GW {next_gameweek_api} - the Transfer Algorithm" SINCE "05-OCT-2024")')
-    email_ids = email_ids[0].split()
-
-    # Select the last email ID
-    latest_email_id = email_ids[-1]
-
-    # Fetch the email data
-    status, email_data = imap_server.fetch(latest_email_id, '(RFC822)')
-    raw_email = email_data[0][1]
-    email_message = email.message_from_bytes(raw_email)
-
-    for part in email_message.walk():
-        content_type = part.get_content_type()
-        if content_type == 'text/html':
-            html_content = part.get_payload(decode=True)
-            soup = BeautifulSoup(html_content, 'html.parser')
-            links = soup.find_all('a', href=True)
-            unique_links = list(set(link['href'] for link in links))
-            csv_links = [link for link in unique_links if '.csv' in link]
-            if len(csv_links) != 1:
-                print("Did not find exactly one CSV link in the last email")
-                break
-            else:
-                is_found = True
-                url = csv_links[0]
-                response = requests.get(url)
-                temp_file_path = f"{get_source_data_path()}/TransferAlgorithm_temp.csv"
-                with open(temp_file_path, 'wb') as f:
-                    f.write(response.content)
-            
-            # Check if the content of the attachment is different from the existing file
-            existing_file_path = f"{get_source_data_path()}/TransferAlgorithm.csv"
-            
-            if os.path.exists(existing_file_path):
-                with open(existing_file_path, 'rb') as f:
-                    existing_content = f.read()
-                with open(temp_file_path, 'rb') as f:
-                    new_content = f.read()
-                if existing_content != new_content:
-                    is_updated = True
-            else:
-                print(f"The file path '{existing_file_path}' does not exist")
-            
-            # If the content is updated, overwrite the existing file
-            if is_updated:
-                os.replace(temp_file_path, existing_file_path)
-            else:
-                os.remove(temp_file_path)
-            
-            break
-        else:
-            print("Did not find HTML content in the last email")
-            break
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+IMAP_QUOTED = re.compile(rb'"((?:[^"\\]|\\.)*)"')
+IMAP_LITERAL = re.compile(rb'\{(\d+)\}(?:\r\n)?')
+IMAP_ATOM = re.compile(rb'[^\s()"]+')
+
+
+@timed('source_mail')
+def fetch_new_source_data_from_gmail(next_gameweek_api, last_gameweek_api_deadline_date, imap_server=None, session=None, source_data_path=None, state_path=None):
+    """
+    Download TransferAlgorithm.csv from the link in the newest Transfer Algorithm email of the gameweek.
 
-    # Close the connection to the IMAP server
-    imap_server.close()
-    imap_server.logout()
+    Parameters:
+    - next_gameweek_api: gameweek in the subject of the email.
+    - last_gameweek_api_deadline_date: 'DD-MON-YYYY', mail older than this is ignored on the first run.
+    - imap_server: logged in IMAP4 connection, Gmail with the .env credentials when None.
+    - session: requests session used for the download.
+    - source_data_path, state_path: folder of the CSV and file of the persisted state.
+
+    Returns:
+    (is_found, is_updated): whether an email with exactly one CSV link exists for the gameweek and whether
+    the CSV on disk changed.
+
+    Only mail with a UID above the last one seen is searched, and only the BODYSTRUCTURE and the text/html
+    part of the newest match are fetched. The CSV is streamed to disk while it is hashed. When the link is
+    unchanged the download is conditional on the ETag of the last download.
+    """
+    source_data_path = source_data_path or get_source_data_path()
+    state_path = state_path or os.path.join(get_cache_path(), 'source_mail.json')
+    state = read_json_file(state_path) if os.path.exists(state_path) else {}
+
+    imap_server = imap_server or connect_to_gmail()
+    try:
+        uids = search_new_mail(imap_server, next_gameweek_api, last_gameweek_api_deadline_date, state)
+        if uids:
+            link = find_csv_link(imap_server, uids[-1])
+            if link is None:
+                logging.getLogger('handle_logging').warning("Did not find exactly one CSV link in the last email")
+            state.update(last_uid=uids[-1], gameweek=next_gameweek_api, link=link)
+    finally:
+        # Close the connection to the IMAP server
+        imap_server.close()
+        imap_server.logout()
+
+    is_found = state.get('gameweek') == next_gameweek_api and state.get('link') is not None
+    is_updated = False
+    if is_found:
+        is_updated = download_source_csv(state['link'], f'{source_data_path}/TransferAlgorithm.csv', state, session)
 
-    # Return the boolean variable indicating if the content is updated
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    write_file_atomic(state_path, json.dumps(state).encode('utf8'))
     return is_found, is_updated
 
+def connect_to_gmail():
+    # The credentials come from the .env file, see precheck.connect_to_mailbox
+    return connect_to_mailbox()
+
+def find_csv_link(imap_server, uid):
+    """Return the one CSV link in the HTML part of the email, None when there isn't exactly one."""
+    _, data = imap_server.uid('FETCH', str(uid), '(BODYSTRUCTURE)')
+    fetched = parse_imap_list(join_fetch_response(data))[-1]
+    structure = fetched[fetched.index('BODYSTRUCTURE') + 1]
+    found = find_part(structure, 'text', 'html')
+    if found is None:
+        logging.getLogger('handle_logging').warning("Did not find HTML content in the last email")
+        return None
+
+    part_number, part = found
+    _, data = imap_server.uid('FETCH', str(uid), f'(BODY.PEEK[{part_number}])')
+    html_content = decode_part(next(item[1] for item in data if isinstance(item, tuple)), part)
+    # Only needed when a new email arrives, most runs don't pay for the import
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html_content, 'html.parser')
+    csv_links = {link['href'] for link in soup.find_all('a', href=True) if '.csv' in link['href']}
+    return csv_links.pop() if len(csv_links) == 1 else None
+
+def download_source_csv(url, csv_path, state, session=None):
+    """Stream the CSV at url to csv_path when its content differs from the file there, return True when it did."""
+    existing_digest = hash_file(csv_path) if os.path.exists(csv_path) else None
+    download = state.get('download', {})
+
+    # The validators of the last download only apply while that download is the file on disk
+    headers = {}
+    if download.get('url') == url and existing_digest is not None and download.get('sha256') == existing_digest:
+        if download.get('etag'):
+            headers['If-None-Match'] = download['etag']
+        if download.get('last_modified'):
+            headers['If-Modified-Since'] = download['last_modified']
+
+    temp_file_path = os.path.join(os.path.dirname(csv_path), 'TransferAlgorithm_temp.csv')
+    with (session or requests).get(url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            get_metrics().count_http(0)
+            return False
+        response.raise_for_status()
+        digest = hashlib.sha256()
+        size = 0
+        with open(temp_file_path, 'wb') as f:
+            for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        get_metrics().count_http(size)
+        state['download'] = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'sha256': digest.hexdigest(),
+        }
+
+    # Replace the existing file only when the content is different
+    if digest.hexdigest() == existing_digest:
+        os.remove(temp_file_path)
+        return False
+    os.replace(temp_file_path, csv_path)
+    return True
+
+def hash_file(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def join_fetch_response(data):
+    # imaplib splits literals out as (prefix ending in {n}, literal) tuples
+    return b''.join(item[0] + item[1] if isinstance(item, tuple) else item for item in data)
+
+def parse_imap_list(raw):
+    """Parse an IMAP response such as a BODYSTRUCTURE into nested lists of strings, NIL becomes None."""
+    stack = [[]]
+    i = 0
+    while i < len(raw):
+        char = raw[i:i + 1]
+        if char.isspace():
+            i += 1
+        elif char == b'(':
+            stack.append([])
+            i += 1
+        elif char == b')':
+            item = stack.pop()
+            stack[-1].append(item)
+            i += 1
+        elif char == b'"':
+            match = IMAP_QUOTED.match(raw, i)
+            stack[-1].append(re.sub(rb'\\(.)', rb'\1', match.group(1)).decode('utf8', 'replace'))
+            i = match.end()
+        elif char == b'{':
+            match = IMAP_LITERAL.match(raw, i)
+            end = match.end() + int(match.group(1))
+            stack[-1].append(raw[match.end():end].decode('utf8', 'replace'))
+            i = end
+        else:
+            match = IMAP_ATOM.match(raw, i)
+            atom = match.group().decode('utf8', 'replace')
+            stack[-1].append(None if atom.upper() == 'NIL' else atom)
+            i = match.end()
+    return stack[0]
 
-def get_env_file_path():
-    # Get the directory of the current script
-    script_dir = os.path.dirname(os.path.abspath(__file__))
+def find_part(structure, content_type, subtype, part_number=''):
+    """Return (part number, structure) of the first body part of the type, depth first."""
+    if isinstance(structure[0], list):
+        # A multipart lists its parts first, then its subtype and extension data
+        children = itertools.takewhile(lambda child: isinstance(child, list), structure)
+        for number, child in enumerate(children, 1):
+            found = find_part(child, content_type, subtype, f'{part_number}.{number}' if part_number else str(number))
+            if found is not None:
+                return found
+        return None
+    if structure[0].lower() == content_type and structure[1].lower() == subtype:
+        return part_number or '1', structure
+    return None
 
-    # Construct the path to the 'source_data' folder relative to the script
-    env_file_path = os.path.join(script_dir, '../.env')
+def decode_part(body, part):
+    """Undo the transfer encoding of a body part fetched with BODY[n]."""
+    encoding = (part[5] or '7BIT').upper()
+    if encoding == 'BASE64':
+        return base64.b64decode(body)
+    if encoding == 'QUOTED-PRINTABLE':
+        return quopri.decodestring(body)
+    return body
 
-    # Return the absolute path
-    return os.path.abspath(env_file_path)
\ No newline at end of file
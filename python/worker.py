@@ -1,45 +1,261 @@
-import sys
-import io
-from get_fpl_team import load_source_data, process_manager, get_top_players_by_position, get_gameweek_info_from_api
-from update_source_data import fetch_new_source_data_from_gmail
-from send_emails import send_email
-from handle_logging import initiate_logging
+import argparse
+import json
+import logging
+import os
+from handle_logging import initiate_logging, get_log_path
+from instrumentation import RunMetrics, get_metrics, set_metrics, profiling
+from precheck import nothing_due, save_state, clear_state, hash_source_files
 
+# The pipeline modules import pandas, requests and BeautifulSoup, which take most of the start-up time. They
+# are imported in the functions that need them, so a run that the pre-check ends doesn't load them at all.
 
-def main():
-    
+# Parsed source data of the last run, a daemon reuses it while the source files are unchanged
+_source = {'key': None, 'data': None}
+
+
+def process_managers(managers, next_gameweek, all_players_df, player_index, workers=1, plan_horizon=5, beam_width=None, manifest=None, simulate=0):
+    """
+    Process managers on up to `workers` threads and return their rendered {'html', 'text'} fragments in the original order.
+
+    A manager whose picks, entry or history the API refuses (e.g. a 404 or a 5xx) gets a fragment saying it was skipped,
+    marked with 'skipped', so one manager doesn't end the run or a page of a league.
+    With a RunManifest, managers whose picks and bank are unchanged since the last run reuse their stored fragment.
+    The planner keeps transfer_planner.PLANNER_BEAM_WIDTH states when beam_width is None. With `simulate` scenarios
+    every report also scores its recommendations on sampled points, spread over the process pool of simulation.py.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    import requests
+    from fpl_client import get_client
+    from get_fpl_team import process_manager
+    from report_renderer import render_manager
+    from transfer_planner import PLANNER_BEAM_WIDTH
+    beam_width = PLANNER_BEAM_WIDTH if beam_width is None else beam_width
+
+    def process(row):
+        with get_metrics().manager(row['ID']):
+            try:
+                return process_one(row)
+            except requests.HTTPError as e:
+                # Not recorded in the manifest, so the next run tries the manager again. Logged to status.log once main
+                # has initiated logging, benchmarks calling this directly leave the file alone.
+                logging.getLogger('handle_logging').warning(f"Manager {row['ID']} was skipped: {e}")
+                return dict(render_manager({'summary': [f"{row['Manager']} was skipped, the FPL API returned an error: {e}"], 'sections': []}),
+                            skipped=True)
+
+    def process_one(row):
+        metrics = get_metrics()
+        with metrics.stage('fetch'):
+            picks = get_client().get_picks(row['ID'], next_gameweek - 1)
+            entry = get_client().get_entry(row['ID'])
+        wildcard = bool(row.get('Wildcard', False))
+        if manifest is not None:
+            elements = [pick['element'] for pick in picks['picks']]
+            key = manifest.manager_key(int(row['ID']), row['Manager'], wildcard, elements, entry['last_deadline_bank'], entry['last_deadline_value'])
+            fragment = manifest.cached_fragment(row['ID'], key)
+            if fragment is not None:
+                # The picks still go through the index so players without data are reported as before
+                player_index.rows(elements)
+                manifest.record(row['ID'], key, fragment, rebuilt=False)
+                return fragment
+
+        with metrics.stage('fetch'):
+            history = get_client().get_history(row['ID'])
+        with metrics.stage('analyse'):
+            result = process_manager(row['ID'], row['Manager'], wildcard, next_gameweek, all_players_df, player_index, plan_horizon, beam_width, picks, entry, history, simulate)
+        with metrics.stage('render'):
+            fragment = render_manager(result)
+        if manifest is not None:
+            manifest.record(row['ID'], key, fragment)
+        return fragment
+
+    # Let every worker thread keep its own keep-alive connection to the API, a large enough pool is left as it is
+    get_client().resize_pool(max(workers, 1))
+    if workers <= 1:
+        # On the calling thread, where the profiler of a --profile run sees the analysis
+        return [process(row) for row in managers]
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        return list(executor.map(process, managers))
+
+
+def main(workers=1, league_id=None, plan_horizon=5, beam_width=None, force=False, profile=False, now=None, simulate=0):
+    """
+    Run the worker once and log a JSON line with the stage timings, per-manager breakdown and HTTP traffic of the run.
+
+    With profile, a cProfile dump and a tracemalloc snapshot of the run are written next to status.log, and managers are
+    processed on the calling thread, the only one cProfile sees. Unless forced,
+    a manager-list run first asks precheck.nothing_due whether anything can have changed since the last full run,
+    and ends there when nothing can. `now` is the time of the pre-check in epoch seconds, time.time() when None.
+    """
     logger = initiate_logging()
-    # Redirect stdout to a string buffer
-    old_stdout = sys.stdout
-    sys.stdout = buffer = io.StringIO()
-    
-    last_gameweek_api, next_gameweek_api, last_gameweek_api_deadline_date = get_gameweek_info_from_api()
+    metrics = set_metrics(RunMetrics())
+    if league_id is None:
+        reason = None if force else nothing_due([plan_horizon, beam_width, simulate], now=now)
+        if reason is not None:
+            logger.info(reason)
+            logger.info(json.dumps({'run': metrics.summary(outcome='noop')}))
+            return
+        # Only a full run that ends cleanly records a new state
+        clear_state()
+    if profile and workers > 1:
+        logger.info(f"Profiling processes the managers on one thread instead of {workers}.")
+        workers = 1
+    run_info = {'outcome': 'error'}
+    try:
+        with profiling(os.path.dirname(get_log_path()), enabled=profile):
+            run(logger, run_info, workers, league_id, plan_horizon, beam_width, force, now, simulate)
+    finally:
+        logger.info(json.dumps({'run': metrics.summary(**run_info)}))
+
+
+def run(logger, run_info, workers=1, league_id=None, plan_horizon=5, beam_width=None, force=False, now=None, simulate=0):
+    """The steps of main, `run_info` collects the outcome and counts for the run summary."""
+    from functools import partial
+    import requests
+    from backtest import snapshot_source, archive_results
+    from get_fpl_team import load_source_data, get_top_players_by_position, get_gameweek_info_from_api, get_next_deadline_from_api, get_source_data_path
+    from fpl_client import get_client
+    from league import process_league
+    from player_resolver import build_player_index
+    from report_renderer import render_report, render_shared
+    from run_manifest import RunManifest, hash_files
+    from transfer_planner import PLANNER_BEAM_WIDTH
+    from update_source_data import fetch_new_source_data_from_gmail
+    from send_emails import DeliveryQueue, build_message
+    settings = [plan_horizon, beam_width, simulate]
+    beam_width = PLANNER_BEAM_WIDTH if beam_width is None else beam_width
+    metrics = get_metrics()
+    manifest = RunManifest(force=force)
+
+    with metrics.stage('bootstrap'):
+        last_gameweek_api, next_gameweek_api, last_gameweek_api_deadline_date = get_gameweek_info_from_api()
     is_found, is_updated = fetch_new_source_data_from_gmail(next_gameweek_api, last_gameweek_api_deadline_date)
-    
-    df, all_players_df, matching_names_df, managers_df = load_source_data()
+
+    source_key = hash_source_files()
+    if _source['key'] != source_key:
+        _source.update(key=source_key, data=load_source_data())
+    df, all_players_df, matching_names_df, managers_df = _source['data']
     next_gameweek_csv = int(df.columns[10])
+    player_index = build_player_index(all_players_df, matching_names_df)
+    source_data_path = get_source_data_path()
+    manifest.set_source(hash_files(f'{source_data_path}/TransferAlgorithm.csv', f'{source_data_path}/matching_names.csv'),
+                        [last_gameweek_api, next_gameweek_api, last_gameweek_api_deadline_date], player_index.key, plan_horizon, beam_width, simulate)
+
+    if next_gameweek_api == next_gameweek_csv:
+        # Keep the source data of this gameweek and the results of finished ones for backtest.py
+        with metrics.stage('archive'):
+            try:
+                snapshot_source(next_gameweek_csv, get_client().get_bootstrap_static())
+                archive_results(managers_df['ID'].tolist(), workers=workers)
+            except requests.RequestException as e:
+                logger.warning(f"Gameweek results could not be archived: {e}")
 
-    html_parts = []
+    managers, fragments, notes, shared = [], [], [], None
+    if next_gameweek_api == next_gameweek_csv and league_id is not None:
+            # League runs stream every entry into a report file instead of one email
+            process_fragments = partial(process_managers, next_gameweek=next_gameweek_csv, all_players_df=all_players_df,
+                                        player_index=player_index, workers=workers, plan_horizon=plan_horizon, beam_width=beam_width, simulate=simulate)
+
+            def process_page(managers):
+                fragments = process_fragments(managers)
+                # The pages of a large league would otherwise keep the breakdown of every entry until the summary
+                metrics.compact()
+                return [fragment['html'] for fragment in fragments]
+
+            report_path = process_league(league_id, next_gameweek_csv, process_page)
+            logger.info(f"Report for league {league_id} was written to {report_path}.")
+            if player_index.unresolved:
+                logger.warning(f"Players without matching data: {', '.join(player_index.unresolved_names())}")
+            run_info['outcome'] = 'league'
+            return
     if next_gameweek_api == next_gameweek_csv:
-            for index, row in managers_df.iterrows():
-                if row.get('Include', False):
-                    buffer = process_manager(buffer, row['ID'], row['Manager'], row.get('Wildcard', False), next_gameweek_csv, all_players_df, matching_names_df)
+            managers = [row for _, row in managers_df.iterrows() if row.get('Include', False)]
+            with metrics.stage('managers'):
+                fragments = process_managers(managers, next_gameweek_csv, all_players_df, player_index, workers, plan_horizon, beam_width, manifest, simulate)
+            run_info.update(managers=len(managers), rebuilt=len(manifest.rebuilt),
+                            skipped=sum(fragment.get('skipped', False) for fragment in fragments))
+            logger.info(f"Rebuilt the report of {len(manifest.rebuilt)} of {len(managers)} managers.")
 
-            buffer = get_top_players_by_position(buffer, all_players_df, next_gameweek_csv)
+            # Players missing from the projections are reported once for the whole run
+            if player_index.unresolved:
+                notes.append(f"The following players did not have matching data: {', '.join(player_index.unresolved_names())}")
+            with metrics.stage('render'):
+                shared = render_shared(get_top_players_by_position(all_players_df, next_gameweek_csv))
     else:
-            print(f'Next gameweek from API ({next_gameweek_api}) does not match the next gameweek from CSV ({next_gameweek_csv}). No changes were made.')
+            notes.append(f'Next gameweek from API ({next_gameweek_api}) does not match the next gameweek from CSV ({next_gameweek_csv}). No changes were made.')
     if not is_found:
-        print(f'Email for gameweek {next_gameweek_api} was not found. No changes were made.')
+        notes.append(f'Email for gameweek {next_gameweek_api} was not found. No changes were made.')
+    with metrics.stage('render'):
+        html_report, text_report = render_report(fragments, notes, shared)
+    # Until the deadline only a new CSV can change the report, which the pre-check looks for. A report with skipped
+    # managers isn't final, the next run tries them again.
+    next_deadline = (get_next_deadline_from_api() if is_found and next_gameweek_api == next_gameweek_csv and not run_info.get('skipped')
+                     else None)
+    if not manifest.report_changed(html_report):
+        manifest.save()
+        if next_deadline is not None:
+            save_state(next_gameweek_api, next_deadline, settings, checked=now)
+        logger.info("Nothing changed since the last email. No email was sent.")
+        run_info['outcome'] = 'unchanged'
+        return
+
+    # The full report goes to the sender, managers with an address in the manager list get their own part
+    queue = DeliveryQueue()
+    messages = [build_message(queue.sender, queue.sender, next_gameweek_api, html_report, text_report)]
+    for row, fragment in zip(managers, fragments):
+        recipient = row.get('Email')
+        if isinstance(recipient, str) and recipient.strip() and not fragment.get('skipped'):
+            messages.append(build_message(queue.sender, recipient.strip(), next_gameweek_api, *render_report([fragment], shared=shared)))
+    with metrics.stage('smtp'):
+        sent, skipped, failed = queue.deliver(messages, resend=force)
+    run_info.update(outcome='failed' if failed else 'sent', emails_sent=len(sent), emails_skipped=len(skipped), emails_failed=len(failed))
+    logger.info(f"Sent {len(sent)} emails, {len(skipped)} had been delivered before.")
+    for message_id, error in failed:
+        logger.error(f"Email {message_id} was not delivered: {error}")
+    # The report is only recorded as sent once every recipient has it, so a rerun retries the rest
+    manifest.save(None if failed else html_report)
+    if next_deadline is not None and not failed:
+        save_state(next_gameweek_api, next_deadline, settings, checked=now)
     if is_updated:
-        send_email('\n'.join(html_parts), next_gameweek_api)
-        # Restore stdout
-        sys.stdout = old_stdout
         logger.info("Email was sent to the user with the updated results.")
     else:
-        send_email(buffer.getvalue(), next_gameweek_api)
-        # Restore stdout
-        sys.stdout = old_stdout
         logger.info("Source data is already up to date. No changes were made.")
 
+def serve(workers=1, plan_horizon=5, beam_width=None, clock=None, ticks=None, simulate=0):
+    """
+    Run the worker as a daemon, checking for the source email on the poll schedule of scheduler.py.
+
+    Every check goes through the pre-check of main, which asks the mailbox for new source email, so a CSV sent again
+    within the gameweek is picked up at the next check rather than after PRECHECK_MAX_AGE_SECONDS.
+    Modules, API connections and parsed source data stay loaded between checks. `clock` provides time() and sleep(),
+    scheduler.SystemClock when None, so a schedule can run in fast-forward. `ticks` limits the number of checks.
+    """
+    from fpl_client import get_client
+    from scheduler import SystemClock, event_deadlines, run_schedule
+    clock = clock or SystemClock()
+    logger = initiate_logging()
+
+    def tick():
+        # The calendar and the gameweek are read again for every check
+        get_client().refresh()
+        main(workers, None, plan_horizon, beam_width, now=clock.time(), simulate=simulate)
+
+    logger.info("Worker started as a daemon.")
+    return run_schedule(tick, lambda: event_deadlines(get_client().get_bootstrap_static()), clock, ticks, logger)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Send FPL transfer recommendations for the managers in the source data.')
+    parser.add_argument('--workers', type=int, default=4, help='number of managers processed concurrently')
+    parser.add_argument('--league', type=int, help='classic league id whose entries are processed instead of the manager list')
+    parser.add_argument('--plan-horizon', type=int, default=5, help='gameweeks covered by the transfer plan, 0 turns it off')
+    parser.add_argument('--beam-width', type=int, help='states kept by the transfer planner, lower is faster, transfer_planner.PLANNER_BEAM_WIDTH by default')
+    parser.add_argument('--force', action='store_true', help='skip the pre-check, rebuild every report and send the email even when nothing changed')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile dump and a tracemalloc snapshot of the run next to status.log')
+    parser.add_argument('--simulate', type=int, default=0, metavar='SCENARIOS', help='score the recommendations on this many sampled scenarios, e.g. 20000')
+    parser.add_argument('--daemon', action='store_true', help='keep running and check for the source email more often as deadlines get closer')
+    args = parser.parse_args()
+    if args.daemon:
+        if args.league is not None or args.force or args.profile:
+            parser.error('--daemon runs the manager list and can\'t be combined with --league, --force or --profile')
+        serve(workers=args.workers, plan_horizon=args.plan_horizon, beam_width=args.beam_width, simulate=args.simulate)
+    else:
+        main(workers=args.workers, league_id=args.league, plan_horizon=args.plan_horizon, beam_width=args.beam_width, force=args.force, profile=args.profile, simulate=args.simulate)